@@ -0,0 +1,88 @@
+"""
+Benchmark of decoding API responses into stored weather fields.
+
+Compares the full path, the standard json module and the nested pydantic
+response model, with the fast path, orjson and a flat WeatherRecord.
+
+Usage:
+    python -m benchmarks.decode --responses 10000
+"""
+import argparse
+import json
+import time
+from typing import Callable
+
+from benchmarks.mock_server import make_weather
+from schemas import WeatherOpenWeatherResponse, WeatherRecord, loads
+
+
+def pydantic_path(raw: bytes) -> WeatherRecord:
+    """Decode a response the way collector did before the fast path."""
+    return WeatherRecord.from_response(
+        WeatherOpenWeatherResponse(**json.loads(raw)))
+
+
+def fast_path(raw: bytes) -> WeatherRecord:
+    """Decode a response with the fast path of the collector."""
+    return WeatherRecord.from_dict(loads(raw))
+
+
+PATHS: dict[str, Callable[[bytes], WeatherRecord]] = {
+    'pydantic': pydantic_path,
+    'fast': fast_path,
+}
+
+
+def measure(
+        decode: Callable[[bytes], WeatherRecord],
+        responses: list[bytes],
+        repeat: int,
+) -> float:
+    """
+    Measure the best time of decoding all responses.
+
+    Args:
+        decode (Callable[[bytes], WeatherRecord]): Decoding path.
+        responses (list[bytes]): Raw API responses.
+        repeat (int): Number of runs, the fastest one counts.
+
+    Returns:
+        float: Seconds spent on the fastest run.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for raw in responses:
+            decode(raw)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--responses', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    responses = [
+        json.dumps(make_weather(i, 0.0, 0.0)).encode()
+        for i in range(1, args.responses + 1)
+    ]
+    records = {name: decode(responses[0]) for name, decode in PATHS.items()}
+    if len(set(records.values())) != 1:
+        raise RuntimeError(f'Decoding paths disagree: {records}')
+    timings = {
+        name: measure(decode, responses, args.repeat)
+        for name, decode in PATHS.items()
+    }
+    for name, seconds in timings.items():
+        print(
+            f'{name:<9} {seconds:.3f}s, '
+            f'{args.responses / seconds:>10.0f} responses/s, '
+            f'{seconds / args.responses * 1e6:.1f} us/response'
+        )
+    print(f'speedup   {timings["pydantic"] / timings["fast"]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
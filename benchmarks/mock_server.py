@@ -0,0 +1,275 @@
+"""
+Local stand-in for the OpenWeatherMap API.
+
+Serves the current weather, several-cities and 5-day forecast
+endpoints with realistic payloads, configurable latency, server errors
+and 429 throttling.
+
+Usage:
+    python -m benchmarks.mock_server --port 8765 --latency 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CONDITIONS = [
+    (800, 'Clear', 'clear sky', '01d'),
+    (801, 'Clouds', 'few clouds', '02d'),
+    (803, 'Clouds', 'broken clouds', '04d'),
+    (500, 'Rain', 'light rain', '10d'),
+    (600, 'Snow', 'light snow', '13d'),
+    (701, 'Mist', 'mist', '50d'),
+]
+
+
+def make_weather(owm_id: int, lat: float, lon: float) -> dict:
+    """
+    Build a current weather payload as returned by OpenWeatherMap.
+
+    Values depend only on the city ID, while ``dt`` follows the clock, so
+    every new fetch looks like a recalculated observation.
+
+    Args:
+        owm_id (int): OpenWeatherMap ID of the city.
+        lat (float): The latitude of the city.
+        lon (float): The longitude of the city.
+
+    Returns:
+        dict: Weather payload.
+    """
+    rnd = random.Random(owm_id)
+    condition_id, main, description, icon = rnd.choice(CONDITIONS)
+    temp = round(rnd.uniform(240, 315), 2)
+    now = int(time.time())
+    return {
+        'coord': {'lon': lon, 'lat': lat},
+        'weather': [{
+            'id': condition_id,
+            'main': main,
+            'description': description,
+            'icon': icon,
+        }],
+        'base': 'stations',
+        'main': {
+            'temp': temp,
+            'feels_like': round(temp - rnd.uniform(0, 3), 2),
+            'temp_min': round(temp - rnd.uniform(0, 2), 2),
+            'temp_max': round(temp + rnd.uniform(0, 2), 2),
+            'pressure': rnd.randint(980, 1040),
+            'humidity': rnd.randint(10, 100),
+            'sea_level': rnd.randint(980, 1040),
+            'grnd_level': rnd.randint(900, 1040),
+        },
+        'visibility': 10000,
+        'wind': {
+            'speed': round(rnd.uniform(0, 15), 2),
+            'deg': rnd.randint(0, 360),
+            'gust': round(rnd.uniform(0, 20), 2),
+        },
+        'clouds': {'all': rnd.randint(0, 100)},
+        'dt': now,
+        'sys': {
+            'type': 2,
+            'id': rnd.randint(1, 100000),
+            'country': 'XX',
+            'sunrise': now - 6 * 3600,
+            'sunset': now + 6 * 3600,
+        },
+        'timezone': 0,
+        'id': owm_id,
+        'name': f'City {owm_id}',
+        'cod': 200,
+    }
+
+
+def make_forecast(owm_id: int, lat: float, lon: float) -> dict:
+    """
+    Build a 5-day forecast payload as returned by OpenWeatherMap.
+
+    The 40 steps start at the next 3-hour boundary. Values of a step depend
+    only on the city ID and the time of the step, so later issues repeat
+    the steps they share with earlier ones.
+
+    Args:
+        owm_id (int): OpenWeatherMap ID of the city.
+        lat (float): The latitude of the city.
+        lon (float): The longitude of the city.
+
+    Returns:
+        dict: Forecast payload.
+    """
+    step = 3 * 3600
+    start = (int(time.time()) // step + 1) * step
+    items = []
+    for dt in range(start, start + 40 * step, step):
+        rnd = random.Random(owm_id * 1_000_003 + dt)
+        condition_id, main, description, icon = rnd.choice(CONDITIONS)
+        items.append({
+            'dt': dt,
+            'main': {
+                'temp': round(rnd.uniform(240, 315), 2),
+                'pressure': rnd.randint(980, 1040),
+                'humidity': rnd.randint(10, 100),
+            },
+            'weather': [{
+                'id': condition_id,
+                'main': main,
+                'description': description,
+                'icon': icon,
+            }],
+            'clouds': {'all': rnd.randint(0, 100)},
+            'wind': {'speed': round(rnd.uniform(0, 15), 2)},
+            'pop': round(rnd.random(), 2),
+            'dt_txt': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(dt)),
+        })
+    return {
+        'cod': '200',
+        'cnt': len(items),
+        'list': items,
+        'city': {
+            'id': owm_id,
+            'name': f'City {owm_id}',
+            'coord': {'lat': lat, 'lon': lon},
+        },
+    }
+
+
+def coordinates_id(lat: float, lon: float) -> int:
+    """Get a stable city ID for coordinates."""
+    return int((lat + 90) * 100) * 36001 + int((lon + 180) * 100) + 1
+
+
+class MockOpenWeatherServer(ThreadingHTTPServer):
+    """
+    HTTP server imitating the OpenWeatherMap API.
+
+    Attributes:
+        latency (float): Delay of every response in seconds.
+        error_rate (float): Share of responses failing with 500.
+        throttle_rate (float): Share of responses failing with 429.
+        counters (dict[str, int]): Numbers of served responses by kind.
+    """
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(
+            self,
+            address: tuple[str, int],
+            latency: float = 0.0,
+            error_rate: float = 0.0,
+            throttle_rate: float = 0.0,
+            seed: int = 0,
+    ) -> None:
+        super().__init__(address, MockOpenWeatherHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.counters = {'requests': 0, 'errors': 0, 'throttled': 0}
+        self.lock = threading.Lock()
+
+    def roll(self) -> str:
+        """Pick the outcome of a request: ok, error or throttled."""
+        with self.lock:
+            self.counters['requests'] += 1
+            value = self.random.random()
+            if value < self.throttle_rate:
+                self.counters['throttled'] += 1
+                return 'throttled'
+            if value < self.throttle_rate + self.error_rate:
+                self.counters['errors'] += 1
+                return 'error'
+        return 'ok'
+
+
+class MockOpenWeatherHandler(BaseHTTPRequestHandler):
+    """Request handler of MockOpenWeatherServer."""
+    protocol_version = 'HTTP/1.1'
+    server: MockOpenWeatherServer
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/stats':
+            with self.server.lock:
+                return self.send_json(200, dict(self.server.counters))
+        if url.path not in (
+                '/data/2.5/weather', '/data/2.5/group', '/data/2.5/forecast'):
+            return self.send_json(404, {'cod': 404, 'message': 'not found'})
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        outcome = self.server.roll()
+        if outcome == 'throttled':
+            return self.send_json(
+                429, {'cod': 429, 'message': 'too many requests'},
+                headers={'Retry-After': '1'},
+            )
+        if outcome == 'error':
+            return self.send_json(500, {'cod': 500, 'message': 'error'})
+        if url.path == '/data/2.5/group':
+            ids = [int(i) for i in query['id'][0].split(',')]
+            items = [make_weather(i, 0.0, 0.0) for i in ids]
+            for item in items:
+                for key in ('base', 'timezone', 'cod'):
+                    item.pop(key)
+            return self.send_json(200, {'cnt': len(items), 'list': items})
+        lat = float(query['lat'][0])
+        lon = float(query['lon'][0])
+        if url.path == '/data/2.5/forecast':
+            return self.send_json(
+                200, make_forecast(coordinates_id(lat, lon), lat, lon))
+        return self.send_json(
+            200, make_weather(coordinates_id(lat, lon), lat, lon))
+
+    def send_json(
+            self, status: int, payload: dict, headers: dict | None = None,
+    ) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(
+        host: str = '127.0.0.1',
+        port: int = 8765,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+) -> None:
+    """Run the mock server until interrupted."""
+    server = MockOpenWeatherServer(
+        (host, port), latency=latency, error_rate=error_rate,
+        throttle_rate=throttle_rate,
+    )
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.latency, args.error_rate,
+          args.throttle_rate)
+
+
+if __name__ == '__main__':
+    main()
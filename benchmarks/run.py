@@ -0,0 +1,335 @@
+"""
+Benchmark of a full collection round against the local mock API.
+
+Every city count runs in its own process with a fresh database: a cold
+round fetching cities by coordinates, then a warm round an hour later,
+when cities have OpenWeatherMap IDs and can be fetched in groups.
+
+Usage:
+    python -m benchmarks.run --cities 50 1000 10000
+    python -m benchmarks.run --baseline benchmarks/results/previous.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timedelta
+from multiprocessing import Process
+from pathlib import Path
+
+from benchmarks.mock_server import serve
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+COMPARED_METRICS = ('wall_time', 'requests_per_sec', 'rows_per_sec')
+
+
+def environment(
+        args: argparse.Namespace, database_url: str, cities_count: int,
+) -> dict:
+    """
+    Build environment of a benchmark round process.
+
+    Args:
+        args (argparse.Namespace): Command line arguments.
+        database_url (str): URL of the benchmark database.
+        cities_count (int): Number of synthetic cities.
+
+    Returns:
+        dict: Environment variables.
+    """
+    return {
+        **os.environ,
+        'DATABASE_URL': database_url,
+        'CITIES_COUNT': str(cities_count),
+        'OPENWEATHER_API_KEY': 'benchmark',
+        'OPENWEATHER_API_URL': f'http://127.0.0.1:{args.port}',
+        'API_CALLS_PER_MINUTE': str(10 ** 9),
+        'API_CALLS_PER_MONTH': str(10 ** 12),
+        'LATEST_CACHE_ENABLED': 'false',
+        'RATE_LIMIT_BACKEND': 'local',
+        'DECODE_MODE': args.decode_mode,
+        'DB_MODE': args.db_mode,
+    }
+
+
+def seed_cities(cities_count: int) -> list[str]:
+    """
+    Insert synthetic cities into the database of the environment.
+
+    Args:
+        cities_count (int): Number of cities, also the random seed.
+
+    Returns:
+        list[str]: IDs of the inserted cities.
+    """
+    import random
+    import uuid
+
+    from sqlalchemy import insert
+
+    from database.engine import get_engine
+    from models import City
+
+    rnd = random.Random(cities_count)
+    rows = [
+        {
+            'id': str(uuid.uuid4()),
+            'name': f'City {i}',
+            'lat': round(rnd.uniform(-60, 70), 4),
+            'lon': round(rnd.uniform(-180, 180), 4),
+            'population': rnd.randint(10_000, 30_000_000),
+        }
+        for i in range(cities_count)
+    ]
+    with get_engine().begin() as connection:
+        connection.execute(insert(City), rows)
+    return [row['id'] for row in rows]
+
+
+def run_round(cities_count: int) -> dict:
+    """
+    Run cold and warm collection rounds in the current process.
+
+    Configuration is read from the environment, so this function has to
+    run in a process started with environment().
+
+    Args:
+        cities_count (int): Number of synthetic cities.
+
+    Returns:
+        dict: Measurements of both rounds, with the time spent in every
+        stage of the collection, and the peak memory.
+    """
+    from prometheus_client import REGISTRY
+    from sqlalchemy import func, select
+
+    from database import CityRepository, TableMaker
+    from database.engine import get_engine
+    from models import Weather
+    from weather_parser import collect_weather
+
+    TableMaker().create_tables()
+    engine = get_engine()
+    seed_cities(cities_count)
+
+    def count_rows() -> int:
+        with engine.connect() as connection:
+            return connection.execute(
+                select(func.count()).select_from(Weather)).scalar()
+
+    def stage_seconds() -> dict[str, float]:
+        return {
+            stage: REGISTRY.get_sample_value(
+                'weather_stage_seconds_sum', {'stage': stage}) or 0.0
+            for stage in ('plan', 'fetch', 'store', 'fetch_store', 'finish')
+        }
+
+    report = {}
+    round_at = datetime.utcnow()
+    for name in ('cold', 'warm'):
+        cities = CityRepository().get_all()
+        rows_before = count_rows()
+        stages_before = stage_seconds()
+        started = time.perf_counter()
+        stats = collect_weather(cities, round_at)
+        wall_time = time.perf_counter() - started
+        rows = count_rows() - rows_before
+        report[name] = {
+            'wall_time': wall_time,
+            'rows': rows,
+            'rows_per_sec': rows / wall_time if wall_time else 0.0,
+            'stats': stats,
+            'stages': {
+                stage: seconds - stages_before[stage]
+                for stage, seconds in stage_seconds().items()
+            },
+        }
+        round_at += timedelta(hours=1)
+        # The mock API stamps weather with the current second, make sure
+        # the warm round gets recalculated weather.
+        time.sleep(1)
+    report['peak_memory_mb'] = (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+    return report
+
+
+def server_stats(port: int) -> dict:
+    """Get request counters of the mock server."""
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}/stats') as result:
+        return json.load(result)
+
+
+def wait_for_server(port: int, timeout: float = 10.0) -> None:
+    """Wait until the mock server accepts connections."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            server_stats(port)
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def benchmark(args: argparse.Namespace, cities_count: int) -> dict:
+    """
+    Run the rounds of a city count in a child process and measure them.
+
+    Totals cover both rounds; per-round timings are kept under ``rounds``.
+
+    Args:
+        args (argparse.Namespace): Command line arguments.
+        cities_count (int): Number of synthetic cities.
+
+    Returns:
+        dict: Benchmark results of the city count.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = args.database_url or (
+            f'sqlite:///{directory}/benchmark.db')
+        before = server_stats(args.port)
+        process = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.run',
+             '--round', str(cities_count)],
+            env=environment(args, database_url, cities_count),
+            capture_output=True,
+            text=True,
+            cwd=Path(__file__).parent.parent,
+        )
+        after = server_stats(args.port)
+    if process.returncode:
+        sys.stderr.write(process.stderr)
+        raise RuntimeError(f'Benchmark of {cities_count} cities failed')
+    report = json.loads(process.stdout.strip().splitlines()[-1])
+    requests = after['requests'] - before['requests']
+    wall_time = report['cold']['wall_time'] + report['warm']['wall_time']
+    return {
+        'cities': cities_count,
+        'wall_time': wall_time,
+        'requests': requests,
+        'requests_per_sec': requests / wall_time if wall_time else 0.0,
+        'rows': report['cold']['rows'] + report['warm']['rows'],
+        'rows_per_sec': (
+            (report['cold']['rows'] + report['warm']['rows']) / wall_time
+            if wall_time else 0.0
+        ),
+        'errors': after['errors'] - before['errors'],
+        'throttled': after['throttled'] - before['throttled'],
+        'peak_memory_mb': report['peak_memory_mb'],
+        'rounds': {
+            name: report[name] for name in ('cold', 'warm')
+        },
+    }
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float) -> bool:
+    """
+    Compare results with a baseline and print regressions.
+
+    Args:
+        results (list[dict]): Results of this run.
+        baseline (dict): Saved results of an earlier run.
+        tolerance (float): Allowed relative slowdown, 0.2 for 20%.
+
+    Returns:
+        bool: True if no metric regressed more than the tolerance.
+    """
+    previous = {item['cities']: item for item in baseline['results']}
+    passed = True
+    for result in results:
+        old = previous.get(result['cities'])
+        if old is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if not old[metric]:
+                continue
+            change = result[metric] / old[metric] - 1
+            worse = change > tolerance if metric == 'wall_time' else (
+                change < -tolerance)
+            passed &= not worse
+            print(
+                f'{result["cities"]:>6} cities {metric:<17} '
+                f'{old[metric]:>10.2f} -> {result[metric]:>10.2f} '
+                f'({change:+.1%}){" REGRESSION" if worse else ""}'
+            )
+    return passed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Benchmark a collection round against a mock API.')
+    parser.add_argument(
+        '--cities', type=int, nargs='+', default=[50, 1000, 10000])
+    parser.add_argument('--database-url', help='SQLite in a temp dir if unset')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--output', type=Path)
+    parser.add_argument('--baseline', type=Path)
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument(
+        '--decode-mode', choices=('fast', 'pydantic'), default='fast')
+    parser.add_argument('--db-mode', choices=('sync', 'async'), default='sync')
+    parser.add_argument('--round', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.round:
+        print(json.dumps(run_round(args.round), default=str))
+        return
+
+    server = Process(
+        target=serve,
+        kwargs={
+            'port': args.port,
+            'latency': args.latency,
+            'error_rate': args.error_rate,
+            'throttle_rate': args.throttle_rate,
+        },
+        daemon=True,
+    )
+    server.start()
+    try:
+        wait_for_server(args.port)
+        results = []
+        for cities_count in args.cities:
+            result = benchmark(args, cities_count)
+            results.append(result)
+            print(
+                f'{cities_count:>6} cities: {result["wall_time"]:.2f}s, '
+                f'{result["requests_per_sec"]:.1f} req/s, '
+                f'{result["rows_per_sec"]:.1f} rows/s, '
+                f'{result["peak_memory_mb"]:.1f} MB'
+            )
+    finally:
+        server.terminate()
+
+    output = args.output or RESULTS_DIR / (
+        f'{datetime.utcnow():%Y%m%dT%H%M%S}.json')
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        'created_at': datetime.utcnow().isoformat(),
+        'settings': {
+            'latency': args.latency,
+            'error_rate': args.error_rate,
+            'throttle_rate': args.throttle_rate,
+            'database': 'custom' if args.database_url else 'sqlite',
+            'decode_mode': args.decode_mode,
+        },
+        'results': results,
+    }, indent=2))
+    print(f'Results saved to {output}')
+
+    if args.baseline and not compare(
+            results, json.loads(args.baseline.read_text()), args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
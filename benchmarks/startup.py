@@ -0,0 +1,212 @@
+"""
+Benchmark of worker startup: imports, one-time setup and the first task.
+
+Every run boots a fresh process, like a new worker container, with a
+fresh database and the local mock API. The worker is ready once the task
+modules are imported and the worker_init handlers ran; the run fails if
+the median ready time exceeds the target.
+
+Usage:
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --target 1.0 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from multiprocessing import Process
+from pathlib import Path
+
+from benchmarks.mock_server import serve
+from benchmarks.run import environment, wait_for_server
+
+ROOT = Path(__file__).parent.parent
+WORKER_READY_TARGET = 1.5
+PHASES = (
+    'interpreter', 'import', 'setup', 'ready', 'first_task', 'second_task')
+BOOT = (
+    'from celery_config import app; app.loader.import_default_modules()')
+
+
+def boot(cities_count: int, spawned_at: float) -> dict[str, float]:
+    """
+    Boot a worker in the current process and run two shard tasks.
+
+    Configuration is read from the environment, so this function has to
+    run in a process started with worker_environment().
+
+    Args:
+        cities_count (int): Number of synthetic cities of the shard.
+        spawned_at (float): Unix time the process was started at.
+
+    Returns:
+        dict[str, float]: Seconds spent in every phase of PHASES.
+    """
+    timings = {'interpreter': time.time() - spawned_at}
+    started = time.perf_counter()
+    from celery_config import app
+    app.loader.import_default_modules()
+    timings['import'] = time.perf_counter() - started
+
+    from celery.signals import worker_init
+    started = time.perf_counter()
+    worker_init.send(sender=None)
+    timings['setup'] = time.perf_counter() - started
+    timings['ready'] = sum(timings.values())
+
+    from benchmarks.run import seed_cities
+    from weather_parser import collect_shard
+    city_ids = seed_cities(cities_count)
+    round_at = datetime.utcnow()
+    for phase in ('first_task', 'second_task'):
+        started = time.perf_counter()
+        collect_shard(city_ids, round_at.isoformat())
+        timings[phase] = time.perf_counter() - started
+        round_at += timedelta(hours=1)
+    return timings
+
+
+def worker_environment(args: argparse.Namespace, database_url: str) -> dict:
+    """
+    Build environment of a worker process.
+
+    Args:
+        args (argparse.Namespace): Command line arguments.
+        database_url (str): URL of the benchmark database.
+
+    Returns:
+        dict: Environment variables.
+    """
+    return {
+        **environment(args, database_url, args.cities), 'METRICS_PORT': '0'}
+
+
+def measure(args: argparse.Namespace) -> dict[str, float]:
+    """
+    Boot a worker in a child process and measure its phases.
+
+    Args:
+        args (argparse.Namespace): Command line arguments.
+
+    Returns:
+        dict[str, float]: Seconds spent in every phase of PHASES.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        process = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.startup',
+             '--boot', str(time.time())],
+            env=worker_environment(args, f'sqlite:///{directory}/boot.db'),
+            capture_output=True,
+            text=True,
+            cwd=ROOT,
+        )
+    if process.returncode:
+        sys.stderr.write(process.stderr)
+        raise RuntimeError('Worker boot failed')
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def import_breakdown(args: argparse.Namespace) -> dict[str, float]:
+    """
+    Measure import time of the worker by top-level package.
+
+    Args:
+        args (argparse.Namespace): Command line arguments.
+
+    Returns:
+        dict[str, float]: Seconds spent importing modules of every
+        package, excluding their imports of other packages, slowest first.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', BOOT],
+            env=worker_environment(args, f'sqlite:///{directory}/boot.db'),
+            capture_output=True,
+            text=True,
+            cwd=ROOT,
+        )
+    totals = Counter()
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        self_us, _, name = line.removeprefix('import time:').split('|')
+        totals[name.strip().split('.')[0]] += int(self_us) / 10 ** 6
+    return dict(totals.most_common())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Benchmark worker startup against a mock API.')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--cities', type=int, default=100)
+    parser.add_argument('--target', type=float, default=WORKER_READY_TARGET)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--latency', type=float, default=0.01)
+    parser.add_argument('--output', type=Path)
+    parser.add_argument(
+        '--decode-mode', choices=('fast', 'pydantic'), default='fast')
+    parser.add_argument('--db-mode', choices=('sync', 'async'), default='sync')
+    parser.add_argument('--boot', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.boot:
+        print(json.dumps(boot(args.cities, args.boot)))
+        return
+
+    server = Process(
+        target=serve,
+        kwargs={'port': args.port, 'latency': args.latency},
+        daemon=True,
+    )
+    server.start()
+    try:
+        wait_for_server(args.port)
+        runs = [measure(args) for _ in range(args.runs)]
+    finally:
+        server.terminate()
+    medians = {
+        phase: statistics.median(run[phase] for run in runs)
+        for phase in PHASES
+    }
+    imports = import_breakdown(args)
+
+    for phase in PHASES:
+        print(f'{phase:<12} {medians[phase]:>8.3f}s')
+    print(f'Slowest imports of {sum(imports.values()):.3f}s:')
+    for package, seconds in list(imports.items())[:args.top]:
+        print(f'  {package:<24} {seconds:>8.3f}s')
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps({
+            'created_at': datetime.utcnow().isoformat(),
+            'settings': {
+                'runs': args.runs,
+                'cities': args.cities,
+                'target': args.target,
+                'decode_mode': args.decode_mode,
+                'db_mode': args.db_mode,
+                'python': sys.version.split()[0],
+                'cpus': os.cpu_count(),
+            },
+            'medians': medians,
+            'runs': runs,
+            'imports': imports,
+        }, indent=2))
+        print(f'Results saved to {args.output}')
+
+    if medians['ready'] > args.target:
+        print(f'Worker ready in {medians["ready"]:.3f}s, '
+              f'over the {args.target:.3f}s target')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
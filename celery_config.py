@@ -1,17 +1,34 @@
-from datetime import datetime
 from celery import Celery
-from celery.schedules import crontab
+
+from config import (
+    FORECAST_ENABLED, FORECAST_INTERVAL, REDIS_URL, ROUND_INTERVAL)
+from scheduling import FixedRate
 
 
 app = Celery(
     'parser_celery_project',
-    broker='redis://redis:6379/0',
-    include=['weather_parser'],
+    broker=f'{REDIS_URL}/0',
+    backend=f'{REDIS_URL}/1',
+    include=['weather_parser', 'forecast_parser'],
+)
+
+app.conf.update(
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    result_expires=24 * 60 * 60,
+    broker_transport_options={'visibility_timeout': 2 * ROUND_INTERVAL},
 )
 
 app.conf.beat_schedule = {
     'parse': {
         'task': 'weather_parser.parse_weather',
-        'schedule': crontab(minute=(datetime.now().minute + 1) % 60),
+        'schedule': FixedRate(),
     },
 }
+
+if FORECAST_ENABLED:
+    app.conf.beat_schedule['forecast'] = {
+        'task': 'forecast_parser.parse_forecasts',
+        'schedule': FixedRate(FORECAST_INTERVAL),
+    }
@@ -6,12 +6,75 @@ db_password = os.environ.get('POSTGRES_PASSWORD', 'postgres')
 db_host = os.environ.get('DB_HOST', 'db')
 db_port = os.environ.get('DB_PORT', '5432')
 db_name = os.environ.get('POSTGRES_DB', 'database')
-DATABASE_URL = (
+DATABASE_URL = os.environ.get('DATABASE_URL') or (
     f'postgresql+psycopg2://{db_user}:{db_password}@'
     f'{db_host}:{db_port}/{db_name}'
 )
 API_KEY = os.environ.get('OPENWEATHER_API_KEY')
-CITIES_COUNT = 50
+OPENWEATHER_API_URL = os.environ.get(
+    'OPENWEATHER_API_URL', 'https://api.openweathermap.org')
+CITIES_COUNT = int(os.environ.get('CITIES_COUNT', 50))
 LOGGING_FORMAT = '%(levelname)s: %(message)s'
 LOGGING_LEVEL = logging.INFO
-CHUNK_SIZE = 8
+CITIES_CSV = os.environ.get('CITIES_CSV', 'csv/cities.csv')
+LOAD_BATCH_SIZE = 5000
+WRITE_BATCH_SIZE = int(os.environ.get('WRITE_BATCH_SIZE', 500))
+FETCH_MODE = os.environ.get('FETCH_MODE', 'async')
+DB_MODE = os.environ.get('DB_MODE', 'sync')
+DECODE_MODE = os.environ.get('DECODE_MODE', 'fast')
+API_CALLS_PER_MINUTE = int(os.environ.get('API_CALLS_PER_MINUTE', 60))
+API_CALLS_PER_MONTH = int(os.environ.get('API_CALLS_PER_MONTH', 1_000_000))
+API_CONCURRENCY = int(os.environ.get('API_CONCURRENCY', 20))
+GROUP_FETCH = os.environ.get('GROUP_FETCH', 'true').lower() == 'true'
+GROUP_SIZE = 20
+API_TIMEOUT = 10
+API_RETRIES = 5
+API_BACKOFF_FACTOR = 0.1
+API_THROTTLE_DELAY = 1
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'redis')
+AIMD_DECREASE = 0.5
+AIMD_RECOVERY_CALLS = 100
+ROUND_RETRIES = int(os.environ.get('ROUND_RETRIES', 2))
+ROUND_RETRY_DELAY = int(os.environ.get('ROUND_RETRY_DELAY', 5))
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 20))
+HTTP_KEEPALIVE_IDLE = 60
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://redis:6379')
+SHARD_SIZE = int(os.environ.get('SHARD_SIZE', 200))
+SHARE_RADIUS_KM = float(os.environ.get('SHARE_RADIUS_KM', 0))
+WEATHER_PARTITIONED = (
+    os.environ.get('WEATHER_PARTITIONED', 'false').lower() == 'true')
+PARTITION_MONTHS_AHEAD = 2
+WEATHER_RETENTION_MONTHS = int(os.environ.get('WEATHER_RETENTION_MONTHS', 24))
+LATEST_CACHE_ENABLED = (
+    os.environ.get('LATEST_CACHE_ENABLED', 'true').lower() == 'true')
+LATEST_CACHE_TTL = 2 * 60 * 60
+POLL_BASE_INTERVAL = 60 * 60
+POLL_MAX_INTERVAL = int(os.environ.get('POLL_MAX_INTERVAL', 4 * 60 * 60))
+POLL_SLACK = 5 * 60
+ROUND_INTERVAL = int(os.environ.get('ROUND_INTERVAL', 60 * 60))
+ROUND_OFFSET = int(os.environ.get('ROUND_OFFSET', 0))
+ROUND_LOCK_TTL = int(
+    os.environ.get('ROUND_LOCK_TTL', ROUND_INTERVAL + ROUND_INTERVAL // 10))
+ROUND_SPREAD_SHARE = float(os.environ.get('ROUND_SPREAD_SHARE', 0.5))
+READ_API_PORT = int(os.environ.get('READ_API_PORT', 8080))
+READ_API_CACHE_SIZE = int(os.environ.get('READ_API_CACHE_SIZE', 1024))
+READ_API_VERSION_TTL = int(os.environ.get('READ_API_VERSION_TTL', 10))
+READ_API_MAX_LIMIT = 1000
+WORK_MAX_ATTEMPTS = int(os.environ.get('WORK_MAX_ATTEMPTS', 5))
+WORK_RETRY_DELAY = int(os.environ.get('WORK_RETRY_DELAY', 60))
+WORK_RETENTION_DAYS = int(os.environ.get('WORK_RETENTION_DAYS', 7))
+FORECAST_ENABLED = (
+    os.environ.get('FORECAST_ENABLED', 'false').lower() == 'true')
+FORECAST_INTERVAL = int(os.environ.get('FORECAST_INTERVAL', 3 * 60 * 60))
+RECENT_STORE_DIR = os.environ.get('RECENT_STORE_DIR', '')
+RECENT_STORE_DAYS = int(os.environ.get('RECENT_STORE_DAYS', 30))
+ROUND_WARNING_SHARE = 0.8
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 9100))
+EXPORT_DIR = os.environ.get('EXPORT_DIR', 'exports/weather')
+EXPORT_BATCH_SIZE = 50_000
+EXPORT_LAG = ROUND_INTERVAL
+COOLING_BASE_TEMPERATURE = float(
+    os.environ.get('COOLING_BASE_TEMPERATURE', 291.15))
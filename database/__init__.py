@@ -1,3 +1,26 @@
-from .database import CityRepository, TableMaker, WeatherRepository
+from .cache import LatestWeatherCache, get_latest_cache, get_redis
+from .database import (
+    CityRepository, ForecastRepository, PollStateRepository,
+    RollupRepository, TableMaker, WeatherRepository)
+from .engine import (
+    dispose_async_engines, dispose_engines, get_async_engine, get_engine)
 
-__all__ = [CityRepository, TableMaker, WeatherRepository]
+__all__ = [
+    CityRepository, ForecastRepository, LatestWeatherCache,
+    PollStateRepository, RollupRepository, TableMaker, WeatherRepository,
+    dispose_async_engines, dispose_engines, get_async_engine, get_engine,
+    get_latest_cache, get_redis,
+]
+
+ASYNC_REPOSITORIES = ('AsyncCityRepository', 'AsyncWeatherRepository')
+
+
+def __getattr__(name: str):
+    """
+    Import the asyncio repositories on first use, so processes with
+    DB_MODE sync do not load SQLAlchemy asyncio.
+    """
+    if name in ASYNC_REPOSITORIES:
+        from . import async_database
+        return getattr(async_database, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,328 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncConnection, async_sessionmaker
+
+from config import CITIES_COUNT, DATABASE_URL
+from models import City, CityRecord, Weather
+from schemas import WeatherOpenWeatherResponse, WeatherRecord
+from .cache import LatestWeatherCache, update_cache_safely
+from .database import BaseModelRepository, CityRepository, WeatherRepository
+from .engine import get_async_engine
+
+
+class AsyncDatabase:
+    """
+    Bind asyncio session factory to the engine of the running event loop.
+
+    Repositories have to be created inside the event loop they are used in.
+    """
+    def __init__(self, database_url: str = DATABASE_URL) -> None:
+        self.engine = get_async_engine(database_url)
+        self.session = async_sessionmaker(
+            bind=self.engine, expire_on_commit=False)
+
+
+class AsyncCityRepository(AsyncDatabase, BaseModelRepository):
+    """
+    Asyncio version of CityRepository.
+
+    Shares the top cities cache with CityRepository.
+    """
+
+    RECORD_COLUMNS = CityRepository.RECORD_COLUMNS
+
+    async def get_all(self, count: int = CITIES_COUNT) -> list[CityRecord]:
+        """
+        Get a list of the most populated cities in the database, ordered by
+        population in descending order.
+
+        Args:
+            count (int): Number of cities.
+
+        Returns:
+            list[CityRecord]: A list of city records.
+        """
+        key = (str(self.engine.url), count)
+        async with self.engine.connect() as connection:
+            version = (await connection.execute(
+                select(func.max(City.updated_at)))).scalar()
+            cached = CityRepository._top_cache.get(key)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            results = [
+                CityRecord(*row) for row in await connection.execute(
+                    select(*self.RECORD_COLUMNS).order_by(
+                        City.population.desc()).limit(count))
+            ]
+        if version is not None:
+            with CityRepository._top_cache_lock:
+                CityRepository._top_cache[key] = (version, results)
+        return results
+
+    async def write_one(self, city: City) -> None:
+        """
+        Write a single city to the database.
+
+        Args:
+            city (City): The City object to be written to the database.
+        """
+        new_city = City(
+            name=city.name,
+            lat=city.lat,
+            lon=city.lon,
+            population=city.population,
+        )
+        async with self.session() as session:
+            try:
+                session.add(new_city)
+                await session.commit()
+            except Exception as e:
+                logging.error(f'An error occured: {e}')
+
+        logging.info(f'City {new_city} added.')
+
+    async def set_owm_ids(self, owm_ids: dict[str, int]) -> None:
+        """
+        Save OpenWeatherMap IDs of cities.
+
+        Args:
+            owm_ids (dict[str, int]): OpenWeatherMap ID by city ID.
+        """
+        if not owm_ids:
+            return
+        async with self.session() as session:
+            updated_at = datetime.utcnow()
+            await session.execute(
+                update(City),
+                [
+                    {'id': city_id, 'owm_id': owm_id, 'updated_at': updated_at}
+                    for city_id, owm_id in owm_ids.items()
+                ],
+            )
+            await session.commit()
+        logging.info(f'OpenWeatherMap IDs of {len(owm_ids)} cities saved.')
+
+    async def get_by_ids(self, city_ids: Iterable[str]) -> list[CityRecord]:
+        """
+        Get cities by their IDs, ordered by population in descending order.
+
+        Args:
+            city_ids (Iterable[str]): IDs of the cities.
+
+        Returns:
+            list[CityRecord]: A list of city records.
+        """
+        async with self.engine.connect() as connection:
+            results = [
+                CityRecord(*row) for row in await connection.execute(
+                    select(*self.RECORD_COLUMNS).where(
+                        City.id.in_(list(city_ids))).order_by(
+                            City.population.desc()))
+            ]
+        return results
+
+
+class AsyncWeatherRepository(AsyncDatabase, BaseModelRepository):
+    """
+    Asyncio version of WeatherRepository.
+
+    Writes do not block the event loop, so a collector can store one batch
+    of weather while requests of the next batch are in flight.
+
+    Attributes:
+        cache (LatestWeatherCache | None): Cache of the latest weather of
+            every city, updated on every write.
+    """
+
+    COPY_COLUMNS = WeatherRepository.COPY_COLUMNS
+    make_row = staticmethod(WeatherRepository.make_row)
+
+    def __init__(
+            self,
+            database_url: str = DATABASE_URL,
+            cache: LatestWeatherCache | None = None,
+    ) -> None:
+        super().__init__(database_url)
+        self.cache = cache
+
+    async def get_all(
+            self,
+            city: CityRecord,
+            since: datetime | None = None,
+            limit: int | None = None,
+            until: datetime | None = None,
+    ) -> list[Weather]:
+        """
+        Get a list of all weather of city in the database,
+        newest first.
+
+        Args:
+            city (CityRecord): The city to get weather for.
+            since (datetime | None): Only weather stored after this time.
+            limit (int | None): Maximum number of records.
+            until (datetime | None): Only weather stored before this time,
+                the ``created_at`` of the last record of the previous page
+                when paging through history.
+
+        Returns:
+            list[Weather]: A list of Weather objects.
+        """
+        query = select(Weather).where(Weather.city_id == city.id)
+        if since is not None:
+            query = query.where(Weather.created_at >= since)
+        if until is not None:
+            query = query.where(Weather.created_at < until)
+        query = query.order_by(Weather.created_at.desc()).limit(limit)
+        async with self.session() as session:
+            results = (await session.scalars(query)).all()
+        return results
+
+    async def get_collected(
+            self, city_ids: Iterable[str], created_at: datetime) -> set[str]:
+        """
+        Get IDs of cities that already have weather of a collection round.
+
+        Args:
+            city_ids (Iterable[str]): IDs of the cities to check.
+            created_at (datetime): Timestamp of the collection round.
+
+        Returns:
+            set[str]: IDs of the cities with stored weather.
+        """
+        async with self.session() as session:
+            results = (await session.scalars(
+                select(Weather.city_id).where(
+                    Weather.city_id.in_(list(city_ids)),
+                    Weather.created_at == created_at,
+                )
+            )).all()
+        return set(results)
+
+    async def write_one(
+            self,
+            weather: WeatherOpenWeatherResponse | WeatherRecord,
+            city: CityRecord,
+            created_at: datetime | None = None,
+    ) -> None:
+        """
+        Write a single weather to the database.
+
+        Args:
+            weather (WeatherOpenWeatherResponse | WeatherRecord): The
+                Weather object or its flat record.
+            city (CityRecord): The city the weather belongs to.
+            created_at (datetime | None): Timestamp of the collection round,
+                the current time by default. Weather already stored for
+                the city and round is left as is.
+        """
+        row = self.make_row(
+            weather, city, created_at=created_at or datetime.utcnow())
+        async with self.engine.begin() as connection:
+            inserted = await self._insert_rows(connection, [row])
+        if self.cache and inserted:
+            await asyncio.to_thread(update_cache_safely, self.cache, inserted)
+        logging.info(f'Weather in {city.name} is saved')
+
+    async def write_many(
+            self,
+            objs: Iterable[
+                tuple[WeatherOpenWeatherResponse | WeatherRecord, CityRecord]],
+            created_at: datetime | None = None,
+    ) -> int:
+        """
+        Write many weather records to the database in one transaction.
+
+        PostgreSQL gets the rows through asyncpg's binary ``COPY``, other
+        databases through a single executemany insert. Records already
+        stored for the city and round are skipped.
+
+        Args:
+            objs (Iterable[tuple[WeatherOpenWeatherResponse | WeatherRecord,
+                CityRecord]]): Pairs of the Weather object or its flat record
+                and the city it belongs to.
+            created_at (datetime | None): Timestamp of the collection round,
+                the current time by default.
+
+        Returns:
+            int: Number of written records.
+        """
+        created_at = created_at or datetime.utcnow()
+        rows = [
+            self.make_row(weather, city, created_at=created_at)
+            for weather, city in objs
+        ]
+        if not rows:
+            return 0
+        async with self.engine.begin() as connection:
+            if connection.dialect.name == 'postgresql':
+                inserted = await self._copy_rows(connection, rows)
+            else:
+                inserted = await self._insert_rows(connection, rows)
+        if self.cache and inserted:
+            await asyncio.to_thread(update_cache_safely, self.cache, inserted)
+        logging.info(f'{len(inserted)} weather records are saved')
+        return len(inserted)
+
+    @staticmethod
+    async def _insert_rows(
+            connection: AsyncConnection, rows: list[dict]) -> list[dict]:
+        """
+        Insert rows with one executemany, like WeatherRepository does.
+
+        Args:
+            connection (AsyncConnection): Connection with an open
+                transaction.
+            rows (list[dict]): Column values of the weather table.
+
+        Returns:
+            list[dict]: Cached columns of the inserted rows, all rows if
+            the database cannot tell which were inserted.
+        """
+        statement = WeatherRepository._insert_returning(connection)
+        if statement is None:
+            await connection.execute(
+                WeatherRepository._insert(connection), rows)
+            return rows
+        result = await connection.execute(statement, rows)
+        return [dict(row) for row in result.mappings()]
+
+    async def _copy_rows(
+            self, connection: AsyncConnection, rows: list[dict],
+    ) -> list[dict]:
+        """
+        Load rows into the weather table with asyncpg ``COPY``.
+
+        Args:
+            connection (AsyncConnection): Connection with an open
+                transaction.
+            rows (list[dict]): Column values of the weather table.
+
+        Returns:
+            list[dict]: Cached columns of the inserted rows.
+        """
+        columns = ', '.join(self.COPY_COLUMNS)
+        await connection.execute(text(
+            'CREATE TEMPORARY TABLE weather_staging '
+            f'(LIKE {Weather.__tablename__} INCLUDING DEFAULTS) '
+            'ON COMMIT DROP'
+        ))
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            'weather_staging',
+            records=[
+                tuple(row[column] for column in self.COPY_COLUMNS)
+                for row in rows
+            ],
+            columns=list(self.COPY_COLUMNS),
+        )
+        result = await connection.execute(text(
+            f'INSERT INTO {Weather.__tablename__} ({columns}) '
+            f'SELECT {columns} FROM weather_staging '
+            'ON CONFLICT (city_id, created_at) DO NOTHING '
+            f'RETURNING {", ".join(LatestWeatherCache.FIELDS)}'
+        ))
+        return [dict(row) for row in result.mappings()]
@@ -0,0 +1,191 @@
+import logging
+import threading
+from datetime import datetime
+from typing import Iterable
+
+import redis
+
+from config import LATEST_CACHE_ENABLED, LATEST_CACHE_TTL, REDIS_URL
+
+_clients: dict[int, redis.Redis] = {}
+_clients_lock = threading.Lock()
+# Replaces the hash of a city only with a newer observation. ISO
+# timestamps of naive UTC datetimes compare correctly as strings.
+SET_IF_NEWER = """
+local current = redis.call('HGET', KEYS[1], 'created_at')
+if current and current >= ARGV[2] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+def get_redis(db: int = 2) -> redis.Redis:
+    """
+    Get the process-wide Redis client of a database.
+
+    The broker uses database 0 and the result backend database 1, so
+    application data lives in database 2 by default.
+
+    Args:
+        db (int): Number of the Redis database.
+
+    Returns:
+        redis.Redis: The shared client with its own connection pool.
+    """
+    with _clients_lock:
+        client = _clients.get(db)
+        if client is None:
+            client = redis.Redis.from_url(
+                f'{REDIS_URL}/{db}', decode_responses=True)
+            _clients[db] = client
+    return client
+
+
+class LatestWeatherCache:
+    """
+    Latest weather observation of every city, kept in Redis hashes.
+
+    Every city has a hash with the columns of its newest weather record.
+    A hash is replaced only by a record with a newer ``created_at``, so a
+    late retry of an earlier round or a read racing with a write does not
+    put older weather back. Hashes expire after LATEST_CACHE_TTL, so a
+    city that stopped being collected falls back to the database instead
+    of serving stale weather.
+
+    Attributes:
+        client (redis.Redis): The Redis client.
+        ttl (int): Lifetime of a hash in seconds.
+    """
+
+    KEY = 'weather:latest:{city_id}'
+    FIELDS = {
+        'temperature': float,
+        'weather': str,
+        'weather_description': str,
+        'pressure': int,
+        'humidity': int,
+        'wind_speed': float,
+        'wind_direction': float,
+        'clouds': int,
+        'observed_at': datetime.fromisoformat,
+        'city_id': str,
+        'created_at': datetime.fromisoformat,
+    }
+
+    def __init__(
+            self, client: redis.Redis, ttl: int = LATEST_CACHE_TTL) -> None:
+        self.client = client
+        self.ttl = ttl
+        self._set_if_newer = client.register_script(SET_IF_NEWER)
+
+    def set_many(self, rows: Iterable[dict]) -> None:
+        """
+        Store weather rows as the latest observations of their cities.
+
+        A row replaces the cached observation of its city only if that one
+        is missing or has an older ``created_at``.
+
+        Args:
+            rows (Iterable[dict]): Column values of the weather table.
+        """
+        pipeline = self.client.pipeline(transaction=False)
+        for row in rows:
+            values = []
+            for field in self.FIELDS:
+                if row.get(field) is not None:
+                    values += [field, self._dump(row[field])]
+            self._set_if_newer(
+                keys=[self.KEY.format(city_id=row['city_id'])],
+                args=[self.ttl, self._dump(row['created_at']), *values],
+                client=pipeline,
+            )
+        pipeline.execute()
+
+    def get_many(self, city_ids: Iterable[str]) -> dict[str, dict]:
+        """
+        Get the latest observations of cities in one round trip.
+
+        Args:
+            city_ids (Iterable[str]): IDs of the cities.
+
+        Returns:
+            dict[str, dict]: Latest weather by city ID. Cities without
+            a cached observation are missing.
+        """
+        city_ids = list(city_ids)
+        pipeline = self.client.pipeline(transaction=False)
+        for city_id in city_ids:
+            pipeline.hgetall(self.KEY.format(city_id=city_id))
+        latest = {}
+        for city_id, values in zip(city_ids, pipeline.execute()):
+            if values:
+                latest[city_id] = self._load(values)
+        return latest
+
+    @staticmethod
+    def _dump(value) -> str:
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return str(value)
+
+    def _load(self, values: dict[str, str]) -> dict:
+        return {
+            field: cast(values[field]) if field in values else None
+            for field, cast in self.FIELDS.items()
+        }
+
+
+def get_latest_cache() -> LatestWeatherCache | None:
+    """
+    Get the latest weather cache, if it is enabled.
+
+    Returns:
+        LatestWeatherCache | None: The cache, or None with
+        LATEST_CACHE_ENABLED turned off.
+    """
+    if not LATEST_CACHE_ENABLED:
+        return None
+    return LatestWeatherCache(get_redis())
+
+
+def read_cache_safely(
+        cache: LatestWeatherCache, city_ids: list[str]) -> dict[str, dict]:
+    """
+    Read the cache, logging instead of raising on Redis errors.
+
+    On a Redis outage every city is a cache miss, so the latest weather
+    is read from the database.
+
+    Args:
+        cache (LatestWeatherCache): The cache to read.
+        city_ids (list[str]): IDs of the cities.
+
+    Returns:
+        dict[str, dict]: Cached weather by city ID, empty on errors.
+    """
+    try:
+        return cache.get_many(city_ids)
+    except redis.RedisError as e:
+        logging.error(f'Latest weather cache is not read: {e}')
+        return {}
+
+
+def update_cache_safely(cache: LatestWeatherCache, rows: list[dict]) -> None:
+    """
+    Update the cache, logging instead of raising on Redis errors.
+
+    The database is the source of truth, so a Redis outage must not fail
+    a write that is already committed.
+
+    Args:
+        cache (LatestWeatherCache): The cache to update.
+        rows (list[dict]): Column values of the weather table.
+    """
+    try:
+        cache.set_many(rows)
+    except redis.RedisError as e:
+        logging.error(f'Latest weather cache is not updated: {e}')
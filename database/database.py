@@ -1,15 +1,29 @@
 import csv
+import io
 import logging
+import threading
 import uuid
 from abc import ABC, abstractmethod
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Iterable
 
-from sqlalchemy import create_engine
+from sqlalchemy import (
+    ColumnElement, Connection, DateTime, Insert, Select, and_, case, func,
+    inspect, literal, select, text, update)
 from sqlalchemy.orm import sessionmaker
 
-from config import CITIES_COUNT, CHUNK_SIZE
-from models import Base, City, Weather
-from schemas import WeatherOpenWeatherResponse
+from config import (
+    CITIES_COUNT, CITIES_CSV, COOLING_BASE_TEMPERATURE, DATABASE_URL,
+    WEATHER_PARTITIONED)
+from models import (
+    Base, City, CityPollState, CityRecord, Forecast, Weather, WeatherDaily,
+    WeatherHourly)
+from schemas import ForecastStep, WeatherOpenWeatherResponse, WeatherRecord
+from .cache import (
+    LatestWeatherCache, read_cache_safely, update_cache_safely)
+from .engine import dialect_insert, get_engine
+from .loader import load_cities
+from .partitions import create_partitioned_table, ensure_partitions
 
 
 class BaseModelRepository(ABC):
@@ -40,6 +54,19 @@ class BaseModelRepository(ABC):
         """
         pass
 
+    def write_many(self, objs: Iterable) -> None:
+        """
+        Write many records to the database.
+
+        Repositories with a bulk path override this; by default records are
+        written one by one.
+
+        Args:
+            objs (Iterable): Records to be written to the database.
+        """
+        for obj in objs:
+            self.write_one(obj)
+
 
 class TableMaker:
     """
@@ -51,7 +78,7 @@ class TableMaker:
         base (declarative_base): The declarative base instance
             containing model definitions.
     """
-    def __init__(self, datbase_url: str, base: Base):
+    def __init__(self, datbase_url: str = DATABASE_URL, base: Base = Base):
         """
         Initialize the TableMaker.
 
@@ -61,39 +88,120 @@ class TableMaker:
             base (declarative_base): The declarative base instance
                 containing model definitions.
         """
-        self.engine = create_engine(datbase_url)
+        self.engine = get_engine(datbase_url)
         self.base = base
 
     def create_tables(self):
         """
         Create database tables based on the provided SQLAlchemy models.
+
+        Tables created by an older version of the models get the columns
+        and indexes added since then. With WEATHER_PARTITIONED on PostgreSQL
+        a new weather table is created partitioned by month.
         """
+        if (WEATHER_PARTITIONED
+                and self.engine.dialect.name == 'postgresql'
+                and not inspect(self.engine).has_table(Weather.__tablename__)):
+            self.base.metadata.create_all(self.engine, tables=[
+                table for table in self.base.metadata.sorted_tables
+                if table.name != Weather.__tablename__
+            ])
+            with self.engine.begin() as connection:
+                create_partitioned_table(connection)
         self.base.metadata.create_all(self.engine)
+        self.add_missing_columns()
+        ensure_partitions(self.engine)
+
+    def add_missing_columns(self):
+        """
+        Add model columns and indexes missing in the existing tables.
+
+        Only nullable columns can be added this way, which is enough for
+        columns holding optional data filled in by the collector.
+        """
+        inspector = inspect(self.engine)
+        with self.engine.begin() as connection:
+            for table in self.base.metadata.sorted_tables:
+                existing = {
+                    column['name']
+                    for column in inspector.get_columns(table.name)
+                }
+                for column in table.columns:
+                    if column.name in existing:
+                        continue
+                    column_type = column.type.compile(
+                        dialect=connection.dialect)
+                    connection.execute(text(
+                        f'ALTER TABLE {table.name} '
+                        f'ADD COLUMN {column.name} {column_type}'
+                    ))
+                    logging.info(f'Column {table.name}.{column.name} added.')
+                for index in table.indexes:
+                    index.create(connection, checkfirst=True)
 
 
 class Database:
-    """Create database session and engine in object."""
-    def __init__(self, database_url: str) -> None:
-        self.engine = create_engine(database_url, pool_pre_ping=True)
+    """Bind database session factory to the shared engine of the process."""
+    def __init__(self, database_url: str = DATABASE_URL) -> None:
+        self.engine = get_engine(database_url)
         self.session = sessionmaker(bind=self.engine)
 
 
 class CityRepository(Database, BaseModelRepository):
-    """Repository for interacting with City objects in the database."""
+    """
+    Repository for interacting with City objects in the database.
 
-    def get_all(self) -> list[City]:
+    The top cities are cached in the process together with the newest
+    updated_at of the cities table and are read again only after the
+    table changes.
+    """
+
+    RECORD_COLUMNS = (
+        City.id, City.name, City.lat, City.lon, City.population, City.owm_id)
+
+    _top_cache: dict[tuple, tuple[datetime, list[CityRecord]]] = {}
+    _top_cache_lock = threading.Lock()
+
+    def get_all(self, count: int = CITIES_COUNT) -> list[CityRecord]:
         """
-        Get a list of all cities in the database, ordered by population in
-        descending order.
+        Get a list of the most populated cities in the database, ordered by
+        population in descending order.
+
+        Args:
+            count (int): Number of cities.
 
         Returns:
-            list[City]: A list of City objects.
+            list[CityRecord]: A list of city records.
         """
-        with self.session() as session:
-            results = session.query(City).order_by(
-                City.population.desc()).limit(CITIES_COUNT).all()
+        key = (str(self.engine.url), count)
+        with self.engine.connect() as connection:
+            version = connection.execute(
+                select(func.max(City.updated_at))).scalar()
+            cached = self._top_cache.get(key)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            results = [
+                CityRecord(*row) for row in connection.execute(
+                    select(*self.RECORD_COLUMNS).order_by(
+                        City.population.desc()).limit(count))
+            ]
+        if version is not None:
+            with self._top_cache_lock:
+                self._top_cache[key] = (version, results)
         return results
 
+    def last_update(self) -> datetime | None:
+        """
+        Get the time of the latest change of any city.
+
+        Returns:
+            datetime | None: The newest ``updated_at``, None if there are
+            no cities.
+        """
+        with self.engine.connect() as connection:
+            return connection.execute(
+                select(func.max(City.updated_at))).scalar()
+
     def write_one(self, city: City) -> None:
         """
         Write a single city to the database.
@@ -116,75 +224,781 @@ class CityRepository(Database, BaseModelRepository):
 
         logging.info(f'City {new_city} added.')
 
-    def fill_database(self) -> None:
+    def set_owm_ids(self, owm_ids: dict[str, int]) -> None:
+        """
+        Save OpenWeatherMap IDs of cities.
+
+        Args:
+            owm_ids (dict[str, int]): OpenWeatherMap ID by city ID.
+        """
+        if not owm_ids:
+            return
+        with self.session() as session:
+            updated_at = datetime.utcnow()
+            session.execute(
+                update(City),
+                [
+                    {'id': city_id, 'owm_id': owm_id, 'updated_at': updated_at}
+                    for city_id, owm_id in owm_ids.items()
+                ],
+            )
+            session.commit()
+        logging.info(f'OpenWeatherMap IDs of {len(owm_ids)} cities saved.')
+
+    def get_by_ids(self, city_ids: Iterable[str]) -> list[CityRecord]:
+        """
+        Get cities by their IDs, ordered by population in descending order.
+
+        Args:
+            city_ids (Iterable[str]): IDs of the cities.
+
+        Returns:
+            list[CityRecord]: A list of city records.
+        """
+        with self.engine.connect() as connection:
+            results = [
+                CityRecord(*row) for row in connection.execute(
+                    select(*self.RECORD_COLUMNS).where(
+                        City.id.in_(list(city_ids))).order_by(
+                            City.population.desc()))
+            ]
+        return results
+
+    def fill_database(self, path: str = CITIES_CSV) -> dict:
         """
-        Fill the database with cities from a predefined list by chunks.
+        Fill the database with cities from a CSV or gzipped CSV file.
 
         Note:
             This method is used to populate the database with cities.
+            It is safe to run again: cities are upserted on name and
+            coordinates (see database.loader).
 
-        Raises:
-            Exception: An error occurred if there was a problem adding a city.
-        """
-        with open('csv/cities.csv', 'r') as f:
-            reader = csv.DictReader(f)
-            chunk = []
-            for city in reader:
-                chunk.append(City(**city, id=str(uuid.uuid4())))
-                if len(chunk) >= CHUNK_SIZE:
-                    with self.session() as session:
-                        session.add_all(chunk)
-                        session.commit()
-                    chunk = []
-            if chunk:
-                with self.session() as session:
-                    session.add_all(chunk)
-                    session.commit()
+        Args:
+            path (str): Path to the file.
+
+        Returns:
+            dict: Load statistics with the ``rows_per_sec`` rate.
+        """
+        stats = load_cities(self.engine, path)
         logging.info('Filled cities to db.')
+        return stats
 
 
 class WeatherRepository(Database, BaseModelRepository):
-    """Repository for interacting with Weather objects in the database."""
+    """
+    Repository for interacting with Weather objects in the database.
+
+    Attributes:
+        cache (LatestWeatherCache | None): Cache of the latest weather of
+            every city, updated on every write.
+    """
+
+    COPY_COLUMNS = (
+        'id', 'temperature', 'weather', 'weather_description', 'pressure',
+        'humidity', 'wind_speed', 'wind_direction', 'clouds', 'observed_at',
+        'city_id', 'created_at',
+    )
+
+    def __init__(
+            self,
+            database_url: str = DATABASE_URL,
+            cache: LatestWeatherCache | None = None,
+    ) -> None:
+        super().__init__(database_url)
+        self.cache = cache
+
+    @staticmethod
+    def make_row(
+            weather: WeatherOpenWeatherResponse | WeatherRecord,
+            city: CityRecord,
+            created_at: datetime,
+    ) -> dict:
+        """
+        Build a weather table row from an API response.
 
-    def get_all(self, city: City) -> list[Weather]:
+        Args:
+            weather (WeatherOpenWeatherResponse | WeatherRecord): The
+                Weather object or its flat record.
+            city (CityRecord): The city the weather belongs to.
+            created_at (datetime): Timestamp of the record.
+
+        Returns:
+            dict: Column values of the weather table.
+        """
+        if not isinstance(weather, WeatherRecord):
+            weather = WeatherRecord.from_response(weather)
+        return {
+            'id': uuid.uuid4(),
+            'temperature': weather.temperature,
+            'weather': weather.weather,
+            'weather_description': weather.weather_description,
+            'pressure': weather.pressure,
+            'humidity': weather.humidity,
+            'wind_speed': weather.wind_speed,
+            'wind_direction': weather.wind_direction,
+            'clouds': weather.clouds,
+            'observed_at': datetime.utcfromtimestamp(weather.dt),
+            'city_id': city.id,
+            'created_at': created_at,
+        }
+
+    def get_all(
+            self,
+            city: CityRecord,
+            since: datetime | None = None,
+            limit: int | None = None,
+            until: datetime | None = None,
+    ) -> list[Weather]:
         """
         Get a list of all weather of city in the database,
-        ordered by population in descending order.
+        newest first.
+
+        The query is served by the (city_id, created_at DESC) index, and
+        ``since`` lets PostgreSQL skip partitions older than it.
 
         Args:
-            city (City): The City object to be written to the database.
+            city (CityRecord): The city to get weather for.
+            since (datetime | None): Only weather stored after this time.
+            limit (int | None): Maximum number of records.
+            until (datetime | None): Only weather stored before this time,
+                the ``created_at`` of the last record of the previous page
+                when paging through history.
 
         Returns:
             list[Weather]: A list of Weather objects.
         """
+        query = select(Weather).where(Weather.city_id == city.id)
+        if since is not None:
+            query = query.where(Weather.created_at >= since)
+        if until is not None:
+            query = query.where(Weather.created_at < until)
+        query = query.order_by(Weather.created_at.desc()).limit(limit)
         with self.session() as session:
-            results = session.query(Weather).where(city_id=city.id).order_by(
-                Weather.created_at.desc()).all()
+            results = session.scalars(query).all()
         return results
 
+    def get_latest(self, city_ids: Iterable[str]) -> dict[str, dict]:
+        """
+        Get the latest weather of cities.
+
+        The cache answers in one pipelined round trip; only cities missing
+        from it are read from the database and then put into the cache.
+        When Redis is unavailable, all cities are read from the database.
+
+        Args:
+            city_ids (Iterable[str]): IDs of the cities.
+
+        Returns:
+            dict[str, dict]: Latest weather columns by city ID. Cities
+            without any weather are missing.
+        """
+        city_ids = list(city_ids)
+        latest = read_cache_safely(self.cache, city_ids) if self.cache else {}
+        missing = [city_id for city_id in city_ids if city_id not in latest]
+        if not missing:
+            return latest
+        newest = (
+            select(
+                Weather.city_id,
+                func.max(Weather.created_at).label('created_at'),
+            )
+            .where(Weather.city_id.in_(missing))
+            .group_by(Weather.city_id)
+            .subquery()
+        )
+        query = select(Weather.__table__).join(
+            newest,
+            (Weather.city_id == newest.c.city_id)
+            & (Weather.created_at == newest.c.created_at),
+        )
+        with self.engine.connect() as connection:
+            rows = [
+                {field: row[field] for field in LatestWeatherCache.FIELDS}
+                for row in connection.execute(query).mappings()
+            ]
+        if self.cache and rows:
+            update_cache_safely(self.cache, rows)
+        latest.update((row['city_id'], row) for row in rows)
+        return latest
+
+    def get_collected(
+            self, city_ids: Iterable[str], created_at: datetime) -> set[str]:
+        """
+        Get IDs of cities that already have weather of a collection round.
+
+        Args:
+            city_ids (Iterable[str]): IDs of the cities to check.
+            created_at (datetime): Timestamp of the collection round.
+
+        Returns:
+            set[str]: IDs of the cities with stored weather.
+        """
+        with self.session() as session:
+            results = session.scalars(
+                select(Weather.city_id).where(
+                    Weather.city_id.in_(list(city_ids)),
+                    Weather.created_at == created_at,
+                )
+            ).all()
+        return set(results)
+
     def write_one(
-            self, weather: WeatherOpenWeatherResponse, city: City) -> None:
+            self,
+            weather: WeatherOpenWeatherResponse | WeatherRecord,
+            city: CityRecord,
+            created_at: datetime | None = None,
+    ) -> None:
         """
         Write a single weather to the database.
 
         Args:
-            weather (WeatherOpenWeatherResponse): The Weather object.
-            city (City): The City object to be written to the database.
+            weather (WeatherOpenWeatherResponse | WeatherRecord): The
+                Weather object or its flat record.
+            city (CityRecord): The city the weather belongs to.
+            created_at (datetime | None): Timestamp of the collection round,
+                the current time by default. Weather already stored for
+                the city and round is left as is.
+        """
+        row = self.make_row(
+            weather, city, created_at=created_at or datetime.utcnow())
+        with self.engine.begin() as connection:
+            inserted = self._insert_rows(connection, [row])
+        if self.cache and inserted:
+            update_cache_safely(self.cache, inserted)
+        logging.info(f'Weather in {city.name} is saved')
+
+    def write_many(
+            self,
+            objs: Iterable[
+                tuple[WeatherOpenWeatherResponse | WeatherRecord, CityRecord]],
+            created_at: datetime | None = None,
+    ) -> int:
+        """
+        Write many weather records to the database in one transaction.
+
+        PostgreSQL gets the rows through ``COPY FROM STDIN``, other databases
+        through a single executemany insert. Records already stored for the
+        city and round are skipped, so writing a round twice is harmless.
+        After the commit the latest weather cache is updated with the rows
+        actually inserted.
+
+        Args:
+            objs (Iterable[tuple[WeatherOpenWeatherResponse | WeatherRecord,
+                CityRecord]]): Pairs of the Weather object or its flat record
+                and the city it belongs to.
+            created_at (datetime | None): Timestamp of the collection round,
+                the current time by default.
+
+        Returns:
+            int: Number of written records.
+        """
+        created_at = created_at or datetime.utcnow()
+        rows = [
+            self.make_row(weather, city, created_at=created_at)
+            for weather, city in objs
+        ]
+        if not rows:
+            return 0
+        with self.engine.begin() as connection:
+            if connection.dialect.name == 'postgresql':
+                inserted = self._copy_rows(connection, rows)
+            else:
+                inserted = self._insert_rows(connection, rows)
+        if self.cache and inserted:
+            update_cache_safely(self.cache, inserted)
+        logging.info(f'{len(inserted)} weather records are saved')
+        return len(inserted)
+
+    @staticmethod
+    def _insert(connection: Connection) -> Insert:
+        """
+        Build an insert into the weather table skipping existing records.
+
+        Args:
+            connection (Connection): Connection the insert runs on.
+
+        Returns:
+            Insert: The insert statement.
+        """
+        statement = dialect_insert(connection, Weather)
+        if not hasattr(statement, 'on_conflict_do_nothing'):
+            return statement
+        return statement.on_conflict_do_nothing(
+            index_elements=['city_id', 'created_at'])
+
+    @staticmethod
+    def _insert_returning(connection: Connection) -> Insert | None:
+        """
+        Build the insert of _insert() returning the cached columns of the
+        inserted rows, None if the database cannot return them.
+        """
+        if not connection.dialect.insert_executemany_returning:
+            return None
+        return WeatherRepository._insert(connection).returning(*(
+            Weather.__table__.c[field] for field in LatestWeatherCache.FIELDS
+        ))
+
+    def _insert_rows(
+            self, connection: Connection, rows: list[dict]) -> list[dict]:
         """
-        new_weather = Weather(
-            id=str(uuid.uuid4()),
-            temperature=weather.main.temp,
-            weather=weather.weather[0].main,
-            weather_description=weather.weather[0].description,
-            pressure=weather.main.pressure,
-            humidity=weather.main.humidity,
-            wind_speed=weather.wind.speed,
-            wind_direction=weather.wind.deg,
-            clouds=weather.clouds.all,
-            city_id=city.id,
-            created_at=datetime.utcnow(),
+        Insert rows with one executemany, skipping existing records.
+
+        Args:
+            connection (Connection): Connection with an open transaction.
+            rows (list[dict]): Column values of the weather table.
+
+        Returns:
+            list[dict]: Cached columns of the inserted rows, all rows if
+            the database cannot tell which were inserted.
+        """
+        statement = self._insert_returning(connection)
+        if statement is None:
+            connection.execute(self._insert(connection), rows)
+            return rows
+        return [
+            dict(row) for row in connection.execute(statement, rows).mappings()
+        ]
+
+    def _copy_rows(
+            self, connection: Connection, rows: list[dict]) -> list[dict]:
+        """
+        Load rows into the weather table with PostgreSQL ``COPY``.
+
+        Rows are copied into a temporary staging table first and then moved
+        to the weather table skipping records that already exist.
+
+        Args:
+            connection (Connection): Connection with an open transaction.
+            rows (list[dict]): Column values of the weather table.
+
+        Returns:
+            list[dict]: Cached columns of the inserted rows.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(row[column] for column in self.COPY_COLUMNS)
+        buffer.seek(0)
+        columns = ', '.join(self.COPY_COLUMNS)
+        connection.execute(text(
+            'CREATE TEMPORARY TABLE weather_staging '
+            f'(LIKE {Weather.__tablename__} INCLUDING DEFAULTS) '
+            'ON COMMIT DROP'
+        ))
+        cursor = connection.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(
+                f'COPY weather_staging ({columns}) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+        finally:
+            cursor.close()
+        return [dict(row) for row in connection.execute(text(
+            f'INSERT INTO {Weather.__tablename__} ({columns}) '
+            f'SELECT {columns} FROM weather_staging '
+            'ON CONFLICT (city_id, created_at) DO NOTHING '
+            f'RETURNING {", ".join(LatestWeatherCache.FIELDS)}'
+        )).mappings()]
+
+
+class PollStateRepository(Database, BaseModelRepository):
+    """Repository for interacting with CityPollState objects."""
+
+    def get_all(self, city_ids: Iterable[str]) -> dict[str, CityPollState]:
+        """
+        Get polling states of cities.
+
+        Args:
+            city_ids (Iterable[str]): IDs of the cities.
+
+        Returns:
+            dict[str, CityPollState]: Polling state by city ID. Cities that
+            were never fetched are missing.
+        """
+        with self.session() as session:
+            results = session.scalars(
+                select(CityPollState).where(
+                    CityPollState.city_id.in_(list(city_ids)))
+            ).all()
+        return {state.city_id: state for state in results}
+
+    def write_one(self, state: dict) -> None:
+        """
+        Write polling state of a city.
+
+        Args:
+            state (dict): Column values of the city_poll_state table.
+        """
+        self.write_many([state])
+
+    def write_many(self, states: Iterable[dict]) -> None:
+        """
+        Write polling states of many cities in one transaction.
+
+        Args:
+            states (Iterable[dict]): Column values of the city_poll_state
+                table.
+        """
+        states = list(states)
+        if not states:
+            return
+        with self.engine.begin() as connection:
+            statement = dialect_insert(connection, CityPollState)
+            if hasattr(statement, 'on_conflict_do_update'):
+                statement = statement.on_conflict_do_update(
+                    index_elements=['city_id'],
+                    set_={
+                        column: statement.excluded[column]
+                        for column in ('observed_at', 'interval',
+                                       'next_poll_at')
+                    },
+                )
+            else:
+                connection.execute(
+                    CityPollState.__table__.delete().where(
+                        CityPollState.city_id.in_(
+                            [state['city_id'] for state in states])))
+            connection.execute(statement, states)
+
+
+class RollupRepository(Database):
+    """
+    Repository maintaining the hourly and daily weather rollups.
+
+    Rollups are recomputed for the periods a round falls into, so running
+    a round or a shard again gives the same result instead of counting
+    weather twice. Hourly rollups are built from the weather table, daily
+    ones from the hourly rollups.
+    """
+
+    FIELDS = ('temperature', 'humidity', 'pressure')
+
+    def update(
+            self, city_ids: Iterable[str] | None, created_at: datetime,
+    ) -> None:
+        """
+        Recompute rollups of the hour and day of a collection round.
+
+        Args:
+            city_ids (Iterable[str] | None): Cities to recompute, all
+                cities with weather in the period if None.
+            created_at (datetime): Timestamp of the collection round.
+        """
+        if city_ids is not None:
+            city_ids = list(city_ids)
+            if not city_ids:
+                return
+        hour = created_at.replace(minute=0, second=0, microsecond=0)
+        day = hour.replace(hour=0)
+        with self.engine.begin() as connection:
+            self._upsert(
+                connection, WeatherHourly,
+                self._hourly_query(city_ids, hour), city_ids, hour)
+            self._upsert(
+                connection, WeatherDaily,
+                self._daily_query(city_ids, day), city_ids, day)
+
+    def rebuild(self, since: datetime, until: datetime | None = None) -> int:
+        """
+        Recompute rollups of all cities hour by hour, e.g. to backfill them.
+
+        Args:
+            since (datetime): Start of the first hour to recompute.
+            until (datetime | None): End of the last hour, now by default.
+
+        Returns:
+            int: Number of recomputed hours.
+        """
+        until = until or datetime.utcnow()
+        hour = since.replace(minute=0, second=0, microsecond=0)
+        hours = 0
+        while hour < until:
+            self.update(None, hour)
+            hour += timedelta(hours=1)
+            hours += 1
+        return hours
+
+    def get_hourly(
+            self,
+            city_ids: Iterable[str],
+            since: datetime,
+            until: datetime | None = None,
+    ) -> list[WeatherHourly]:
+        """
+        Get hourly rollups of cities, oldest first.
+
+        Args:
+            city_ids (Iterable[str]): IDs of the cities.
+            since (datetime): Only hours starting at or after this time.
+            until (datetime | None): Only hours starting before this time.
+
+        Returns:
+            list[WeatherHourly]: The rollups.
+        """
+        return self._get(WeatherHourly, city_ids, since, until)
+
+    def get_daily(
+            self,
+            city_ids: Iterable[str],
+            since: datetime,
+            until: datetime | None = None,
+    ) -> list[WeatherDaily]:
+        """
+        Get daily rollups of cities, oldest first.
+
+        Args:
+            city_ids (Iterable[str]): IDs of the cities.
+            since (datetime): Only days starting at or after this time.
+            until (datetime | None): Only days starting before this time.
+
+        Returns:
+            list[WeatherDaily]: The rollups.
+        """
+        return self._get(WeatherDaily, city_ids, since, until)
+
+    def _get(self, model, city_ids, since, until) -> list:
+        query = select(model).where(
+            model.city_id.in_(list(city_ids)),
+            model.period_start >= since,
         )
+        if until is not None:
+            query = query.where(model.period_start < until)
+        query = query.order_by(model.city_id, model.period_start)
         with self.session() as session:
-            session.add(new_weather)
-            session.commit()
-        logging.info(f'Weather in {city.name} is saved')
+            return session.scalars(query).all()
+
+    @staticmethod
+    def _cooling(mean: ColumnElement) -> ColumnElement:
+        return case(
+            (mean > COOLING_BASE_TEMPERATURE,
+             mean - COOLING_BASE_TEMPERATURE),
+            else_=0.0,
+        )
+
+    def _hourly_query(
+            self, city_ids: list[str] | None, hour: datetime) -> Select:
+        columns = [
+            Weather.city_id,
+            literal(hour, DateTime).label('period_start'),
+            func.count().label('samples'),
+        ]
+        for name in self.FIELDS:
+            column = getattr(Weather, name)
+            columns += [
+                func.min(column).label(f'{name}_min'),
+                func.max(column).label(f'{name}_max'),
+                func.avg(column).label(f'{name}_mean'),
+            ]
+        columns.append(self._cooling(
+            func.avg(Weather.temperature)).label('cooling_degree_hours'))
+        query = select(*columns).where(
+            Weather.created_at >= hour,
+            Weather.created_at < hour + timedelta(hours=1),
+        )
+        if city_ids is not None:
+            query = query.where(Weather.city_id.in_(city_ids))
+        return query.group_by(Weather.city_id)
+
+    def _daily_query(
+            self, city_ids: list[str] | None, day: datetime) -> Select:
+        hourly = WeatherHourly
+        columns = [
+            hourly.city_id,
+            literal(day, DateTime).label('period_start'),
+            func.sum(hourly.samples).label('samples'),
+        ]
+        means = {}
+        for name in self.FIELDS:
+            mean = getattr(hourly, f'{name}_mean')
+            means[name] = func.sum(mean * hourly.samples) / func.nullif(
+                func.sum(case((mean.is_not(None), hourly.samples), else_=0)),
+                0,
+            )
+            columns += [
+                func.min(getattr(hourly, f'{name}_min')).label(f'{name}_min'),
+                func.max(getattr(hourly, f'{name}_max')).label(f'{name}_max'),
+                means[name].label(f'{name}_mean'),
+            ]
+        columns.append(self._cooling(
+            means['temperature']).label('cooling_degree_days'))
+        query = select(*columns).where(
+            hourly.period_start >= day,
+            hourly.period_start < day + timedelta(days=1),
+        )
+        if city_ids is not None:
+            query = query.where(hourly.city_id.in_(city_ids))
+        return query.group_by(hourly.city_id)
+
+    @staticmethod
+    def _upsert(
+            connection: Connection,
+            model,
+            query: Select,
+            city_ids: list[str] | None,
+            period_start: datetime,
+    ) -> None:
+        names = [column.name for column in query.selected_columns]
+        statement = dialect_insert(connection, model).from_select(
+            names, query)
+        if hasattr(statement, 'on_conflict_do_update'):
+            statement = statement.on_conflict_do_update(
+                index_elements=['city_id', 'period_start'],
+                set_={
+                    name: statement.excluded[name]
+                    for name in names
+                    if name not in ('city_id', 'period_start')
+                },
+            )
+        else:
+            delete = model.__table__.delete().where(
+                model.period_start == period_start)
+            if city_ids is not None:
+                delete = delete.where(model.city_id.in_(city_ids))
+            connection.execute(delete)
+        connection.execute(statement)
+
+
+class ForecastRepository(Database):
+    """
+    Repository for interacting with Forecast objects.
+
+    Forecast steps that did not change since the previous issue are not
+    stored again, so an unchanged forecast costs no rows.
+    """
+
+    FIELDS = (
+        'temperature', 'humidity', 'pressure', 'wind_speed', 'clouds',
+        'precipitation',
+    )
+
+    def write_many(
+            self,
+            forecasts: Iterable[tuple[CityRecord, list[ForecastStep]]],
+            issued_at: datetime,
+    ) -> int:
+        """
+        Write changed forecast steps of many cities in one transaction.
+
+        Args:
+            forecasts (Iterable[tuple[CityRecord, list[ForecastStep]]]):
+                Pairs of a city and the steps of its forecast.
+            issued_at (datetime): Timestamp of the round.
+
+        Returns:
+            int: Number of written steps.
+        """
+        rows = [
+            {
+                'city_id': city.id,
+                'valid_at': datetime.utcfromtimestamp(step.dt),
+                'issued_at': issued_at,
+                **{field: getattr(step, field) for field in self.FIELDS},
+            }
+            for city, steps in forecasts
+            for step in steps
+        ]
+        if not rows:
+            return 0
+        with self.engine.begin() as connection:
+            latest = self._latest(
+                connection,
+                {row['city_id'] for row in rows},
+                min(row['valid_at'] for row in rows),
+                issued_at,
+            )
+            changed = [
+                row for row in rows
+                if latest.get((row['city_id'], row['valid_at']))
+                != tuple(row[field] for field in self.FIELDS)
+            ]
+            if changed:
+                statement = dialect_insert(connection, Forecast)
+                if hasattr(statement, 'on_conflict_do_nothing'):
+                    statement = statement.on_conflict_do_nothing(
+                        index_elements=['city_id', 'valid_at', 'issued_at'])
+                connection.execute(statement, changed)
+        logging.info(
+            f'{len(changed)} of {len(rows)} forecast steps changed and '
+            'are saved'
+        )
+        return len(changed)
+
+    def get_latest(
+            self,
+            city_ids: Iterable[str],
+            since: datetime | None = None,
+            as_of: datetime | None = None,
+    ) -> dict[str, list[Forecast]]:
+        """
+        Get the latest forecast of cities.
+
+        Args:
+            city_ids (Iterable[str]): IDs of the cities.
+            since (datetime | None): Only steps at or after this time, the
+                current time by default.
+            as_of (datetime | None): Forecast as it was known at this time,
+                the latest one by default.
+
+        Returns:
+            dict[str, list[Forecast]]: Steps of every city by its ID,
+            ordered by time. Cities without a forecast are missing.
+        """
+        latest = self._latest_query(
+            list(city_ids), since or datetime.utcnow(), as_of).subquery()
+        query = select(Forecast).join(latest, and_(
+            Forecast.city_id == latest.c.city_id,
+            Forecast.valid_at == latest.c.valid_at,
+            Forecast.issued_at == latest.c.issued_at,
+        )).order_by(Forecast.city_id, Forecast.valid_at)
+        results = {}
+        with self.session() as session:
+            for step in session.scalars(query):
+                results.setdefault(step.city_id, []).append(step)
+        return results
+
+    def _latest(
+            self,
+            connection: Connection,
+            city_ids: Iterable[str],
+            since: datetime,
+            as_of: datetime,
+    ) -> dict[tuple[str, datetime], tuple]:
+        """
+        Get values of the latest stored steps, to compare new steps with.
+
+        Returns:
+            dict[tuple[str, datetime], tuple]: Values of FIELDS by city ID
+            and time of the step.
+        """
+        latest = self._latest_query(list(city_ids), since, as_of).subquery()
+        query = select(
+            Forecast.city_id, Forecast.valid_at,
+            *(getattr(Forecast, field) for field in self.FIELDS),
+        ).join(latest, and_(
+            Forecast.city_id == latest.c.city_id,
+            Forecast.valid_at == latest.c.valid_at,
+            Forecast.issued_at == latest.c.issued_at,
+        ))
+        return {
+            (row[0], row[1]): tuple(row[2:])
+            for row in connection.execute(query)
+        }
+
+    @staticmethod
+    def _latest_query(
+            city_ids: list[str],
+            since: datetime,
+            as_of: datetime | None,
+    ) -> Select:
+        query = select(
+            Forecast.city_id,
+            Forecast.valid_at,
+            func.max(Forecast.issued_at).label('issued_at'),
+        ).where(
+            Forecast.city_id.in_(city_ids),
+            Forecast.valid_at >= since,
+        )
+        if as_of is not None:
+            query = query.where(Forecast.issued_at <= as_of)
+        return query.group_by(Forecast.city_id, Forecast.valid_at)
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import TYPE_CHECKING
+
+from sqlalchemy import (
+    Connection, Engine, Insert, create_engine, insert, make_url)
+from sqlalchemy.dialects import postgresql, sqlite
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+from config import (
+    DATABASE_URL, DB_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_SIZE)
+
+_engines: dict[str, Engine] = {}
+_engines_pid = os.getpid()
+_engines_lock = threading.Lock()
+# Asyncio engines by database URL, for every event loop.
+_async_engines: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def get_engine(database_url: str = DATABASE_URL) -> Engine:
+    """
+    Get the engine of this process for the database URL.
+
+    The engine is created on first use and then shared by all repositories
+    of the process, so they reuse one connection pool. A forked child
+    process gets its own engine instead of the parent's connections.
+
+    Args:
+        database_url (str): The URL of the database.
+
+    Returns:
+        Engine: The shared engine.
+    """
+    global _engines_pid
+    with _engines_lock:
+        if _engines_pid != os.getpid():
+            _dispose(close=False)
+            _engines_pid = os.getpid()
+        engine = _engines.get(database_url)
+        if engine is None:
+            engine = _create_engine(database_url)
+            _engines[database_url] = engine
+    return engine
+
+
+def async_database_url(database_url: str) -> str:
+    """
+    Get the URL of a database with its asyncio driver.
+
+    Args:
+        database_url (str): The URL of the database, with any driver.
+
+    Returns:
+        str: The URL with asyncpg for PostgreSQL or aiosqlite for SQLite.
+    """
+    url = make_url(database_url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        return database_url
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def get_async_engine(database_url: str = DATABASE_URL) -> 'AsyncEngine':
+    """
+    Get the asyncio engine of the running event loop for the database URL.
+
+    Connections of asyncio drivers belong to the event loop they were
+    opened in, so every loop gets its own engine. Call
+    dispose_async_engines() before the loop is closed.
+
+    Args:
+        database_url (str): The URL of the database, with any driver.
+
+    Returns:
+        AsyncEngine: The shared engine of the loop.
+    """
+    # Imported here, so processes with DB_MODE sync skip SQLAlchemy asyncio.
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engines = _async_engines.setdefault(asyncio.get_running_loop(), {})
+    engine = engines.get(database_url)
+    if engine is None:
+        url = async_database_url(database_url)
+        if make_url(url).get_backend_name() == 'sqlite':
+            engine = create_async_engine(url)
+        else:
+            engine = create_async_engine(
+                url,
+                pool_pre_ping=True,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_recycle=DB_POOL_RECYCLE,
+            )
+        engines[database_url] = engine
+    return engine
+
+
+async def dispose_async_engines() -> None:
+    """Close the asyncio engines of the running event loop."""
+    engines = _async_engines.pop(asyncio.get_running_loop(), {})
+    for engine in engines.values():
+        await engine.dispose()
+
+
+def dialect_insert(connection: Connection, model: type) -> Insert:
+    """
+    Build an insert supporting ON CONFLICT where the database has it.
+
+    Args:
+        connection (Connection): Connection the insert runs on.
+        model (type[Base]): Model to insert into.
+
+    Returns:
+        Insert: PostgreSQL or SQLite insert, or a generic one.
+    """
+    if connection.dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    if connection.dialect.name == 'sqlite':
+        return sqlite.insert(model)
+    return insert(model)
+
+
+def dispose_engines(close: bool = True) -> None:
+    """
+    Drop all engines of this process.
+
+    Args:
+        close (bool): Close pooled connections. Pass False right after a
+            fork, so connections owned by the parent process stay open.
+    """
+    with _engines_lock:
+        _dispose(close=close)
+
+
+def _dispose(close: bool) -> None:
+    for engine in _engines.values():
+        engine.dispose(close=close)
+    _engines.clear()
+
+
+def _create_engine(database_url: str) -> Engine:
+    if make_url(database_url).get_backend_name() == 'sqlite':
+        return create_engine(database_url)
+    return create_engine(
+        database_url,
+        pool_pre_ping=True,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
@@ -0,0 +1,303 @@
+"""
+Columnar export of weather history to Parquet for analytics.
+
+Usage:
+    python -m database.export exports/weather
+    python -m database.export exports/weather --full
+"""
+import argparse
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from sqlalchemy import Engine, String, cast, select
+
+from config import (
+    DATABASE_URL, EXPORT_BATCH_SIZE, EXPORT_DIR, EXPORT_LAG, LOGGING_FORMAT,
+    LOGGING_LEVEL)
+from models import Weather
+from .engine import get_engine
+
+WATERMARK_FILE = '_watermark.json'
+MAX_OPEN_FILES = 4096
+SCHEMA = pa.schema([
+    ('id', pa.string()),
+    ('temperature', pa.float64()),
+    ('weather', pa.string()),
+    ('weather_description', pa.string()),
+    ('pressure', pa.int32()),
+    ('humidity', pa.int32()),
+    ('wind_speed', pa.float64()),
+    ('wind_direction', pa.float64()),
+    ('clouds', pa.int32()),
+    ('observed_at', pa.timestamp('us')),
+    ('created_at', pa.timestamp('us')),
+    ('city_id', pa.string()),
+])
+PARTITIONING = ds.partitioning(
+    pa.schema([('date', pa.string()), ('city_id', pa.string())]),
+    flavor='hive',
+)
+
+
+class WeatherMatrix(NamedTuple):
+    """
+    Weather of many cities over time, as dense arrays.
+
+    Attributes:
+        city_ids (np.ndarray): Sorted city IDs, the rows of the matrices.
+        times (np.ndarray): Sorted round timestamps (``datetime64[us]``),
+            the columns of the matrices.
+        values (dict[str, np.ndarray]): A ``len(city_ids) x len(times)``
+            float matrix per field, NaN where a city has no record.
+    """
+    city_ids: np.ndarray
+    times: np.ndarray
+    values: dict[str, np.ndarray]
+
+
+def read_watermark(directory: str | Path) -> datetime | None:
+    """
+    Get the time weather was exported up to.
+
+    Args:
+        directory (str | Path): Directory of the export.
+
+    Returns:
+        datetime | None: Upper bound of the last export, None if nothing
+        was exported yet.
+    """
+    path = Path(directory) / WATERMARK_FILE
+    if not path.exists():
+        return None
+    return datetime.fromisoformat(json.loads(path.read_text())['created_at'])
+
+
+def write_watermark(directory: str | Path, watermark: datetime) -> None:
+    """
+    Store the time weather was exported up to.
+
+    Args:
+        directory (str | Path): Directory of the export.
+        watermark (datetime): Upper bound of the export.
+    """
+    path = Path(directory) / WATERMARK_FILE
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps({'created_at': watermark.isoformat()}))
+    tmp_path.replace(path)
+
+
+def iter_batches(
+        engine: Engine,
+        since: datetime | None,
+        until: datetime,
+        batch_size: int = EXPORT_BATCH_SIZE,
+) -> Iterator[pa.RecordBatch]:
+    """
+    Stream weather rows as Arrow record batches.
+
+    Rows come through a server-side cursor, so memory use is bounded by
+    ``batch_size`` and does not depend on the length of the history.
+
+    Args:
+        engine (Engine): Engine of the database.
+        since (datetime | None): Only rounds after this time, all by
+            default.
+        until (datetime): Only rounds up to this time.
+        batch_size (int): Number of rows in a batch.
+
+    Yields:
+        pa.RecordBatch: Weather columns and the ``date`` of the round.
+    """
+    columns = [
+        cast(Weather.id, String) if name == 'id'
+        else getattr(Weather, name)
+        for name in SCHEMA.names
+    ]
+    query = select(*columns).where(Weather.created_at <= until)
+    if since is not None:
+        query = query.where(Weather.created_at > since)
+    with engine.connect() as connection:
+        result = connection.execution_options(yield_per=batch_size).execute(
+            query)
+        for rows in result.partitions():
+            arrays = [
+                pa.array(values, type=field.type)
+                for values, field in zip(zip(*rows), SCHEMA)
+            ]
+            date = pc.strftime(arrays[SCHEMA.get_field_index('created_at')],
+                               format='%Y-%m-%d')
+            yield pa.RecordBatch.from_arrays(
+                arrays + [date], names=SCHEMA.names + ['date'])
+
+
+def write_batches(
+        batches: Iterable[pa.RecordBatch],
+        directory: str | Path,
+        full: bool = False,
+) -> int:
+    """
+    Write record batches as Parquet files partitioned by date and city.
+
+    Files are laid out as ``date=YYYY-MM-DD/city_id=<id>/part-*.parquet``.
+    Every export writes files with its own name prefix, so incremental
+    exports add files next to the earlier ones.
+
+    Args:
+        batches (Iterable[pa.RecordBatch]): Batches of iter_batches().
+        directory (str | Path): Directory of the export.
+        full (bool): Replace the partitions the batches belong to.
+
+    Returns:
+        int: Number of written rows.
+    """
+    count = 0
+
+    def counted() -> Iterator[pa.RecordBatch]:
+        nonlocal count
+        for batch in batches:
+            count += batch.num_rows
+            yield batch
+
+    ds.write_dataset(
+        counted(),
+        directory,
+        schema=SCHEMA.append(pa.field('date', pa.string())),
+        format='parquet',
+        partitioning=PARTITIONING,
+        basename_template=f'part-{uuid.uuid4().hex}-{{i}}.parquet',
+        existing_data_behavior=(
+            'delete_matching' if full else 'overwrite_or_ignore'),
+        max_open_files=MAX_OPEN_FILES,
+    )
+    return count
+
+
+def export_weather(
+        engine: Engine, directory: str | Path, full: bool = False) -> dict:
+    """
+    Export weather history to Parquet, from the last watermark on.
+
+    Rounds younger than EXPORT_LAG are left for the next export, as their
+    shards may still be writing. The watermark moves only after all files
+    are written, so a failed export is repeated from the same point.
+
+    Args:
+        engine (Engine): Engine of the database.
+        directory (str | Path): Directory of the export.
+        full (bool): Export the whole history, ignoring the watermark.
+
+    Returns:
+        dict: Number of ``rows`` exported, ``seconds`` spent,
+        ``rows_per_sec`` and the new ``watermark``.
+    """
+    started = time.perf_counter()
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    since = None if full else read_watermark(directory)
+    until = datetime.utcnow() - timedelta(seconds=EXPORT_LAG)
+    if since is not None and since >= until:
+        count = 0
+    else:
+        count = write_batches(
+            iter_batches(engine, since, until), directory, full=full)
+        write_watermark(directory, until)
+    seconds = time.perf_counter() - started
+    stats = {
+        'rows': count,
+        'seconds': seconds,
+        'rows_per_sec': count / seconds if seconds else 0.0,
+        'watermark': until,
+    }
+    logging.info(
+        f'{count} weather records exported to {directory} in '
+        f'{seconds:.1f}s, up to {until:%Y-%m-%d %H:%M}.'
+    )
+    return stats
+
+
+def read_matrix(
+        directory: str | Path,
+        fields: Iterable[str] = ('temperature', 'humidity'),
+        since: datetime | None = None,
+        until: datetime | None = None,
+        city_ids: Iterable[str] | None = None,
+) -> WeatherMatrix:
+    """
+    Read exported weather as city x time matrices.
+
+    Filters are pushed down to the dataset, so only matching date and city
+    partitions are read, and the matrices are filled with NumPy indexing
+    instead of per-row Python objects.
+
+    Args:
+        directory (str | Path): Directory of the export.
+        fields (Iterable[str]): Numeric weather columns to read.
+        since (datetime | None): Only rounds at or after this time.
+        until (datetime | None): Only rounds before this time.
+        city_ids (Iterable[str] | None): Only these cities, all by default.
+
+    Returns:
+        WeatherMatrix: The matrices of every field.
+    """
+    fields = list(fields)
+    dataset = ds.dataset(
+        directory, format='parquet', partitioning=PARTITIONING)
+    filters = []
+    if since is not None:
+        filters.append(ds.field('date') >= since.date().isoformat())
+        filters.append(ds.field('created_at') >= pa.scalar(
+            since, type=pa.timestamp('us')))
+    if until is not None:
+        filters.append(ds.field('date') <= until.date().isoformat())
+        filters.append(ds.field('created_at') < pa.scalar(
+            until, type=pa.timestamp('us')))
+    if city_ids is not None:
+        filters.append(ds.field('city_id').isin(list(city_ids)))
+    condition = None
+    for expression in filters:
+        condition = expression if condition is None else (
+            condition & expression)
+    table = dataset.to_table(
+        columns=['city_id', 'created_at', *fields], filter=condition)
+
+    cities = pc.dictionary_encode(table['city_id']).combine_chunks()
+    city_values, city_order = np.unique(
+        cities.dictionary.to_numpy(zero_copy_only=False),
+        return_inverse=True,
+    )
+    rows = city_order[cities.indices.to_numpy()] if len(table) else (
+        np.empty(0, dtype=np.int64))
+    times, columns = np.unique(
+        table['created_at'].to_numpy(), return_inverse=True)
+    values = {}
+    for field in fields:
+        matrix = np.full((len(city_values), len(times)), np.nan)
+        matrix[rows, columns] = table[field].cast(pa.float64()).to_numpy()
+        values[field] = matrix
+    return WeatherMatrix(city_ids=city_values, times=times, values=values)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Export weather history to Parquet.')
+    parser.add_argument('directory', nargs='?', default=EXPORT_DIR)
+    parser.add_argument(
+        '--full', action='store_true',
+        help='export the whole history instead of the rounds after the '
+             'last watermark',
+    )
+    args = parser.parse_args()
+    logging.basicConfig(format=LOGGING_FORMAT, level=LOGGING_LEVEL)
+    export_weather(get_engine(DATABASE_URL), args.directory, full=args.full)
+
+
+if __name__ == '__main__':
+    main()
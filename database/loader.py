@@ -0,0 +1,211 @@
+"""
+Streaming bulk loader of cities with upsert semantics.
+
+Usage:
+    python -m database.loader csv/worldcities.csv.gz
+"""
+import argparse
+import csv
+import gzip
+import io
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Iterable, Iterator
+
+from sqlalchemy import Connection, Engine, text
+
+from config import (
+    DATABASE_URL, LOAD_BATCH_SIZE, LOGGING_FORMAT, LOGGING_LEVEL)
+from models import City
+from .engine import dialect_insert, get_engine
+
+COLUMNS = ('name', 'lat', 'lon', 'population')
+KEY = ('name', 'lat', 'lon')
+
+
+def iter_city_rows(path: str) -> Iterator[dict]:
+    """
+    Read cities from a CSV file one row at a time.
+
+    Files ending with ``.gz`` are decompressed on the fly.
+
+    Args:
+        path (str): Path to a CSV file with name, lat, lon and population
+            columns.
+
+    Yields:
+        dict: Column values of the cities table, without the ID.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            yield {
+                'name': row['name'],
+                'lat': float(row['lat']),
+                'lon': float(row['lon']),
+                'population': int(float(row['population'] or 0)),
+            }
+
+
+class CsvStream(io.RawIOBase):
+    """
+    Read-only file serving rows as CSV text, rendered on demand.
+
+    Lets ``COPY FROM STDIN`` consume a row iterator without holding the
+    whole file in memory.
+    """
+    def __init__(self, rows: Iterable[dict]) -> None:
+        self._rows = iter(rows)
+        self._buffer = b''
+        self.count = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        while len(self._buffer) < len(target):
+            row = next(self._rows, None)
+            if row is None:
+                break
+            line = io.StringIO()
+            csv.writer(line).writerow(row[column] for column in COLUMNS)
+            self._buffer += line.getvalue().encode()
+            self.count += 1
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def _copy_load(connection: Connection, rows: Iterable[dict]) -> int:
+    """
+    Upsert cities on PostgreSQL through a COPY-filled staging table.
+
+    Args:
+        connection (Connection): Connection with an open transaction.
+        rows (Iterable[dict]): Column values of the cities table.
+
+    Returns:
+        int: Number of rows read from the source.
+    """
+    columns = ', '.join(COLUMNS)
+    key = ', '.join(KEY)
+    connection.execute(text(
+        'CREATE TEMPORARY TABLE cities_staging '
+        '(name varchar(100), lat float, lon float, population integer) '
+        'ON COMMIT DROP'
+    ))
+    stream = CsvStream(rows)
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f'COPY cities_staging ({columns}) FROM STDIN WITH (FORMAT csv)',
+            io.BufferedReader(stream, buffer_size=1 << 16),
+        )
+    finally:
+        cursor.close()
+    connection.execute(text(
+        f'INSERT INTO {City.__tablename__} (id, {columns}, updated_at) '
+        f'SELECT DISTINCT ON ({key}) gen_random_uuid()::text, {columns}, '
+        ':updated_at '
+        f'FROM cities_staging ORDER BY {key}, population DESC '
+        f'ON CONFLICT ({key}) DO UPDATE '
+        'SET population = EXCLUDED.population, updated_at = :updated_at '
+        f'WHERE {City.__tablename__}.population '
+        'IS DISTINCT FROM EXCLUDED.population'
+    ), {'updated_at': datetime.utcnow()})
+    return stream.count
+
+
+def _batch_load(connection: Connection, rows: Iterable[dict]) -> int:
+    """
+    Upsert cities in batches with executemany inserts.
+
+    Args:
+        connection (Connection): Connection with an open transaction.
+        rows (Iterable[dict]): Column values of the cities table.
+
+    Returns:
+        int: Number of rows read from the source.
+    """
+    statement = dialect_insert(connection, City)
+    if hasattr(statement, 'on_conflict_do_update'):
+        statement = statement.on_conflict_do_update(
+            index_elements=list(KEY),
+            set_={
+                'population': statement.excluded.population,
+                'updated_at': statement.excluded.updated_at,
+            },
+            where=City.population != statement.excluded.population,
+        )
+    count = 0
+    batch = {}
+    for row in rows:
+        count += 1
+        batch[tuple(row[column] for column in KEY)] = row
+        if len(batch) >= LOAD_BATCH_SIZE:
+            connection.execute(statement, _with_ids(batch.values()))
+            batch = {}
+    if batch:
+        connection.execute(statement, _with_ids(batch.values()))
+    return count
+
+
+def _with_ids(rows: Iterable[dict]) -> list[dict]:
+    updated_at = datetime.utcnow()
+    return [
+        {**row, 'id': str(uuid.uuid4()), 'updated_at': updated_at}
+        for row in rows
+    ]
+
+
+def load_cities(engine: Engine, path: str) -> dict:
+    """
+    Load cities from a CSV or gzipped CSV file in one transaction.
+
+    Rows are streamed, so memory use does not depend on the file size.
+    Cities are matched on name and coordinates: known cities get their
+    population updated and new ones are inserted, so loading the same file
+    again changes nothing.
+
+    Args:
+        engine (Engine): Engine of the database.
+        path (str): Path to the file.
+
+    Returns:
+        dict: Number of ``rows`` read, ``seconds`` spent and
+        ``rows_per_sec``.
+    """
+    started = time.perf_counter()
+    rows = iter_city_rows(path)
+    with engine.begin() as connection:
+        if connection.dialect.name == 'postgresql':
+            count = _copy_load(connection, rows)
+        else:
+            count = _batch_load(connection, rows)
+    seconds = time.perf_counter() - started
+    stats = {
+        'rows': count,
+        'seconds': seconds,
+        'rows_per_sec': count / seconds if seconds else 0.0,
+    }
+    logging.info(
+        f'{count} cities loaded from {path} in {seconds:.1f}s '
+        f'({stats["rows_per_sec"]:.0f} rows/s).'
+    )
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Load cities from a CSV or gzipped CSV file.')
+    parser.add_argument('path')
+    args = parser.parse_args()
+    logging.basicConfig(format=LOGGING_FORMAT, level=LOGGING_LEVEL)
+    load_cities(get_engine(DATABASE_URL), args.path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""
+Monthly range partitioning of the weather table on PostgreSQL.
+
+Usage:
+    python -m database.partitions migrate
+    python -m database.partitions ensure
+    python -m database.partitions retention [--months N]
+"""
+import argparse
+import logging
+from datetime import date, datetime
+
+from sqlalchemy import Connection, Engine, text
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from config import (
+    DATABASE_URL, LOGGING_FORMAT, LOGGING_LEVEL, PARTITION_MONTHS_AHEAD,
+    WEATHER_RETENTION_MONTHS)
+from models import Weather
+from .engine import get_engine
+
+TABLE = Weather.__tablename__
+LEGACY_TABLE = f'{TABLE}_legacy'
+
+
+def month_start(day: date, shift: int = 0) -> date:
+    """
+    Get the first day of a month.
+
+    Args:
+        day (date): Any day of the month.
+        shift (int): Number of months to move forward (or back if negative).
+
+    Returns:
+        date: The first day of the shifted month.
+    """
+    months = day.year * 12 + day.month - 1 + shift
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """
+    Get the name of the partition holding a month.
+
+    Args:
+        month (date): The first day of the month.
+
+    Returns:
+        str: Partition table name, like ``weather_y2024m01``.
+    """
+    return f'{TABLE}_y{month.year:04d}m{month.month:02d}'
+
+
+def is_partitioned(connection: Connection) -> bool:
+    """
+    Check whether the weather table is partitioned.
+
+    Args:
+        connection (Connection): Connection to a PostgreSQL database.
+
+    Returns:
+        bool: True if the weather table is a partitioned table.
+    """
+    return connection.execute(text(
+        'SELECT 1 FROM pg_partitioned_table '
+        'WHERE partrelid = to_regclass(:table)'
+    ), {'table': TABLE}).first() is not None
+
+
+def create_partitioned_table(connection: Connection) -> None:
+    """
+    Create the weather table partitioned by month on created_at.
+
+    Args:
+        connection (Connection): Connection with an open transaction.
+    """
+    table = Weather.__table__
+    table.c.weather.type.create(connection, checkfirst=True)
+    create = CreateTable(table).compile(dialect=connection.dialect)
+    connection.execute(text(
+        f'{str(create).strip()} PARTITION BY RANGE (created_at)'))
+    for index in table.indexes:
+        connection.execute(CreateIndex(index))
+    logging.info(f'Partitioned table {TABLE} created.')
+
+
+def create_partition(connection: Connection, month: date) -> None:
+    """
+    Create the partition of a month if it does not exist.
+
+    Args:
+        connection (Connection): Connection with an open transaction.
+        month (date): The first day of the month.
+    """
+    connection.execute(text(
+        f'CREATE TABLE IF NOT EXISTS {partition_name(month)} '
+        f'PARTITION OF {TABLE} '
+        f"FOR VALUES FROM ('{month}') TO ('{month_start(month, 1)}')"
+    ))
+
+
+def ensure_partitions(
+        engine: Engine, months_ahead: int = PARTITION_MONTHS_AHEAD) -> None:
+    """
+    Create partitions for the current month and the months ahead.
+
+    Does nothing if the weather table is not partitioned.
+
+    Args:
+        engine (Engine): Engine of a PostgreSQL database.
+        months_ahead (int): Number of future months to create.
+    """
+    if engine.dialect.name != 'postgresql':
+        return
+    with engine.begin() as connection:
+        if not is_partitioned(connection):
+            return
+        current = month_start(datetime.utcnow().date())
+        for shift in range(months_ahead + 1):
+            create_partition(connection, month_start(current, shift))
+
+
+def migrate(engine: Engine) -> None:
+    """
+    Move the weather table to monthly partitions.
+
+    The existing table is renamed, its rows are copied into the new
+    partitioned table with string IDs cast to native UUIDs, and the old
+    table is dropped. Columns added to the model after the old table was
+    created are left empty. Runs in one transaction and does nothing if the
+    table is already partitioned.
+
+    Args:
+        engine (Engine): Engine of a PostgreSQL database.
+    """
+    with engine.begin() as connection:
+        if is_partitioned(connection):
+            logging.info(f'Table {TABLE} is already partitioned.')
+            return
+        connection.execute(text(
+            f'ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}'))
+        for index in connection.execute(text(
+                'SELECT indexname FROM pg_indexes WHERE tablename = :table'
+        ), {'table': LEGACY_TABLE}).scalars().all():
+            connection.execute(text(
+                f'ALTER INDEX {index} RENAME TO {LEGACY_TABLE}_{index}'))
+        create_partitioned_table(connection)
+        first, last = connection.execute(text(
+            f'SELECT min(created_at), max(created_at) FROM {LEGACY_TABLE}'
+        )).one()
+        today = datetime.utcnow().date()
+        month = month_start(first.date() if first else today)
+        end = month_start(
+            max(last.date() if last else today, today), PARTITION_MONTHS_AHEAD)
+        while month <= end:
+            create_partition(connection, month)
+            month = month_start(month, 1)
+        existing = set(connection.execute(text(
+            'SELECT column_name FROM information_schema.columns '
+            'WHERE table_schema = current_schema() AND table_name = :table'
+        ), {'table': LEGACY_TABLE}).scalars())
+        names = [
+            column.name for column in Weather.__table__.columns
+            if column.name in existing
+        ]
+        columns = ', '.join(names)
+        select_columns = ', '.join(
+            f'{name}::uuid' if name == 'id' else name for name in names)
+        copied = connection.execute(text(
+            f'INSERT INTO {TABLE} ({columns}) '
+            f'SELECT {select_columns} '
+            f'FROM {LEGACY_TABLE} WHERE created_at IS NOT NULL'
+        )).rowcount
+        connection.execute(text(f'DROP TABLE {LEGACY_TABLE}'))
+    logging.info(f'{copied} weather records moved to partitions.')
+
+
+def drop_old_partitions(
+        engine: Engine,
+        retention_months: int = WEATHER_RETENTION_MONTHS,
+) -> list[str]:
+    """
+    Drop partitions holding only weather older than the retention period.
+
+    Dropping a partition is instant and leaves no dead rows behind,
+    unlike deleting old weather.
+
+    Args:
+        engine (Engine): Engine of a PostgreSQL database.
+        retention_months (int): Number of months of weather to keep,
+            including the current one.
+
+    Returns:
+        list[str]: Names of the dropped partitions.
+    """
+    cutoff = partition_name(
+        month_start(datetime.utcnow().date(), 1 - retention_months))
+    dropped = []
+    with engine.begin() as connection:
+        if not is_partitioned(connection):
+            return dropped
+        partitions = connection.execute(text(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = to_regclass(:table) '
+            'ORDER BY child.relname'
+        ), {'table': TABLE}).scalars().all()
+        for partition in partitions:
+            if partition >= cutoff:
+                continue
+            connection.execute(text(
+                f'ALTER TABLE {TABLE} DETACH PARTITION {partition}'))
+            connection.execute(text(f'DROP TABLE {partition}'))
+            dropped.append(partition)
+    logging.info(f'Dropped partitions: {", ".join(dropped) or "none"}.')
+    return dropped
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Manage monthly partitions of the weather table.')
+    parser.add_argument('command', choices=['migrate', 'ensure', 'retention'])
+    parser.add_argument(
+        '--months', type=int, default=WEATHER_RETENTION_MONTHS,
+        help='months of weather to keep for the retention command',
+    )
+    args = parser.parse_args()
+    logging.basicConfig(format=LOGGING_FORMAT, level=LOGGING_LEVEL)
+    engine = get_engine(DATABASE_URL)
+    if args.command == 'migrate':
+        migrate(engine)
+        ensure_partitions(engine)
+    elif args.command == 'ensure':
+        ensure_partitions(engine)
+    else:
+        drop_old_partitions(engine, retention_months=args.months)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+"""
+Durable per-city work items of collection rounds.
+
+Usage:
+    python -m database.work_queue 2024-01-01T12:00:00
+"""
+import argparse
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy import delete, func, select, update
+
+from config import (
+    DATABASE_URL, LOGGING_FORMAT, LOGGING_LEVEL, WORK_MAX_ATTEMPTS,
+    WORK_RETRY_DELAY)
+from models import WorkItem
+from .database import Database
+from .engine import dialect_insert
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+DEAD = 'dead'
+STATUSES = (PENDING, DONE, FAILED, DEAD)
+
+
+def retry_delay(attempts: int) -> float:
+    """
+    Get the delay before the next attempt of a failed item.
+
+    Args:
+        attempts (int): Number of failed attempts, from 1.
+
+    Returns:
+        float: WORK_RETRY_DELAY doubled with every failed attempt.
+    """
+    return WORK_RETRY_DELAY * 2 ** (attempts - 1)
+
+
+class WorkQueueRepository(Database):
+    """
+    Repository of the work items of collection rounds.
+
+    Items of a round are added as pending, and every attempt settles them
+    as done or failed. Failed items get an exponential backoff and are
+    given up after WORK_MAX_ATTEMPTS attempts.
+    """
+
+    def enqueue(self, round_at: datetime, city_ids: Iterable[str]) -> None:
+        """
+        Add pending items of cities to a round, keeping existing ones.
+
+        Args:
+            round_at (datetime): Timestamp of the round.
+            city_ids (Iterable[str]): IDs of the cities.
+        """
+        rows = [
+            {'round_at': round_at, 'city_id': city_id, 'status': PENDING,
+             'attempts': 0}
+            for city_id in city_ids
+        ]
+        if not rows:
+            return
+        with self.engine.begin() as connection:
+            statement = dialect_insert(connection, WorkItem)
+            if hasattr(statement, 'on_conflict_do_nothing'):
+                statement = statement.on_conflict_do_nothing(
+                    index_elements=['round_at', 'city_id'])
+            else:
+                existing = set(connection.scalars(
+                    select(WorkItem.city_id).where(
+                        WorkItem.round_at == round_at,
+                        WorkItem.city_id.in_(
+                            [row['city_id'] for row in rows]),
+                    )))
+                rows = [row for row in rows if row['city_id'] not in existing]
+                if not rows:
+                    return
+            connection.execute(statement, rows)
+
+    def settle(
+            self,
+            round_at: datetime,
+            city_ids: Iterable[str],
+            errors: dict[str, str],
+    ) -> None:
+        """
+        Record an attempt of cities of a round.
+
+        Args:
+            round_at (datetime): Timestamp of the round.
+            city_ids (Iterable[str]): IDs of all cities of the attempt.
+            errors (dict[str, str]): Errors of the cities that failed, by
+                city ID. Other cities are done.
+        """
+        done = [city_id for city_id in city_ids if city_id not in errors]
+        now = datetime.utcnow()
+        with self.session() as session:
+            if done:
+                session.execute(
+                    update(WorkItem).where(
+                        WorkItem.round_at == round_at,
+                        WorkItem.city_id.in_(done),
+                    ).values(status=DONE, next_retry_at=None, updated_at=now)
+                )
+            attempts = dict(session.execute(
+                select(WorkItem.city_id, WorkItem.attempts).where(
+                    WorkItem.round_at == round_at,
+                    WorkItem.city_id.in_(list(errors)),
+                )).all()) if errors else {}
+            failed = []
+            for city_id, count in attempts.items():
+                count += 1
+                dead = count >= WORK_MAX_ATTEMPTS
+                failed.append({
+                    'round_at': round_at,
+                    'city_id': city_id,
+                    'status': DEAD if dead else FAILED,
+                    'attempts': count,
+                    'next_retry_at': None if dead else now + timedelta(
+                        seconds=retry_delay(count)),
+                    'last_error': str(errors[city_id])[:200],
+                    'updated_at': now,
+                })
+            if failed:
+                session.execute(update(WorkItem), failed)
+            session.commit()
+
+    def fail_pending(self, round_at: datetime, error: str) -> int:
+        """
+        Mark items of a round left pending as failed, to retry them now.
+
+        Items stay pending when the attempt of their shard failed before
+        settling them.
+
+        Args:
+            round_at (datetime): Timestamp of the round.
+            error (str): Error of the failed attempt.
+
+        Returns:
+            int: Number of failed items.
+        """
+        now = datetime.utcnow()
+        with self.engine.begin() as connection:
+            return connection.execute(
+                update(WorkItem).where(
+                    WorkItem.round_at == round_at,
+                    WorkItem.status == PENDING,
+                ).values(
+                    status=FAILED,
+                    attempts=WorkItem.attempts + 1,
+                    next_retry_at=now,
+                    last_error=error[:200],
+                    updated_at=now,
+                )
+            ).rowcount
+
+    def due(self, round_at: datetime, now: datetime) -> list[str]:
+        """
+        Get cities of a round whose retry time has come.
+
+        Args:
+            round_at (datetime): Timestamp of the round.
+            now (datetime): The current time.
+
+        Returns:
+            list[str]: IDs of the cities to retry.
+        """
+        with self.session() as session:
+            return list(session.scalars(
+                select(WorkItem.city_id).where(
+                    WorkItem.round_at == round_at,
+                    WorkItem.status == FAILED,
+                    WorkItem.next_retry_at <= now,
+                )))
+
+    def next_retry_at(self, round_at: datetime) -> datetime | None:
+        """
+        Get the earliest retry time of failed items of a round.
+
+        Args:
+            round_at (datetime): Timestamp of the round.
+
+        Returns:
+            datetime | None: The time, None if nothing is to be retried.
+        """
+        with self.session() as session:
+            return session.scalar(
+                select(func.min(WorkItem.next_retry_at)).where(
+                    WorkItem.round_at == round_at,
+                    WorkItem.status == FAILED,
+                ))
+
+    def give_up(self, round_at: datetime) -> int:
+        """
+        Mark failed items of a round as dead, when the round is over.
+
+        Args:
+            round_at (datetime): Timestamp of the round.
+
+        Returns:
+            int: Number of items given up.
+        """
+        with self.engine.begin() as connection:
+            return connection.execute(
+                update(WorkItem).where(
+                    WorkItem.round_at == round_at,
+                    WorkItem.status == FAILED,
+                ).values(
+                    status=DEAD, next_retry_at=None,
+                    updated_at=datetime.utcnow())
+            ).rowcount
+
+    def last_update(self) -> datetime | None:
+        """
+        Get the time of the latest change of any item.
+
+        Every write of weather by a round or a retry settles its items, so
+        this changes whenever stored weather does.
+
+        Returns:
+            datetime | None: The newest ``updated_at``, None if there are
+            no items.
+        """
+        with self.engine.connect() as connection:
+            return connection.execute(
+                select(func.max(WorkItem.updated_at))).scalar()
+
+    def report(self, round_at: datetime) -> dict:
+        """
+        Get the completeness report of a round.
+
+        Args:
+            round_at (datetime): Timestamp of the round.
+
+        Returns:
+            dict: Number of items of every status, the ``total`` number
+            and the share of done items as ``completeness``.
+        """
+        with self.session() as session:
+            counts = dict(session.execute(
+                select(WorkItem.status, func.count()).where(
+                    WorkItem.round_at == round_at,
+                ).group_by(WorkItem.status)).all())
+        report = {status: counts.get(status, 0) for status in STATUSES}
+        report['total'] = sum(report.values())
+        report['completeness'] = (
+            report[DONE] / report['total'] if report['total'] else 0.0)
+        return report
+
+    def purge(self, before: datetime) -> int:
+        """
+        Delete items of rounds older than a time.
+
+        Args:
+            before (datetime): Rounds before this time are deleted.
+
+        Returns:
+            int: Number of deleted items.
+        """
+        with self.engine.begin() as connection:
+            return connection.execute(
+                delete(WorkItem).where(WorkItem.round_at < before)
+            ).rowcount
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Print the completeness report of a round.')
+    parser.add_argument('round_at', type=datetime.fromisoformat)
+    args = parser.parse_args()
+    logging.basicConfig(format=LOGGING_FORMAT, level=LOGGING_LEVEL)
+    print(json.dumps(
+        WorkQueueRepository(DATABASE_URL).report(args.round_at), indent=2))
+
+
+if __name__ == '__main__':
+    main()
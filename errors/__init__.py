@@ -1,3 +1,4 @@
-from .errors import APIKeyNotFoundError, ClientError, ServerError
+from .errors import (
+    APIKeyNotFoundError, ClientError, ServerError, ThrottledError)
 
-__all__ = [APIKeyNotFoundError, ClientError, ServerError]
+__all__ = [APIKeyNotFoundError, ClientError, ServerError, ThrottledError]
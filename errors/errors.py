@@ -8,3 +8,16 @@ class ClientError(Exception):
 
 class ServerError(Exception):
     pass
+
+
+class ThrottledError(ClientError):
+    """
+    The API answered 429 Too Many Requests.
+
+    Attributes:
+        retry_after (float | None): Seconds the API asked to wait, None if
+            the response had no Retry-After header.
+    """
+    def __init__(self, *args, retry_after: float | None = None) -> None:
+        super().__init__(*args)
+        self.retry_after = retry_after
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from celery import group
+
+from celery_config import app
+from config import (
+    API_KEY, DATABASE_URL, FETCH_MODE, FORECAST_INTERVAL, SHARD_SIZE,
+    WRITE_BATCH_SIZE)
+from database import CityRepository, ForecastRepository
+from errors import APIKeyNotFoundError
+from metrics import STAGE_SECONDS, timed
+from models import CityRecord
+from scheduling import shard_countdowns
+from schemas import ForecastStep, parse_forecast
+from weather_api_service import OpenWeatherForecastParser, fetch_forecasts
+from weather_parser import fetch_weather_sync, get_cities, setup_logging
+
+
+def fetch_forecast_round(cities: list[CityRecord]) -> list[dict | Exception]:
+    """
+    Fetch 5-day forecasts for cities.
+
+    Args:
+        cities (list[CityRecord]): Cities to fetch forecasts for.
+
+    Returns:
+        list[dict | Exception]: Forecast data or the exception for every
+        city, in the order of ``cities``.
+    """
+    if FETCH_MODE == 'async':
+        return asyncio.run(fetch_forecasts(api_key=API_KEY, cities=cities))
+    return fetch_weather_sync(cities, parser_class=OpenWeatherForecastParser)
+
+
+def collect_forecasts(
+        cities: list[CityRecord], issued_at: datetime) -> dict[str, int]:
+    """
+    Fetch forecasts for cities and store the steps that changed.
+
+    Steps are written in batches of WRITE_BATCH_SIZE cities, one
+    transaction per batch.
+
+    Args:
+        cities (list[CityRecord]): Cities to collect forecasts for.
+        issued_at (datetime): Timestamp of the round, stored as the issue
+            time of every step.
+
+    Returns:
+        dict[str, int]: Numbers of ``cities``, ``failed`` cities, fetched
+        ``steps`` and ``saved`` steps.
+    """
+    forecast_repo = ForecastRepository(DATABASE_URL)
+    stage = STAGE_SECONDS.labels
+    with timed(stage('forecast_fetch')):
+        results = fetch_forecast_round(cities)
+    buffer: list[tuple[CityRecord, list[ForecastStep]]] = []
+    failed = steps = saved = 0
+    with timed(stage('forecast_store')):
+        for city, result in zip(cities, results):
+            if isinstance(result, Exception):
+                logging.error(result)
+                failed += 1
+                continue
+            try:
+                forecast = parse_forecast(result)
+            except ValueError as e:
+                logging.error(e)
+                failed += 1
+                continue
+            steps += len(forecast)
+            buffer.append((city, forecast))
+            if len(buffer) >= WRITE_BATCH_SIZE:
+                saved += forecast_repo.write_many(buffer, issued_at)
+                buffer = []
+        saved += forecast_repo.write_many(buffer, issued_at)
+    return {
+        'cities': len(cities),
+        'failed': failed,
+        'steps': steps,
+        'saved': saved,
+    }
+
+
+@app.task(name='forecast_parser.parse_forecasts')
+def parse_forecasts():
+    """
+    Celery task collecting forecasts of all cities.
+
+    Cities are split into shards of SHARD_SIZE, and shard starts are
+    spread over the forecast interval like the shards of a weather round.
+
+    Raises:
+        APIKeyNotFoundError: If the API_KEY is not set in the environment
+        variables.
+    """
+    if API_KEY is None:
+        logging.error('API KEY is not set in .env file')
+        raise APIKeyNotFoundError
+    setup_logging()
+    city_ids = [city.id for city in get_cities(CityRepository(DATABASE_URL))]
+    issued_at = datetime.utcnow().isoformat()
+    shards = [
+        city_ids[i:i + SHARD_SIZE]
+        for i in range(0, len(city_ids), SHARD_SIZE)
+    ]
+    countdowns = shard_countdowns(len(shards), FORECAST_INTERVAL)
+    group(
+        collect_forecast_shard.s(shard, issued_at).set(countdown=countdown)
+        for shard, countdown in zip(shards, countdowns)
+    )()
+    logging.info(f'Forecasts {issued_at}: {len(shards)} shards dispatched')
+
+
+@app.task(
+    name='forecast_parser.collect_forecast_shard',
+    acks_late=True,
+    reject_on_worker_lost=True,
+)
+def collect_forecast_shard(
+        city_ids: list[str], issued_at: str) -> dict[str, int]:
+    """
+    Celery task collecting forecasts for one shard of cities.
+
+    A redelivered shard is harmless, as steps already stored for the issue
+    are not written again.
+
+    Args:
+        city_ids (list[str]): IDs of the cities of the shard.
+        issued_at (str): ISO timestamp of the forecast round.
+
+    Returns:
+        dict[str, int]: Statistics of collect_forecasts().
+    """
+    setup_logging()
+    cities = CityRepository(DATABASE_URL).get_by_ids(city_ids)
+    stats = collect_forecasts(cities, datetime.fromisoformat(issued_at))
+    logging.info(
+        f'Forecasts {issued_at}: {stats["saved"]} of {stats["steps"]} steps '
+        f'saved, {stats["failed"]} of {stats["cities"]} cities failed'
+    )
+    return stats
@@ -0,0 +1,144 @@
+import os
+import socket
+import threading
+import time
+import weakref
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+from requests import Session
+from requests.adapters import HTTPAdapter, Retry
+
+from config import (
+    API_BACKOFF_FACTOR, API_RETRIES, HTTP_KEEPALIVE_IDLE, HTTP_POOL_SIZE)
+
+RETRY_STATUSES = [500, 502, 503, 504]
+
+_local = threading.local()
+_sessions = weakref.WeakSet()
+_async_counters = {'new': 0, 'reused': 0}
+_counters_lock = threading.Lock()
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that enables TCP keep-alive on pooled connections.
+
+    Idle connections to the API stay open between requests instead of being
+    dropped by NAT or load balancers, so the pool can keep reusing them.
+    """
+    def init_poolmanager(self, *args, **kwargs):
+        options = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            options.append(
+                (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, HTTP_KEEPALIVE_IDLE))
+        kwargs['socket_options'] = options
+        super().init_poolmanager(*args, **kwargs)
+
+
+def create_session() -> Session:
+    """
+    Create an HTTP session with a connection pool and retry policy.
+
+    Returns:
+        Session: A new session, mounted with KeepAliveAdapter.
+    """
+    session = Session()
+    retries = Retry(
+        total=API_RETRIES,
+        backoff_factor=API_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+    )
+    adapter = KeepAliveAdapter(
+        pool_connections=1,
+        pool_maxsize=HTTP_POOL_SIZE,
+        max_retries=retries,
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session() -> Session:
+    """
+    Get the long-lived HTTP session of the current thread.
+
+    Sessions are not shared between threads, and a forked child process
+    gets its own sessions instead of the sockets inherited from the parent.
+
+    Returns:
+        Session: The pooled session of the current thread.
+    """
+    session = getattr(_local, 'session', None)
+    if session is None or _local.pid != os.getpid():
+        session = create_session()
+        _local.session = session
+        _local.pid = os.getpid()
+        _sessions.add(session)
+    return session
+
+
+def trace_connections() -> aiohttp.TraceConfig:
+    """
+    Build an aiohttp trace config counting new and reused connections.
+
+    Returns:
+        aiohttp.TraceConfig: Trace config to pass to a ClientSession.
+    """
+    async def on_create(session, context, params):
+        with _counters_lock:
+            _async_counters['new'] += 1
+
+    async def on_reuse(session, context, params):
+        with _counters_lock:
+            _async_counters['reused'] += 1
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_end.append(on_create)
+    trace_config.on_connection_reuseconn.append(on_reuse)
+    return trace_config
+
+
+def connection_stats() -> dict[str, int]:
+    """
+    Count new and reused HTTP connections made by this process.
+
+    Returns:
+        dict[str, int]: Numbers of ``new`` and ``reused`` connections.
+    """
+    with _counters_lock:
+        new = _async_counters['new']
+        reused = _async_counters['reused']
+    for session in list(_sessions):
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                new += pool.num_connections
+                reused += max(pool.num_requests - pool.num_connections, 0)
+    return {'new': new, 'reused': reused}
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Parse a Retry-After header.
+
+    Args:
+        value (str | None): Delay in seconds or an HTTP date.
+
+    Returns:
+        float | None: Seconds to wait, None if the header is missing or
+        invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
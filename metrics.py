@@ -0,0 +1,149 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+from config import METRICS_PORT, ROUND_INTERVAL, ROUND_WARNING_SHARE
+
+LATENCY_BUCKETS = (
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+CITY_OUTCOMES = ('saved', 'failed', 'unchanged', 'not_due', 'skipped')
+ROUND_BUCKETS = (
+    10, 30, 60, 120, 300, 600, 900, 1200, 1800, 2400, 3000, 3600, 5400)
+
+API_LATENCY = Histogram(
+    'weather_api_request_seconds',
+    'Latency of OpenWeatherMap API calls.',
+    ['endpoint'],
+    buckets=LATENCY_BUCKETS,
+)
+API_RESPONSES = Counter(
+    'weather_api_responses_total',
+    'OpenWeatherMap API responses by status class.',
+    ['endpoint', 'status'],
+)
+RETRIES = Counter(
+    'weather_api_retries_total',
+    'Retried OpenWeatherMap API calls and city fetches by reason.',
+    ['reason'],
+)
+VALIDATION_SECONDS = Histogram(
+    'weather_validation_seconds',
+    'Time to decode and validate the weather of one city.',
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001),
+)
+DB_WRITE_SECONDS = Histogram(
+    'weather_db_write_seconds',
+    'Latency of weather writes to the database.',
+    ['method'],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_SECONDS = Histogram(
+    'weather_stage_seconds',
+    'Time a shard spends in every stage of the collection.',
+    ['stage'],
+    buckets=LATENCY_BUCKETS + (60, 300, 600, 1800),
+)
+CITIES = Counter(
+    'weather_cities_total',
+    'Cities processed by the collector by outcome.',
+    ['outcome'],
+)
+ROUND_DURATION = Histogram(
+    'weather_round_seconds',
+    'Duration of collection rounds.',
+    buckets=ROUND_BUCKETS,
+)
+ROUND_WINDOW_USAGE = Gauge(
+    'weather_round_window_ratio',
+    'Duration of the last round as a share of the round interval.',
+)
+ROUND_LATENESS = Gauge(
+    'weather_round_lateness_seconds',
+    'Delay of the start of the last round after its scheduled slot.',
+)
+ROUND_COMPLETENESS = Gauge(
+    'weather_round_completeness_ratio',
+    'Share of cities of the last drained round with collected weather.',
+)
+ROUNDS_SKIPPED = Counter(
+    'weather_rounds_skipped_total',
+    'Rounds skipped because the previous round was still running.',
+)
+
+
+def status_class(status: int) -> str:
+    """
+    Get the label of an HTTP status.
+
+    Throttling is told apart from other client errors.
+
+    Args:
+        status (int): HTTP status code.
+
+    Returns:
+        str: ``429`` or the status class, like ``2xx``.
+    """
+    if status == 429:
+        return '429'
+    return f'{status // 100}xx'
+
+
+@contextmanager
+def timed(histogram: Histogram) -> Iterator[None]:
+    """
+    Observe the time spent in the block, even if it raises.
+
+    Unlike Histogram.time(), works with a labeled child as well as with
+    a histogram, and adds nothing but a perf_counter call.
+
+    Args:
+        histogram (Histogram): The histogram or its labeled child.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started)
+
+
+def count_cities(stats: dict[str, int]) -> None:
+    """
+    Add outcomes of a shard to the cities counter.
+
+    Args:
+        stats (dict[str, int]): Statistics of a shard, keys other than
+            CITY_OUTCOMES are ignored.
+    """
+    for outcome in CITY_OUTCOMES:
+        if stats.get(outcome):
+            CITIES.labels(outcome).inc(stats[outcome])
+
+
+def observe_round(duration: float) -> None:
+    """
+    Record the duration of a round and warn when it nears the interval.
+
+    Rounds longer than ROUND_WARNING_SHARE of ROUND_INTERVAL are logged
+    as warnings, as the next round is about to start before this one ends.
+
+    Args:
+        duration (float): Duration of the round in seconds.
+    """
+    ROUND_DURATION.observe(duration)
+    usage = duration / ROUND_INTERVAL
+    ROUND_WINDOW_USAGE.set(usage)
+    if usage >= ROUND_WARNING_SHARE:
+        logging.warning(
+            f'Round took {duration:.0f}s, {usage:.0%} of the '
+            f'{ROUND_INTERVAL}s round interval'
+        )
+
+
+def start_metrics_server() -> None:
+    """Expose metrics over HTTP on METRICS_PORT, unless it is 0."""
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
+        logging.info(f'Metrics are served on port {METRICS_PORT}')
@@ -1,8 +1,9 @@
 import uuid
 from datetime import datetime
+from typing import NamedTuple
 
 from sqlalchemy import (
-    Column, DateTime, Float, Enum, ForeignKey, Integer, String)
+    Column, DateTime, Float, Enum, ForeignKey, Index, Integer, String, Uuid)
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
@@ -18,6 +19,10 @@ class City(Base):
         lat (float): The latitude of the city's location.
         lon (float): The longitude of the city's location.
         population (int): The population of the city.
+        owm_id (int): The OpenWeatherMap ID of the city, known after the
+            first fetch by coordinates.
+        updated_at (datetime): The timestamp of the last change of the city,
+            used to detect changes of the cities table.
         weather (relationship): A one-to-many relationship with weather
             records.
 
@@ -25,20 +30,30 @@ class City(Base):
         validate(): Validates the integrity of city attributes.
         __repr__(): Returns a string representation of the city.
 
+    Name and coordinates are the natural key of a city, so loading the same
+    cities again updates them instead of adding duplicates.
     """
     __tablename__ = 'cities'
+    __table_args__ = (
+        Index('uq_cities_name_lat_lon', 'name', 'lat', 'lon', unique=True),
+    )
 
     id = Column(
         String,
         primary_key=True,
-        default=str(uuid.uuid4()),
+        default=lambda: str(uuid.uuid4()),
         unique=True,
         nullable=False,
     )
     name = Column(String(100))
     lat = Column(Float(decimal_return_scale=6, precision=10))
     lon = Column(Float(decimal_return_scale=6, precision=9))
-    population = Column(Integer)
+    population = Column(Integer, index=True)
+    owm_id = Column(Integer, index=True)
+    updated_at = Column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+        index=True,
+    )
     weather = relationship('Weather', backref='city')
 
     def validate(self):
@@ -56,12 +71,39 @@ class City(Base):
         )
 
 
+class CityRecord(NamedTuple):
+    """
+    Lightweight immutable view of a city, as used by collection tasks.
+
+    Attributes:
+        id (str): The identifier of the city.
+        name (str): The name of the city.
+        lat (float): The latitude of the city's location.
+        lon (float): The longitude of the city's location.
+        population (int): The population of the city.
+        owm_id (int | None): The OpenWeatherMap ID of the city.
+    """
+    id: str
+    name: str
+    lat: float
+    lon: float
+    population: int
+    owm_id: int | None
+
+    def __repr__(self):
+        return (
+            f'{self.name}: population({self.population}), '
+            f'(lat={self.lat}, lon={self.lon})'
+        )
+
+
 class Weather(Base):
     """
     Represents weather data for a specific city at a particular time.
 
     Attributes:
-        id (uuid4): A unique identifier for the weather record.
+        id (uuid4): A unique identifier for the weather record, stored as
+            a native UUID.
         temperature (float): The temperature in degrees Kelvin.
         weather (str): The weather condition (e.g., 'Rain', 'Clear').
         weather_description (str): A description of the weather conditions.
@@ -70,20 +112,27 @@ class Weather(Base):
         wind_speed (float): Wind speed in meters per second.
         wind_direction (float): Wind direction in degrees.
         clouds (int): Cloud cover in percentage.
+        observed_at (datetime): Time the provider calculated the weather
+            (``dt`` of the response).
         created_at (datetime): The timestamp when the weather record was
             created.
         city_id (str): The identifier of the associated city.
 
     Methods:
         validate(): Validates the integrity of weather data attributes.
+
+    A city has at most one record per collection round, so writing a round
+    again does not duplicate weather. The primary key includes created_at,
+    so the table can be range-partitioned by month on PostgreSQL
+    (see database.partitions). The (city_id, created_at DESC) index covers
+    history queries of a city.
     """
     __tablename__ = 'weather'
 
     id = Column(
-        String,
+        Uuid,
         primary_key=True,
-        default=str(uuid.uuid4()),
-        unique=True,
+        default=uuid.uuid4,
         nullable=False,
     )
     temperature = Column(Float(precision=6, decimal_return_scale=2))
@@ -98,9 +147,21 @@ class Weather(Base):
     wind_speed = Column(Float)
     wind_direction = Column(Float)
     clouds = Column(Integer)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    observed_at = Column(DateTime)
+    created_at = Column(
+        DateTime, primary_key=True, default=datetime.utcnow, nullable=False)
     city_id = Column(String, ForeignKey('cities.id'))
 
+    __table_args__ = (
+        Index(
+            'uq_weather_city_created',
+            city_id,
+            created_at.desc(),
+            unique=True,
+            postgresql_include=['temperature', 'humidity', 'pressure'],
+        ),
+    )
+
     def validate(self):
         if not 0 < self.pressure <= 1500:
             raise ValueError('Pressure must be from 0 to 1500')
@@ -110,3 +171,168 @@ class Weather(Base):
             raise ValueError('Wind direction must be from 0 to 360')
         if not 0 >= self.humidity >= 100:
             raise ValueError('Humidity must be from 0 to 100')
+
+
+class CityPollState(Base):
+    """
+    Represents how often weather of a city actually changes.
+
+    Attributes:
+        city_id (str): The identifier of the city.
+        observed_at (datetime): Provider calculation time of the last
+            fetched weather.
+        interval (int): Current polling interval in seconds.
+        next_poll_at (datetime): Time the city is fetched again.
+    """
+    __tablename__ = 'city_poll_state'
+
+    city_id = Column(String, ForeignKey('cities.id'), primary_key=True)
+    observed_at = Column(DateTime)
+    interval = Column(Integer, nullable=False)
+    next_poll_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return (
+            f'{self.city_id}: every {self.interval}s, '
+            f'next at {self.next_poll_at}'
+        )
+
+
+class RollupMixin:
+    """
+    Columns shared by the weather rollup tables.
+
+    Every row aggregates the weather of one city over one period. Means
+    ignore missing values, ``samples`` counts all weather records.
+
+    Attributes:
+        city_id (str): The identifier of the city.
+        period_start (datetime): Start of the hour or day.
+        samples (int): Number of weather records in the period.
+        temperature_min (float): Minimum temperature in Kelvin.
+        temperature_max (float): Maximum temperature in Kelvin.
+        temperature_mean (float): Mean temperature in Kelvin.
+        humidity_min (int): Minimum relative humidity.
+        humidity_max (int): Maximum relative humidity.
+        humidity_mean (float): Mean relative humidity.
+        pressure_min (int): Minimum atmospheric pressure in hPa.
+        pressure_max (int): Maximum atmospheric pressure in hPa.
+        pressure_mean (float): Mean atmospheric pressure in hPa.
+    """
+    city_id = Column(String, ForeignKey('cities.id'), primary_key=True)
+    period_start = Column(DateTime, primary_key=True)
+    samples = Column(Integer, nullable=False)
+    temperature_min = Column(Float)
+    temperature_max = Column(Float)
+    temperature_mean = Column(Float)
+    humidity_min = Column(Integer)
+    humidity_max = Column(Integer)
+    humidity_mean = Column(Float)
+    pressure_min = Column(Integer)
+    pressure_max = Column(Integer)
+    pressure_mean = Column(Float)
+
+
+class WeatherHourly(RollupMixin, Base):
+    """
+    Weather of a city aggregated per hour.
+
+    Attributes:
+        cooling_degree_hours (float): Degrees of the mean temperature above
+            COOLING_BASE_TEMPERATURE over the hour.
+    """
+    __tablename__ = 'weather_hourly'
+
+    cooling_degree_hours = Column(Float)
+
+
+class WeatherDaily(RollupMixin, Base):
+    """
+    Weather of a city aggregated per day.
+
+    Attributes:
+        cooling_degree_days (float): Degrees of the mean temperature above
+            COOLING_BASE_TEMPERATURE over the day.
+    """
+    __tablename__ = 'weather_daily'
+
+    cooling_degree_days = Column(Float)
+
+
+class Forecast(Base):
+    """
+    Represents a step of the forecast of a city, as issued at a round.
+
+    A step is stored only when it differs from the latest stored step of
+    the city for the same time, so the forecast for ``valid_at`` known at
+    time T is the step with the latest ``issued_at`` not after T. The
+    primary key starts with (city_id, valid_at) to serve these lookups.
+
+    Attributes:
+        city_id (str): The identifier of the city.
+        valid_at (datetime): Time the step is forecast for.
+        issued_at (datetime): Timestamp of the round the step was fetched
+            at.
+        temperature (float): The temperature in degrees Kelvin.
+        humidity (int): Relative humidity as a percentage.
+        pressure (int): Atmospheric pressure in hPa.
+        wind_speed (float): Wind speed in meters per second.
+        clouds (int): Cloud cover in percentage.
+        precipitation (float): Probability of precipitation, from 0 to 1.
+    """
+    __tablename__ = 'forecast'
+
+    city_id = Column(String, ForeignKey('cities.id'), primary_key=True)
+    valid_at = Column(DateTime, primary_key=True)
+    issued_at = Column(DateTime, primary_key=True)
+    temperature = Column(Float)
+    humidity = Column(Integer)
+    pressure = Column(Integer)
+    wind_speed = Column(Float)
+    clouds = Column(Integer)
+    precipitation = Column(Float)
+
+    def __repr__(self):
+        return (
+            f'{self.city_id}: {self.temperature}K at {self.valid_at}, '
+            f'issued at {self.issued_at}'
+        )
+
+
+class WorkItem(Base):
+    """
+    Represents the collection of weather of a city in one round.
+
+    Every round records an item per city, so cities that failed can be
+    retried on their own and the completeness of a round can be reported.
+
+    Attributes:
+        round_at (datetime): Timestamp of the collection round.
+        city_id (str): The identifier of the city.
+        status (str): ``pending``, ``done``, ``failed`` (to be retried) or
+            ``dead`` (given up).
+        attempts (int): Number of failed attempts.
+        next_retry_at (datetime): Time a failed item is retried at.
+        last_error (str): Error of the last failed attempt.
+        updated_at (datetime): The timestamp of the last change.
+    """
+    __tablename__ = 'work_items'
+    __table_args__ = (
+        Index('ix_work_items_retry', 'round_at', 'status', 'next_retry_at'),
+        Index('ix_work_items_updated', 'updated_at'),
+    )
+
+    round_at = Column(DateTime, primary_key=True)
+    city_id = Column(String, ForeignKey('cities.id'), primary_key=True)
+    status = Column(String(10), nullable=False, default='pending')
+    attempts = Column(Integer, nullable=False, default=0)
+    next_retry_at = Column(DateTime)
+    last_error = Column(String(200))
+    updated_at = Column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return (
+            f'{self.city_id} at {self.round_at}: {self.status}, '
+            f'{self.attempts} attempts'
+        )
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+from config import POLL_BASE_INTERVAL, POLL_MAX_INTERVAL, POLL_SLACK
+from models import CityPollState
+
+
+def is_due(state: CityPollState | None, now: datetime) -> bool:
+    """
+    Check whether a city has to be fetched in this round.
+
+    Args:
+        state (CityPollState | None): Polling state of the city, None if
+            the city was never fetched.
+        now (datetime): Time of the round.
+
+    Returns:
+        bool: True if the city has to be fetched.
+    """
+    return state is None or state.next_poll_at <= now
+
+
+def is_unchanged(state: CityPollState | None, observed_at: datetime) -> bool:
+    """
+    Check whether fetched weather is the same observation as last time.
+
+    Args:
+        state (CityPollState | None): Polling state of the city.
+        observed_at (datetime): Provider calculation time of the weather.
+
+    Returns:
+        bool: True if the provider has not recalculated the weather.
+    """
+    return (
+        state is not None
+        and state.observed_at is not None
+        and observed_at <= state.observed_at
+    )
+
+
+def next_state(
+        city_id: str,
+        state: CityPollState | None,
+        observed_at: datetime,
+        now: datetime,
+) -> dict:
+    """
+    Compute the polling state of a city after a fetch.
+
+    The interval doubles, up to POLL_MAX_INTERVAL, every time the fetched
+    weather turns out unchanged, and falls back to POLL_BASE_INTERVAL as
+    soon as it changes. The next poll is moved POLL_SLACK earlier, so small
+    delays of a round do not postpone the city by a whole round.
+
+    Args:
+        city_id (str): The identifier of the city.
+        state (CityPollState | None): Polling state before the fetch.
+        observed_at (datetime): Provider calculation time of the weather.
+        now (datetime): Time of the round.
+
+    Returns:
+        dict: Column values of the city_poll_state table.
+    """
+    if is_unchanged(state, observed_at):
+        interval = min(state.interval * 2, POLL_MAX_INTERVAL)
+        observed_at = state.observed_at
+    else:
+        interval = POLL_BASE_INTERVAL
+    return {
+        'city_id': city_id,
+        'observed_at': observed_at,
+        'interval': interval,
+        'next_poll_at': now + timedelta(seconds=interval - POLL_SLACK),
+    }
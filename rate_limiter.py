@@ -0,0 +1,379 @@
+import asyncio
+import logging
+import threading
+import time
+
+import redis
+
+from config import (
+    AIMD_DECREASE, AIMD_RECOVERY_CALLS, API_CALLS_PER_MINUTE,
+    API_CALLS_PER_MONTH, RATE_LIMIT_BACKEND)
+from database import get_redis
+
+SECONDS_IN_MINUTE = 60
+SECONDS_IN_MONTH = 30 * 24 * 60 * 60
+HOURS_IN_MONTH = 30 * 24
+REDIS_RETRY_AFTER = 60
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Tokens are reserved in advance: when the bucket is empty the balance goes
+    negative and the caller is told how long to wait for its token. This
+    keeps the bucket lock-free for the awaiting side and works both from
+    threads and from asyncio code.
+
+    An adaptive bucket changes its rate with AIMD: throttling by the API
+    cuts the rate by AIMD_DECREASE, every successful call raises it back
+    by 1 / AIMD_RECOVERY_CALLS of the configured rate.
+
+    Attributes:
+        rate (float): Tokens added to the bucket per second.
+        capacity (float): Maximum number of tokens the bucket can hold.
+        max_rate (float): The configured rate, the ceiling of AIMD.
+        adaptive (bool): Whether the rate follows AIMD.
+    """
+    def __init__(
+            self, rate: float, capacity: float, adaptive: bool = False,
+    ) -> None:
+        """
+        Initialize a TokenBucket.
+
+        Args:
+            rate (float): Tokens added to the bucket per second.
+            capacity (float): Maximum number of tokens the bucket can hold.
+            adaptive (bool): Adapt the rate to throttling with AIMD.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.max_rate = rate
+        self.adaptive = adaptive
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1) -> float:
+        """
+        Take tokens from the bucket.
+
+        Args:
+            tokens (float): Number of tokens to take.
+
+        Returns:
+            float: Seconds the caller has to wait before using the tokens.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def throttle(self, retry_after: float) -> None:
+        """
+        Hold the bucket back after the API throttled a call.
+
+        Only adaptive buckets react: no token is given out for
+        ``retry_after`` seconds and the rate is cut, once per pause, so
+        a burst of throttled calls counts as one signal.
+
+        Args:
+            retry_after (float): Seconds to wait before the next call.
+        """
+        if not self.adaptive:
+            return
+        with self._lock:
+            now = self._refill()
+            if now >= self._paused_until:
+                self.rate = max(
+                    self.max_rate / AIMD_RECOVERY_CALLS,
+                    self.rate * AIMD_DECREASE,
+                )
+            self._tokens = min(self._tokens, 1 - retry_after * self.rate)
+            self._paused_until = now + retry_after
+
+    def succeed(self, calls: int = 1) -> None:
+        """
+        Raise the rate of an adaptive bucket after successful calls.
+
+        Args:
+            calls (int): Number of successful calls.
+        """
+        if not self.adaptive:
+            return
+        with self._lock:
+            self.rate = min(
+                self.max_rate,
+                self.rate + calls * self.max_rate / AIMD_RECOVERY_CALLS,
+            )
+
+    def _refill(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._updated_at) * self.rate,
+        )
+        self._updated_at = now
+        return now
+
+
+class RedisTokenBucket:
+    """
+    Token bucket kept in Redis and shared by all worker processes.
+
+    Works like TokenBucket, but the balance, the rate and the pause live in
+    a Redis hash updated by Lua scripts, so all Celery workers together
+    stay under the account quota. Successful calls are counted locally and
+    sent with the next reservation, which keeps it to one round trip per
+    call. If Redis is unavailable, the bucket falls back to a local
+    TokenBucket for REDIS_RETRY_AFTER seconds.
+
+    Attributes:
+        client (redis.Redis): The Redis client.
+        key (str): Key of the hash with the bucket state.
+        max_rate (float): The configured rate, the ceiling of AIMD.
+        capacity (float): Maximum number of tokens the bucket can hold.
+        adaptive (bool): Whether the rate follows AIMD.
+    """
+
+    RESERVE = """
+    local now = redis.call('TIME')
+    now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+    local max_rate, capacity = tonumber(ARGV[1]), tonumber(ARGV[2])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at', 'rate')
+    local rate = tonumber(state[3]) or max_rate
+    local tokens = tonumber(state[1]) or capacity
+    local updated_at = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+    rate = math.min(max_rate, rate + tonumber(ARGV[4]))
+    tokens = tokens - tonumber(ARGV[3])
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens),
+        'updated_at', tostring(now), 'rate', tostring(rate))
+    redis.call('EXPIRE', KEYS[1], ARGV[5])
+    if tokens >= 0 then
+        return '0'
+    end
+    return tostring(-tokens / rate)
+    """
+    THROTTLE = """
+    local now = redis.call('TIME')
+    now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+    local max_rate, capacity = tonumber(ARGV[1]), tonumber(ARGV[2])
+    local state = redis.call(
+        'HMGET', KEYS[1], 'tokens', 'updated_at', 'rate', 'paused_until')
+    local rate = tonumber(state[3]) or max_rate
+    local tokens = tonumber(state[1]) or capacity
+    local updated_at = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+    if now >= (tonumber(state[4]) or 0) then
+        rate = math.max(tonumber(ARGV[5]), rate * tonumber(ARGV[4]))
+    end
+    tokens = math.min(tokens, 1 - tonumber(ARGV[3]) * rate)
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens),
+        'updated_at', tostring(now), 'rate', tostring(rate),
+        'paused_until', tostring(now + tonumber(ARGV[3])))
+    redis.call('EXPIRE', KEYS[1], ARGV[6])
+    """
+
+    def __init__(
+            self,
+            client: redis.Redis,
+            key: str,
+            rate: float,
+            capacity: float,
+            adaptive: bool = False,
+    ) -> None:
+        """
+        Initialize a RedisTokenBucket.
+
+        Args:
+            client (redis.Redis): The Redis client.
+            key (str): Key of the hash with the bucket state.
+            rate (float): Tokens added to the bucket per second.
+            capacity (float): Maximum number of tokens the bucket can hold.
+            adaptive (bool): Adapt the rate to throttling with AIMD.
+        """
+        self.client = client
+        self.key = key
+        self.max_rate = rate
+        self.capacity = capacity
+        self.adaptive = adaptive
+        self._reserve = client.register_script(self.RESERVE)
+        self._throttle = client.register_script(self.THROTTLE)
+        self._fallback = TokenBucket(rate, capacity, adaptive=adaptive)
+        self._redis_down_until = 0.0
+        self._successes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self) -> int:
+        """Lifetime of the hash: the time to refill the bucket, and more."""
+        return int(self.capacity / self.max_rate) + SECONDS_IN_MINUTE
+
+    def reserve(self, tokens: float = 1) -> float:
+        """
+        Take tokens from the bucket.
+
+        Args:
+            tokens (float): Number of tokens to take.
+
+        Returns:
+            float: Seconds the caller has to wait before using the tokens.
+        """
+        if self._redis_down():
+            return self._fallback.reserve(tokens)
+        with self._lock:
+            successes, self._successes = self._successes, 0
+        increase = successes * self.max_rate / AIMD_RECOVERY_CALLS
+        try:
+            return float(self._reserve(
+                keys=[self.key],
+                args=[self.max_rate, self.capacity, tokens, increase,
+                      self.ttl],
+            ))
+        except redis.RedisError as e:
+            self._fail(e)
+            return self._fallback.reserve(tokens)
+
+    def throttle(self, retry_after: float) -> None:
+        """
+        Hold the bucket back for all workers after a throttled call.
+
+        Args:
+            retry_after (float): Seconds to wait before the next call.
+        """
+        if not self.adaptive:
+            return
+        self._fallback.throttle(retry_after)
+        if self._redis_down():
+            return
+        try:
+            self._throttle(
+                keys=[self.key],
+                args=[self.max_rate, self.capacity, retry_after,
+                      AIMD_DECREASE, self.max_rate / AIMD_RECOVERY_CALLS,
+                      self.ttl],
+            )
+        except redis.RedisError as e:
+            self._fail(e)
+
+    def succeed(self, calls: int = 1) -> None:
+        """
+        Count successful calls to raise the shared rate with.
+
+        Args:
+            calls (int): Number of successful calls.
+        """
+        if not self.adaptive:
+            return
+        self._fallback.succeed(calls)
+        with self._lock:
+            self._successes += calls
+
+    def _redis_down(self) -> bool:
+        return time.monotonic() < self._redis_down_until
+
+    def _fail(self, error: redis.RedisError) -> None:
+        logging.error(
+            f'Rate limiter {self.key} falls back to a local bucket: {error}')
+        self._redis_down_until = time.monotonic() + REDIS_RETRY_AFTER
+
+
+class RateLimiter:
+    """
+    Rate limiter combining several token buckets.
+
+    A call is allowed only when every bucket has a token for it, so one
+    limiter can enforce per-minute and per-month quotas at the same time.
+
+    Attributes:
+        buckets (tuple[TokenBucket | RedisTokenBucket]): Buckets checked
+            on every call.
+    """
+    def __init__(self, *buckets: TokenBucket | RedisTokenBucket) -> None:
+        self.buckets = buckets
+
+    def reserve(self) -> float:
+        """
+        Reserve a token in every bucket.
+
+        Returns:
+            float: Seconds to wait before making the call.
+        """
+        return max((bucket.reserve() for bucket in self.buckets), default=0.0)
+
+    def throttle(self, retry_after: float) -> None:
+        """
+        Report that the API throttled a call.
+
+        Args:
+            retry_after (float): Seconds the API asked to wait.
+        """
+        for bucket in self.buckets:
+            bucket.throttle(retry_after)
+
+    def succeed(self) -> None:
+        """Report a successful call."""
+        for bucket in self.buckets:
+            bucket.succeed()
+
+    async def acquire(self) -> None:
+        """Wait until a call is allowed, without blocking the event loop."""
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def acquire_sync(self) -> None:
+        """Wait until a call is allowed, blocking the current thread."""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+_openweather_limiter = None
+_openweather_limiter_lock = threading.Lock()
+
+
+def get_openweather_limiter() -> RateLimiter:
+    """
+    Get the process-wide limiter for the OpenWeatherMap API.
+
+    The limiter is shared between collection rounds, so the monthly budget
+    is tracked across hourly runs. The monthly bucket holds one hour's share
+    of the quota, which allows an hourly round of up to
+    API_CALLS_PER_MONTH / 720 cities without bursting over the month.
+
+    With RATE_LIMIT_BACKEND ``redis`` the buckets live in Redis and are
+    shared by all workers, ``local`` keeps them in the process. The
+    per-minute bucket adapts its rate to throttling by the API.
+
+    Returns:
+        RateLimiter: The shared limiter.
+    """
+    global _openweather_limiter
+    with _openweather_limiter_lock:
+        if _openweather_limiter is None:
+            minute = {
+                'rate': API_CALLS_PER_MINUTE / SECONDS_IN_MINUTE,
+                'capacity': API_CALLS_PER_MINUTE,
+                'adaptive': True,
+            }
+            month = {
+                'rate': API_CALLS_PER_MONTH / SECONDS_IN_MONTH,
+                'capacity': API_CALLS_PER_MONTH / HOURS_IN_MONTH,
+            }
+            if RATE_LIMIT_BACKEND == 'redis':
+                client = get_redis()
+                _openweather_limiter = RateLimiter(
+                    RedisTokenBucket(
+                        client, 'ratelimit:openweather:minute', **minute),
+                    RedisTokenBucket(
+                        client, 'ratelimit:openweather:month', **month),
+                )
+            else:
+                _openweather_limiter = RateLimiter(
+                    TokenBucket(**minute), TokenBucket(**month))
+    return _openweather_limiter
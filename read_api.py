@@ -0,0 +1,378 @@
+"""
+Read-only HTTP API over collected weather.
+
+Endpoints:
+    GET /latest?count=N                  latest weather of the top N cities
+    GET /cities/<id>/latest              latest weather of a city
+    GET /cities/<id>/history?since=&until=&limit=
+                                         weather of a city, newest first
+
+Usage:
+    python -m read_api --port 8080
+"""
+import argparse
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from socketserver import ThreadingMixIn
+from typing import Callable, Iterable
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIServer, make_server
+
+from config import (
+    CITIES_COUNT, DATABASE_URL, LOGGING_FORMAT, LOGGING_LEVEL,
+    READ_API_CACHE_SIZE, READ_API_MAX_LIMIT, READ_API_PORT,
+    READ_API_VERSION_TTL)
+from database import (
+    CityRepository, LatestWeatherCache, WeatherRepository, get_latest_cache)
+from database.work_queue import WorkQueueRepository
+from models import CityRecord
+
+HISTORY_LIMIT = 100
+
+
+class HTTPError(Exception):
+    """
+    Error answered to the client with its HTTP status.
+
+    Attributes:
+        status (str): HTTP status line, like ``404 Not Found``.
+        message (str): Description of the error.
+    """
+    def __init__(self, status: str, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class LRUCache:
+    """
+    Thread-safe cache of rendered responses, evicting the least recently
+    used ones.
+
+    Attributes:
+        size (int): Maximum number of responses.
+    """
+    def __init__(self, size: int = READ_API_CACHE_SIZE) -> None:
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Get a cached value and mark it as recently used.
+
+        Args:
+            key: Key of the value.
+
+        Returns:
+            The value, None if it is not cached.
+        """
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        """
+        Cache a value, evicting the least recently used one when full.
+
+        Args:
+            key: Key of the value.
+            value: The value.
+        """
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+class WriteVersion:
+    """
+    Time of the latest write of weather or cities, the version of all data.
+
+    Rounds and their retries settle work items after writing weather, so
+    the newest ``updated_at`` of the work items changes with every write,
+    including retries stored with the timestamp of an earlier round.
+    Responses also list cities, so the newest ``updated_at`` of the cities
+    counts as well; both columns are indexed. The database is asked at
+    most once per ``ttl`` seconds, so polling clients do not reach it.
+
+    Attributes:
+        work_queue (WorkQueueRepository): Repository to read the time of
+            weather writes with.
+        city_repo (CityRepository): Repository to read the time of city
+            writes with.
+        ttl (float): Seconds a read timestamp is trusted.
+    """
+    def __init__(
+            self,
+            work_queue: WorkQueueRepository,
+            city_repo: CityRepository,
+            ttl: float = READ_API_VERSION_TTL,
+    ) -> None:
+        self.work_queue = work_queue
+        self.city_repo = city_repo
+        self.ttl = ttl
+        self._value = None
+        self._checked = float('-inf')
+        self._lock = threading.Lock()
+
+    def get(self) -> datetime | None:
+        """
+        Get the time of the latest write.
+
+        Returns:
+            datetime | None: The time, None if nothing is stored.
+        """
+        with self._lock:
+            if time.monotonic() - self._checked >= self.ttl:
+                updates = [
+                    update for update in (
+                        self.work_queue.last_update(),
+                        self.city_repo.last_update(),
+                    ) if update is not None
+                ]
+                self._value = max(updates, default=None)
+                self._checked = time.monotonic()
+            return self._value
+
+
+class ReadAPI:
+    """
+    WSGI application serving weather from the repositories.
+
+    Responses carry an ETag and Last-Modified of the latest write and are
+    cached in memory until the next write, so repeated polling is
+    answered with ``304 Not Modified`` or from the cache.
+
+    Attributes:
+        city_repo (CityRepository): Repository to read cities with.
+        weather_repo (WeatherRepository): Repository to read weather with.
+        version (WriteVersion): Version of the data.
+        cache (LRUCache): Rendered responses by path and query.
+    """
+
+    ROUTES = (
+        (re.compile(r'^/latest/?$'), 'latest_all'),
+        (re.compile(r'^/cities/(?P<city_id>[^/]+)/latest/?$'), 'latest'),
+        (re.compile(r'^/cities/(?P<city_id>[^/]+)/history/?$'), 'history'),
+    )
+
+    def __init__(
+            self,
+            database_url: str = DATABASE_URL,
+            cache_size: int = READ_API_CACHE_SIZE,
+            version_ttl: float = READ_API_VERSION_TTL,
+    ) -> None:
+        self.city_repo = CityRepository(database_url)
+        self.weather_repo = WeatherRepository(
+            database_url, cache=get_latest_cache())
+        self.version = WriteVersion(
+            WorkQueueRepository(database_url), self.city_repo, version_ttl)
+        self.cache = LRUCache(cache_size)
+
+    def __call__(
+            self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        method = environ['REQUEST_METHOD']
+        path = environ.get('PATH_INFO', '')
+        query = environ.get('QUERY_STRING', '')
+        try:
+            if method not in ('GET', 'HEAD'):
+                raise HTTPError('405 Method Not Allowed', 'Only GET is served')
+            handler, kwargs = self._resolve(path)
+            version = self.version.get()
+            headers = self._version_headers(version)
+            if self._not_modified(environ, version):
+                start_response('304 Not Modified', headers)
+                return []
+            cached = self.cache.get((path, query))
+            if cached is not None and cached[0] == version:
+                body = cached[1]
+            else:
+                body = self._dump(handler(parse_qs(query), **kwargs))
+                self.cache.put((path, query), (version, body))
+            status = '200 OK'
+        except HTTPError as e:
+            status, headers = e.status, []
+            body = self._dump({'error': e.message})
+        except Exception as e:
+            logging.exception(e)
+            status, headers = '500 Internal Server Error', []
+            body = self._dump({'error': 'Internal error'})
+        start_response(status, headers + [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(body))),
+        ])
+        return [] if method == 'HEAD' else [body]
+
+    def latest_all(self, params: dict) -> dict:
+        """Latest weather of the most populated cities."""
+        count = self._int(params, 'count', CITIES_COUNT, CITIES_COUNT)
+        cities = self.city_repo.get_all(count)
+        latest = self.weather_repo.get_latest(city.id for city in cities)
+        return {
+            'cities': [
+                {**self._city(city), 'weather': latest.get(city.id)}
+                for city in cities
+            ],
+        }
+
+    def latest(self, params: dict, city_id: str) -> dict:
+        """Latest weather of a city."""
+        city = self._get_city(city_id)
+        return {
+            **self._city(city),
+            'weather': self.weather_repo.get_latest([city.id]).get(city.id),
+        }
+
+    def history(self, params: dict, city_id: str) -> dict:
+        """
+        Weather of a city over a time range, newest first.
+
+        A full page links the next one with ``next_until``, the timestamp
+        to pass as ``until`` to get the older records.
+        """
+        city = self._get_city(city_id)
+        limit = self._int(params, 'limit', HISTORY_LIMIT, READ_API_MAX_LIMIT)
+        records = self.weather_repo.get_all(
+            city,
+            since=self._datetime(params, 'since'),
+            limit=limit,
+            until=self._datetime(params, 'until'),
+        )
+        items = [
+            {field: getattr(record, field)
+             for field in LatestWeatherCache.FIELDS}
+            for record in records
+        ]
+        return {
+            'city_id': city.id,
+            'items': items,
+            'next_until': (
+                records[-1].created_at if len(records) == limit else None),
+        }
+
+    def _resolve(self, path: str) -> tuple[Callable, dict]:
+        for pattern, name in self.ROUTES:
+            match = pattern.match(path)
+            if match:
+                return getattr(self, name), match.groupdict()
+        raise HTTPError('404 Not Found', f'No route for {path}')
+
+    def _get_city(self, city_id: str) -> CityRecord:
+        cities = self.city_repo.get_by_ids([city_id])
+        if not cities:
+            raise HTTPError('404 Not Found', f'City {city_id} not found')
+        return cities[0]
+
+    @staticmethod
+    def _version_headers(version: datetime | None) -> list[tuple]:
+        if version is None:
+            return [('Cache-Control', 'no-cache')]
+        return [
+            ('Cache-Control', 'no-cache'),
+            ('ETag', f'"{version.isoformat()}"'),
+            ('Last-Modified', format_datetime(
+                version.replace(tzinfo=timezone.utc), usegmt=True)),
+        ]
+
+    @staticmethod
+    def _not_modified(environ: dict, version: datetime | None) -> bool:
+        """
+        Check conditional headers of a request against the latest write.
+
+        If-None-Match takes precedence over If-Modified-Since.
+        """
+        if version is None:
+            return False
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            tags = {tag.strip().removeprefix('W/')
+                    for tag in if_none_match.split(',')}
+            return f'"{version.isoformat()}"' in tags or '*' in tags
+        if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+        if if_modified_since is None:
+            return False
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        modified = version.replace(tzinfo=timezone.utc, microsecond=0)
+        return modified <= since
+
+    @staticmethod
+    def _city(city: CityRecord) -> dict:
+        return {
+            'id': city.id,
+            'name': city.name,
+            'lat': city.lat,
+            'lon': city.lon,
+            'population': city.population,
+        }
+
+    @staticmethod
+    def _int(params: dict, name: str, default: int, maximum: int) -> int:
+        if name not in params:
+            return default
+        try:
+            value = int(params[name][0])
+        except ValueError:
+            raise HTTPError('400 Bad Request', f'{name} must be an integer')
+        if not 1 <= value <= maximum:
+            raise HTTPError(
+                '400 Bad Request', f'{name} must be from 1 to {maximum}')
+        return value
+
+    @staticmethod
+    def _datetime(params: dict, name: str) -> datetime | None:
+        if name not in params:
+            return None
+        try:
+            value = datetime.fromisoformat(params[name][0])
+        except ValueError:
+            raise HTTPError(
+                '400 Bad Request', f'{name} must be an ISO 8601 timestamp')
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    @staticmethod
+    def _dump(payload: dict) -> bytes:
+        return json.dumps(payload, default=_json_default).encode()
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    """WSGI server answering every request in its own thread."""
+    daemon_threads = True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Serve collected weather over HTTP.')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=READ_API_PORT)
+    args = parser.parse_args()
+    logging.basicConfig(format=LOGGING_FORMAT, level=LOGGING_LEVEL)
+    with make_server(
+            args.host, args.port, ReadAPI(),
+            server_class=ThreadingWSGIServer) as server:
+        logging.info(f'Read API is served on port {args.port}')
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+import logging
+import math
+from datetime import datetime, timedelta, timezone
+
+import redis
+from celery.schedules import schedstate, schedule
+
+from config import (
+    ROUND_INTERVAL, ROUND_LOCK_TTL, ROUND_OFFSET, ROUND_SPREAD_SHARE)
+
+ROUND_LOCK_KEY = 'lock:weather_round'
+RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _naive_utc(moment: datetime) -> datetime:
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def slot_start(
+        moment: datetime,
+        interval: int = ROUND_INTERVAL,
+        offset: int = ROUND_OFFSET,
+) -> datetime:
+    """
+    Get the scheduled start of the round a moment belongs to.
+
+    Rounds start every ``interval`` seconds counted from the Unix epoch
+    plus ``offset``, so the schedule does not depend on when any process
+    was started.
+
+    Args:
+        moment (datetime): The moment, naive UTC or aware.
+        interval (int): Round interval in seconds.
+        offset (int): Shift of the rounds from the interval boundaries in
+            seconds.
+
+    Returns:
+        datetime: Naive UTC start of the round.
+    """
+    epoch = datetime(1970, 1, 1)
+    seconds = (_naive_utc(moment) - epoch).total_seconds() - offset
+    return epoch + timedelta(
+        seconds=math.floor(seconds / interval) * interval + offset)
+
+
+class FixedRate(schedule):
+    """
+    Celery beat schedule running a task at fixed slots of an interval.
+
+    Unlike a plain interval schedule, the next run is not counted from
+    the previous one, so rounds do not drift when beat is late or
+    restarted. A beat that was down over several slots runs the task once,
+    not once per missed slot.
+
+    Attributes:
+        interval (int): Round interval in seconds.
+        offset (int): Shift of the rounds from the interval boundaries in
+            seconds.
+    """
+    def __init__(
+            self,
+            interval: int = ROUND_INTERVAL,
+            offset: int = ROUND_OFFSET,
+            app=None,
+    ) -> None:
+        super().__init__(run_every=timedelta(seconds=interval), app=app)
+        self.interval = interval
+        self.offset = offset
+
+    def is_due(self, last_run_at: datetime) -> schedstate:
+        now = _naive_utc(self.now())
+        current = slot_start(now, self.interval, self.offset)
+        next_in = (
+            current + timedelta(seconds=self.interval) - now).total_seconds()
+        last_run_at = _naive_utc(self.maybe_make_aware(last_run_at))
+        if last_run_at < current:
+            return schedstate(is_due=True, next=next_in)
+        return schedstate(is_due=False, next=next_in)
+
+    def __repr__(self) -> str:
+        return f'<fixed rate: every {self.interval}s + {self.offset}s>'
+
+    def __reduce__(self):
+        return self.__class__, (self.interval, self.offset)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, FixedRate):
+            return (
+                (self.interval, self.offset)
+                == (other.interval, other.offset))
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((self.interval, self.offset))
+
+
+def acquire_round_lock(round_at: str) -> bool:
+    """
+    Mark a round as running, unless another round still runs.
+
+    The lock is released by finish_round, or by fail_round when a shard
+    failed. It expires after ROUND_LOCK_TTL seconds, a little over one
+    interval, so a round that released nothing skips one round at most.
+    If Redis is unavailable the round runs without the lock.
+
+    Args:
+        round_at (str): ISO timestamp of the round, the owner of the lock.
+
+    Returns:
+        bool: True if the round may run.
+    """
+    # Imported here, so beat loads the schedule without the database layer.
+    from database.cache import get_redis
+    client = get_redis()
+    try:
+        if client.set(ROUND_LOCK_KEY, round_at, nx=True, ex=ROUND_LOCK_TTL):
+            return True
+        owner = client.get(ROUND_LOCK_KEY)
+    except redis.RedisError as e:
+        logging.error(f'Round lock is unavailable, running anyway: {e}')
+        return True
+    logging.warning(f'Round {owner} is still running, round skipped')
+    return False
+
+
+def release_round_lock(round_at: str) -> None:
+    """
+    Release the lock of a round, if the round still holds it.
+
+    Args:
+        round_at (str): ISO timestamp of the round.
+    """
+    from database.cache import get_redis
+    client = get_redis()
+    try:
+        client.register_script(RELEASE)(
+            keys=[ROUND_LOCK_KEY], args=[round_at])
+    except redis.RedisError as e:
+        logging.error(f'Round lock was not released: {e}')
+
+
+def shard_countdowns(
+        shards: int,
+        interval: int = ROUND_INTERVAL,
+        share: float = ROUND_SPREAD_SHARE,
+) -> list[float]:
+    """
+    Spread start times of the shards of a round.
+
+    Shards start evenly over ``share`` of the interval, so the request
+    rate stays flat instead of bursting at the start of the round.
+
+    Args:
+        shards (int): Number of shards.
+        interval (int): Round interval in seconds.
+        share (float): Share of the interval to spread the shards over,
+            0 starts all shards at once.
+
+    Returns:
+        list[float]: Delay of every shard in seconds.
+    """
+    step = interval * share / shards if shards else 0
+    return [i * step for i in range(shards)]
@@ -1,11 +1,28 @@
+from dataclasses import dataclass
 from typing import Optional
 from typing_extensions import Annotated
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    import json
 
 kelvin = float
 
 
-class Coord(BaseModel):
+class DeferredModel(BaseModel):
+    """
+    Base model whose validator is built on first validation, not on import.
+
+    Bulk rounds decode with WeatherRecord, so workers do not pay for
+    building the nested response models unless they are used.
+    """
+    model_config = ConfigDict(defer_build=True)
+
+
+class Coord(DeferredModel):
     """
     Represents the geographical coordinates (latitude and longitude) of a
         location.
@@ -18,7 +35,7 @@ class Coord(BaseModel):
     lon: Annotated[float, Field(ge=-180, le=180)]
 
 
-class Weather(BaseModel):
+class Weather(DeferredModel):
     """
     Represents weather information for a location.
 
@@ -35,7 +52,7 @@ class Weather(BaseModel):
     icon: Annotated[str, Field(max_length=10)]
 
 
-class MainWeather(BaseModel):
+class MainWeather(DeferredModel):
     """
     Represents main weather information for a location.
 
@@ -61,7 +78,7 @@ class MainWeather(BaseModel):
     grnd_level: Optional[Annotated[int, Field(ge=0, le=10000)]] = None
 
 
-class Wind(BaseModel):
+class Wind(DeferredModel):
     """
     Represents wind information for a location.
 
@@ -75,7 +92,7 @@ class Wind(BaseModel):
     gust: Optional[Annotated[float, Field(ge=0, le=1000)]] = None
 
 
-class Clouds(BaseModel):
+class Clouds(DeferredModel):
     """
     Represents cloud cover information for a location.
 
@@ -85,7 +102,7 @@ class Clouds(BaseModel):
     all: Annotated[int, Field(ge=0, le=100)]
 
 
-class Sys(BaseModel):
+class Sys(DeferredModel):
     """
     Represents system-related information for a location.
 
@@ -103,7 +120,7 @@ class Sys(BaseModel):
     sunset: Optional[Annotated[int, Field(ge=0)]] = None
 
 
-class WeatherOpenWeatherResponse(BaseModel):
+class WeatherOpenWeatherResponse(DeferredModel):
     """
     Represents the response data from the OpenWeather API for weather
     information.
@@ -111,31 +128,226 @@ class WeatherOpenWeatherResponse(BaseModel):
     Attributes:
         coord (Coord): The geographical coordinates of the location.
         weather (List[Weather]): A list of weather conditions for the location.
-        base (str): The data source.
+        base (Optional[str]): The data source.
         main (MainWeather): Main weather information for the location.
-        visibility (int): Visibility in meters.
+        visibility (Optional[int]): Visibility in meters.
         wind (Wind): Wind information for the location.
         clouds (Clouds): Cloud cover information for the location.
         dt (int): Time of data calculation (Unix timestamp).
-        timezone (int): Timezone offset in seconds from UTC.
+        timezone (Optional[int]): Timezone offset in seconds from UTC.
         id (int): Location ID.
         name (str): Location name.
-        cod (int): Response code.
+        cod (Optional[int]): Response code.
         sys (Optional[Sys]): System-related information for the location.
         rain (Optional[Dict[str, float]]): Rain information (if available).
 
+    Items of the several-cities endpoint have no base, timezone and cod.
+
     """
     coord: Coord
     weather: list[Weather]
-    base: Annotated[str, Field(max_length=100)]
+    base: Optional[Annotated[str, Field(max_length=100)]] = None
     main: MainWeather
-    visibility: Annotated[int, Field(ge=0, le=10000)]
+    visibility: Optional[Annotated[int, Field(ge=0, le=10000)]] = None
     wind: Wind
     clouds: Clouds
     dt: Annotated[int, Field(ge=0)]
-    timezone: int
+    timezone: Optional[int] = None
     id: int
     name: Annotated[str, Field(max_length=100)]
-    cod: Annotated[int, Field(ge=0, le=1000)]
+    cod: Optional[Annotated[int, Field(ge=0, le=1000)]] = None
     sys: Optional[Sys] = None
     rain: Optional[dict[str, float]] = None
+
+
+@dataclass(frozen=True, slots=True)
+class WeatherRecord:
+    """
+    Flat weather observation holding only the fields that are stored.
+
+    A light alternative to WeatherOpenWeatherResponse for bulk rounds:
+    decoding skips the nested models and validates only these fields,
+    with the same bounds as the full schema.
+
+    Attributes:
+        id (int): Location ID.
+        dt (int): Time of data calculation (Unix timestamp).
+        temperature (Optional[float]): The temperature in Kelvin (K).
+        weather (str): The main weather condition.
+        weather_description (str): A description of the weather conditions.
+        pressure (Optional[int]): Atmospheric pressure in hPa.
+        humidity (Optional[int]): Relative humidity as a percentage.
+        wind_speed (float): Wind speed in meters per second (m/s).
+        wind_direction (float): Wind direction in degrees.
+        clouds (int): Cloud cover as a percentage.
+    """
+    id: int
+    dt: int
+    temperature: Optional[float]
+    weather: str
+    weather_description: str
+    pressure: Optional[int]
+    humidity: Optional[int]
+    wind_speed: float
+    wind_direction: float
+    clouds: int
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'WeatherRecord':
+        """
+        Decode and validate a weather item of the API response.
+
+        Args:
+            data (dict): Decoded JSON of one city.
+
+        Raises:
+            ValueError: If a stored field is missing or out of bounds.
+        """
+        try:
+            main = data['main']
+            condition = data['weather'][0]
+            wind = data['wind']
+            return cls(
+                id=int(data['id']),
+                dt=_bounded(data['dt'], int, 0, None, 'dt'),
+                temperature=_optional(
+                    main.get('temp'), float, 0, 400, 'main.temp'),
+                weather=_text(condition['main'], 'weather.main'),
+                weather_description=_text(
+                    condition['description'], 'weather.description'),
+                pressure=_optional(
+                    main.get('pressure'), int, 0, 1500, 'main.pressure'),
+                humidity=_optional(
+                    main.get('humidity'), int, 0, 100, 'main.humidity'),
+                wind_speed=_bounded(wind['speed'], float, 0, 1000, 'speed'),
+                wind_direction=_bounded(wind['deg'], float, 0, 360, 'deg'),
+                clouds=_bounded(data['clouds']['all'], int, 0, 100, 'clouds'),
+            )
+        except (KeyError, IndexError, TypeError) as e:
+            raise ValueError(f'Invalid weather response: {e!r}') from e
+
+    @classmethod
+    def from_response(
+            cls, weather: WeatherOpenWeatherResponse) -> 'WeatherRecord':
+        """
+        Flatten a validated response model.
+
+        Args:
+            weather (WeatherOpenWeatherResponse): The response model.
+        """
+        return cls(
+            id=weather.id,
+            dt=weather.dt,
+            temperature=weather.main.temp,
+            weather=weather.weather[0].main,
+            weather_description=weather.weather[0].description,
+            pressure=weather.main.pressure,
+            humidity=weather.main.humidity,
+            wind_speed=weather.wind.speed,
+            wind_direction=weather.wind.deg,
+            clouds=weather.clouds.all,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class ForecastStep:
+    """
+    One 3-hour step of the 5-day forecast, holding only stored fields.
+
+    Attributes:
+        dt (int): Time the step is forecast for (Unix timestamp).
+        temperature (Optional[float]): The temperature in Kelvin (K).
+        humidity (Optional[int]): Relative humidity as a percentage.
+        pressure (Optional[int]): Atmospheric pressure in hPa.
+        wind_speed (Optional[float]): Wind speed in meters per second.
+        clouds (Optional[int]): Cloud cover as a percentage.
+        precipitation (Optional[float]): Probability of precipitation,
+            from 0 to 1.
+    """
+    dt: int
+    temperature: Optional[float]
+    humidity: Optional[int]
+    pressure: Optional[int]
+    wind_speed: Optional[float]
+    clouds: Optional[int]
+    precipitation: Optional[float]
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ForecastStep':
+        """
+        Decode and validate a step of the forecast response.
+
+        Args:
+            data (dict): Decoded JSON of one item of ``list``.
+
+        Raises:
+            ValueError: If the time is missing or a field is out of bounds.
+        """
+        try:
+            main = data.get('main', {})
+            return cls(
+                dt=_bounded(data['dt'], int, 0, None, 'dt'),
+                temperature=_optional(
+                    main.get('temp'), float, 0, 400, 'main.temp'),
+                humidity=_optional(
+                    main.get('humidity'), int, 0, 100, 'main.humidity'),
+                pressure=_optional(
+                    main.get('pressure'), int, 0, 1500, 'main.pressure'),
+                wind_speed=_optional(
+                    data.get('wind', {}).get('speed'), float, 0, 1000,
+                    'wind.speed'),
+                clouds=_optional(
+                    data.get('clouds', {}).get('all'), int, 0, 100,
+                    'clouds.all'),
+                precipitation=_optional(data.get('pop'), float, 0, 1, 'pop'),
+            )
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f'Invalid forecast step: {e!r}') from e
+
+
+def parse_forecast(data: dict) -> list[ForecastStep]:
+    """
+    Decode and validate all steps of a forecast response.
+
+    Args:
+        data (dict): Decoded JSON of the forecast of one city.
+
+    Raises:
+        ValueError: If the response has no steps or a step is invalid.
+    """
+    try:
+        items = data['list']
+    except (KeyError, TypeError) as e:
+        raise ValueError(f'Invalid forecast response: {e!r}') from e
+    return [ForecastStep.from_dict(item) for item in items]
+
+
+def loads(raw: bytes | str):
+    """
+    Decode JSON, with orjson when it is installed.
+
+    Args:
+        raw (bytes | str): JSON document.
+    """
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _bounded(value, cast, low, high, name):
+    value = cast(value)
+    if value < low or (high is not None and value > high):
+        raise ValueError(f'{name}={value} is out of [{low}, {high}]')
+    return value
+
+
+def _optional(value, cast, low, high, name):
+    if value is None:
+        return None
+    return _bounded(value, cast, low, high, name)
+
+
+def _text(value, name, max_length=100):
+    if not isinstance(value, str) or len(value) > max_length:
+        raise ValueError(f'{name} must be a string up to {max_length} chars')
+    return value
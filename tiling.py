@@ -0,0 +1,109 @@
+import math
+from collections import defaultdict
+
+from config import SHARE_RADIUS_KM
+from models import CityRecord
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def distance_km(a: CityRecord, b: CityRecord) -> float:
+    """
+    Get the great-circle distance between two cities.
+
+    Args:
+        a (CityRecord): The first city.
+        b (CityRecord): The second city.
+
+    Returns:
+        float: Haversine distance in kilometers.
+    """
+    lat_a, lat_b = math.radians(a.lat), math.radians(b.lat)
+    h = (
+        math.sin((lat_b - lat_a) / 2) ** 2
+        + math.cos(lat_a) * math.cos(lat_b)
+        * math.sin(math.radians(b.lon - a.lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+class Tiling:
+    """
+    Groups of nearby cities that share one fetched observation.
+
+    Cities are bucketed into a grid of cells about ``radius_km`` wide, so
+    only the neighbouring cells are searched for a city to share with.
+    Cities are taken in the given order, and every city joins the first
+    leader within ``radius_km``, or becomes a leader itself, so with
+    cities ordered by population the largest city of a cluster is fetched.
+
+    Attributes:
+        radius_km (float): Maximum distance from a city to its leader,
+            0 disables sharing.
+        leaders (list[CityRecord]): Cities to fetch weather for, in the
+            given order.
+        members (dict[str, list[CityRecord]]): Cities served by each
+            leader, by the leader's ID, without the leader.
+    """
+    def __init__(
+            self,
+            cities: list[CityRecord],
+            radius_km: float = SHARE_RADIUS_KM,
+    ) -> None:
+        self.radius_km = radius_km
+        self.leaders = []
+        self.members = {}
+        cells = defaultdict(list)
+        for city in cities:
+            leader = self._find_leader(cells, city) if radius_km > 0 else None
+            if leader is None:
+                self.leaders.append(city)
+                self.members[city.id] = []
+                if radius_km > 0:
+                    cells[self._cell(city, self._row(city.lat))].append(city)
+            else:
+                self.members[leader.id].append(city)
+
+    @property
+    def shared(self) -> int:
+        """Number of cities served by the observation of another city."""
+        return sum(len(members) for members in self.members.values())
+
+    def share(self, leader: CityRecord) -> list[CityRecord]:
+        """
+        Get the cities the observation of a leader is fanned out to.
+
+        Args:
+            leader (CityRecord): A city of ``leaders``.
+
+        Returns:
+            list[CityRecord]: The leader followed by its members.
+        """
+        return [leader, *self.members[leader.id]]
+
+    def _row(self, lat: float) -> int:
+        return math.floor(lat * KM_PER_DEGREE / self.radius_km)
+
+    def _cell(self, city: CityRecord, row: int) -> tuple[int, int]:
+        """
+        Get the grid cell of a city within a row of cells.
+
+        Cells of a row are ``radius_km`` wide along the row's central
+        latitude, so they stay square towards the poles.
+        """
+        lat = (row + 0.5) * self.radius_km / KM_PER_DEGREE
+        scale = max(math.cos(math.radians(lat)), 1e-6)
+        return row, math.floor(
+            city.lon * KM_PER_DEGREE * scale / self.radius_km)
+
+    def _find_leader(
+            self, cells: dict, city: CityRecord) -> CityRecord | None:
+        row = self._row(city.lat)
+        for neighbour_row in (row - 1, row, row + 1):
+            _, column = self._cell(city, neighbour_row)
+            for neighbour_column in (column - 1, column, column + 1):
+                for leader in cells.get((neighbour_row, neighbour_column), ()):
+                    if distance_km(city, leader) <= self.radius_km:
+                        return leader
+        return None
@@ -0,0 +1,458 @@
+"""
+Store of recent hourly weather of every city, kept in NumPy arrays.
+
+Usage:
+    python -m timeseries data/recent_weather
+"""
+import argparse
+import json
+import logging
+import warnings
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterable, NamedTuple, Sequence
+
+import numpy as np
+from sqlalchemy import Engine, select
+
+from config import (
+    DATABASE_URL, EXPORT_BATCH_SIZE, LOGGING_FORMAT, LOGGING_LEVEL,
+    RECENT_STORE_DAYS, RECENT_STORE_DIR, ROUND_INTERVAL)
+from database import get_engine
+from models import Weather
+
+VALUES_FILE = 'values.npy'
+META_FILE = 'meta.json'
+MISSING = np.iinfo(np.int16).min
+# Values are stored as int16 offsets from a base, in units of 1 / scale.
+ENCODING = {
+    'temperature': (273.15, 100),
+    'humidity': (0.0, 100),
+    'pressure': (1000.0, 10),
+}
+FIELDS = tuple(ENCODING)
+REFRESH_OVERLAP = timedelta(seconds=2 * ROUND_INTERVAL)
+INITIAL_CAPACITY = 1024
+
+
+class WindowStats(NamedTuple):
+    """
+    Statistics of a field of every city over a window of hours.
+
+    Attributes:
+        city_ids (np.ndarray): City IDs, the order of all other arrays.
+        mean (np.ndarray): Mean value, NaN for cities without data.
+        min (np.ndarray): Minimum value.
+        max (np.ndarray): Maximum value.
+        trend (np.ndarray): Least squares slope per hour, NaN for cities
+            with less than two values.
+    """
+    city_ids: np.ndarray
+    mean: np.ndarray
+    min: np.ndarray
+    max: np.ndarray
+    trend: np.ndarray
+
+
+def encode(field: str, values: np.ndarray) -> np.ndarray:
+    """
+    Encode values of a field as int16 offsets from its base.
+
+    Args:
+        field (str): Name of the field, a key of ENCODING.
+        values (np.ndarray): Values, NaN where missing.
+
+    Returns:
+        np.ndarray: Encoded values, MISSING where missing.
+    """
+    base, scale = ENCODING[field]
+    values = np.asarray(values, dtype=np.float64)
+    encoded = np.clip(
+        np.rint((values - base) * scale), MISSING + 1, np.iinfo(np.int16).max)
+    return np.where(np.isnan(values), MISSING, encoded).astype(np.int16)
+
+
+def decode(field: str, encoded: np.ndarray) -> np.ndarray:
+    """
+    Decode int16 offsets of a field back to values.
+
+    Args:
+        field (str): Name of the field, a key of ENCODING.
+        encoded (np.ndarray): Encoded values.
+
+    Returns:
+        np.ndarray: float32 values, NaN where missing.
+    """
+    base, scale = ENCODING[field]
+    values = encoded.astype(np.float32) / scale + base
+    values[encoded == MISSING] = np.nan
+    return values
+
+
+class RecentWeatherStore:
+    """
+    Ring buffer of hourly weather of every city over the last days.
+
+    Values of all fields live in one ``fields x cities x hours`` int16
+    array, a slot per city and hour, so a window of any city is a slice
+    and statistics of all cities are computed with vectorized operations.
+    A store in a directory keeps the array in a memory-mapped ``.npy``
+    file, so a restarted process maps it instantly instead of loading the
+    history from the database.
+
+    Only one process should write to a store; readers open it with
+    ``readonly`` and reopen it to see new rounds.
+
+    Attributes:
+        values (np.ndarray): The ring buffer, MISSING where there is no
+            weather.
+        city_ids (list[str]): City ID of every row.
+        latest_hour (int | None): Newest hour stored, in hours since the
+            Unix epoch.
+        watermark (datetime | None): Newest ``created_at`` read from the
+            database.
+        directory (Path | None): Directory of the snapshot, None for a
+            store kept in memory only.
+    """
+    def __init__(
+            self,
+            values: np.ndarray,
+            city_ids: list[str],
+            latest_hour: int | None = None,
+            watermark: datetime | None = None,
+            directory: Path | None = None,
+    ) -> None:
+        self.values = values
+        self.city_ids = city_ids
+        self.latest_hour = latest_hour
+        self.watermark = watermark
+        self.directory = directory
+        self._rows = {city_id: row for row, city_id in enumerate(city_ids)}
+
+    @property
+    def hours(self) -> int:
+        """Number of hours kept for every city."""
+        return self.values.shape[2]
+
+    @classmethod
+    def create(
+            cls,
+            directory: str | Path | None = None,
+            days: int = RECENT_STORE_DAYS,
+            capacity: int = INITIAL_CAPACITY,
+    ) -> 'RecentWeatherStore':
+        """
+        Create an empty store.
+
+        Args:
+            directory (str | Path | None): Directory of the snapshot, None
+                to keep the store in memory.
+            days (int): Number of days kept for every city.
+            capacity (int): Number of cities to allocate rows for.
+        """
+        shape = (len(FIELDS), capacity, days * 24)
+        if directory is None:
+            return cls(np.full(shape, MISSING, dtype=np.int16), [])
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        values = np.lib.format.open_memmap(
+            directory / VALUES_FILE, mode='w+', dtype=np.int16, shape=shape)
+        values[:] = MISSING
+        store = cls(values, [], directory=directory)
+        store.flush()
+        return store
+
+    @classmethod
+    def open(
+            cls, directory: str | Path, readonly: bool = False,
+    ) -> 'RecentWeatherStore':
+        """
+        Open the snapshot of a store.
+
+        Args:
+            directory (str | Path): Directory of the snapshot.
+            readonly (bool): Map the values read-only.
+        """
+        directory = Path(directory)
+        meta = json.loads((directory / META_FILE).read_text())
+        values = np.load(
+            directory / VALUES_FILE, mmap_mode='r' if readonly else 'r+')
+        watermark = meta['watermark']
+        return cls(
+            values,
+            meta['city_ids'],
+            latest_hour=meta['latest_hour'],
+            watermark=watermark and datetime.fromisoformat(watermark),
+            directory=directory,
+        )
+
+    @classmethod
+    def open_or_create(
+            cls, directory: str | Path, days: int = RECENT_STORE_DAYS,
+    ) -> 'RecentWeatherStore':
+        """
+        Open the snapshot of a store, creating the store if there is none.
+
+        Args:
+            directory (str | Path): Directory of the snapshot.
+            days (int): Number of days kept for every city of a new store.
+        """
+        if (Path(directory) / META_FILE).exists():
+            return cls.open(directory)
+        return cls.create(directory, days=days)
+
+    def add(
+            self,
+            city_ids: Sequence[str],
+            created_at: np.ndarray,
+            values: dict[str, np.ndarray],
+    ) -> int:
+        """
+        Put weather records into their city and hour slots.
+
+        A newer hour moves the ring forward and clears the slots it
+        reuses. Records older than the kept hours are ignored, and a later
+        record of the same city and hour replaces an earlier one.
+
+        Args:
+            city_ids (Sequence[str]): City ID of every record.
+            created_at (np.ndarray): Timestamps of the records, as
+                ``datetime64``.
+            values (dict[str, np.ndarray]): Values of every field of
+                FIELDS, NaN where missing.
+
+        Returns:
+            int: Number of stored records.
+        """
+        if not len(city_ids):
+            return 0
+        hours = np.asarray(created_at, dtype='datetime64[h]').astype(np.int64)
+        self._advance(int(hours.max()))
+        keep = hours > self.latest_hour - self.hours
+        rows = self._get_rows(city_ids)[keep]
+        slots = hours[keep] % self.hours
+        for i, field in enumerate(FIELDS):
+            self.values[i, rows, slots] = encode(
+                field, np.asarray(values[field])[keep])
+        return int(keep.sum())
+
+    def refresh(self, engine: Engine) -> int:
+        """
+        Add weather stored in the database since the last refresh.
+
+        Rounds shortly before the watermark are read again, as retries of
+        a round write its weather after the round is finished.
+
+        Args:
+            engine (Engine): Engine of the database.
+
+        Returns:
+            int: Number of stored records.
+        """
+        since = datetime.utcnow() - timedelta(hours=self.hours)
+        if self.watermark is not None:
+            since = max(since, self.watermark - REFRESH_OVERLAP)
+        query = select(
+            Weather.city_id,
+            Weather.created_at,
+            *(getattr(Weather, field) for field in FIELDS),
+        ).where(Weather.created_at >= since)
+        count = 0
+        with engine.connect() as connection:
+            result = connection.execution_options(
+                yield_per=EXPORT_BATCH_SIZE).execute(query)
+            for rows in result.partitions():
+                columns = list(zip(*rows))
+                created_at = np.array(columns[1], dtype='datetime64[us]')
+                count += self.add(columns[0], created_at, {
+                    field: np.array(column, dtype=np.float64)
+                    for field, column in zip(FIELDS, columns[2:])
+                })
+                newest = created_at.max().astype(datetime)
+                if self.watermark is None or newest > self.watermark:
+                    self.watermark = newest
+        self.flush()
+        logging.info(
+            f'{count} weather records added to the recent weather store')
+        return count
+
+    def flush(self) -> None:
+        """Write the snapshot of the store to its directory."""
+        if self.directory is None:
+            return
+        if isinstance(self.values, np.memmap):
+            self.values.flush()
+        meta = {
+            'city_ids': self.city_ids,
+            'latest_hour': self.latest_hour,
+            'watermark': self.watermark and self.watermark.isoformat(),
+        }
+        tmp_path = self.directory / f'{META_FILE}.tmp'
+        tmp_path.write_text(json.dumps(meta))
+        tmp_path.replace(self.directory / META_FILE)
+
+    def series(
+            self,
+            field: str,
+            hours: int,
+            until: datetime | None = None,
+            city_ids: Iterable[str] | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get hourly values of a field of cities, oldest hour first.
+
+        Args:
+            field (str): Name of the field, one of FIELDS.
+            hours (int): Number of hours of the window.
+            until (datetime | None): End of the window, the newest stored
+                hour by default.
+            city_ids (Iterable[str] | None): Cities to get, all by default.
+                Unknown cities are left out.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: City IDs and the
+            ``cities x hours`` float32 matrix, NaN where there is no data.
+
+        Raises:
+            ValueError: If the window is longer than the kept hours.
+        """
+        if hours > self.hours:
+            raise ValueError(
+                f'Window of {hours} hours is longer than {self.hours} kept')
+        if city_ids is None:
+            ids = np.array(self.city_ids, dtype=object)
+            rows = np.arange(len(self.city_ids))
+        else:
+            ids = np.array(
+                [city_id for city_id in city_ids if city_id in self._rows],
+                dtype=object)
+            rows = np.array(
+                [self._rows[city_id] for city_id in ids], dtype=np.int64)
+        if self.latest_hour is None:
+            return ids, np.full((len(rows), hours), np.nan, dtype=np.float32)
+        end = self.latest_hour if until is None else int(
+            np.datetime64(until, 'h').astype(np.int64))
+        window = np.arange(end - hours + 1, end + 1)
+        encoded = self.values[FIELDS.index(field)][rows][
+            :, window % self.hours]
+        matrix = decode(field, encoded)
+        stale = ((window <= self.latest_hour - self.hours)
+                 | (window > self.latest_hour))
+        matrix[:, stale] = np.nan
+        return ids, matrix
+
+    def window(
+            self,
+            field: str,
+            hours: int,
+            until: datetime | None = None,
+            city_ids: Iterable[str] | None = None,
+    ) -> WindowStats:
+        """
+        Get statistics of a field of cities over a window of hours.
+
+        Args:
+            field (str): Name of the field, one of FIELDS.
+            hours (int): Number of hours of the window.
+            until (datetime | None): End of the window, the newest stored
+                hour by default.
+            city_ids (Iterable[str] | None): Cities to get, all by default.
+
+        Returns:
+            WindowStats: Mean, minimum, maximum and trend of every city.
+        """
+        ids, matrix = self.series(field, hours, until, city_ids)
+        present = ~np.isnan(matrix)
+        count = present.sum(axis=1)
+        x = np.arange(hours, dtype=np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'), \
+                warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            mean = np.nanmean(matrix, axis=1)
+            x_mean = (present * x).sum(axis=1) / count
+            dx = np.where(present, x - x_mean[:, None], 0.0)
+            dy = np.where(present, matrix - mean[:, None], 0.0)
+            trend = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+            return WindowStats(
+                city_ids=ids,
+                mean=mean,
+                min=np.nanmin(matrix, axis=1),
+                max=np.nanmax(matrix, axis=1),
+                trend=np.where(count >= 2, trend, np.nan),
+            )
+
+    def _advance(self, hour: int) -> None:
+        if self.latest_hour is not None and hour <= self.latest_hour:
+            return
+        if self.latest_hour is None or hour - self.latest_hour >= self.hours:
+            self.values[:] = MISSING
+        else:
+            cleared = np.arange(self.latest_hour + 1, hour + 1) % self.hours
+            self.values[:, :, cleared] = MISSING
+        self.latest_hour = hour
+
+    def _get_rows(self, city_ids: Sequence[str]) -> np.ndarray:
+        """Get rows of cities, adding rows for new cities."""
+        for city_id in city_ids:
+            if city_id not in self._rows:
+                self._rows[city_id] = len(self.city_ids)
+                self.city_ids.append(city_id)
+        if len(self.city_ids) > self.values.shape[1]:
+            self._grow(max(len(self.city_ids), 2 * self.values.shape[1]))
+        return np.array(
+            [self._rows[city_id] for city_id in city_ids], dtype=np.int64)
+
+    def _grow(self, capacity: int) -> None:
+        """Reallocate the buffer for ``capacity`` cities."""
+        old = self.values
+        shape = (old.shape[0], capacity, old.shape[2])
+        if self.directory is None:
+            self.values = np.full(shape, MISSING, dtype=np.int16)
+        else:
+            tmp_path = self.directory / f'{VALUES_FILE}.tmp'
+            self.values = np.lib.format.open_memmap(
+                tmp_path, mode='w+', dtype=np.int16, shape=shape)
+            self.values[:] = MISSING
+        self.values[:, :old.shape[1]] = old
+        if self.directory is not None:
+            self.values.flush()
+            del old
+            tmp_path.replace(self.directory / VALUES_FILE)
+            self.values = np.load(self.directory / VALUES_FILE, mmap_mode='r+')
+
+
+def refresh_recent_store(directory: str | Path = RECENT_STORE_DIR) -> None:
+    """
+    Refresh the recent weather store after a round, if it is enabled.
+
+    Errors are logged, as the store can always be refilled from the
+    database.
+
+    Args:
+        directory (str | Path): Directory of the store, empty to skip.
+    """
+    if not directory:
+        return
+    try:
+        RecentWeatherStore.open_or_create(directory).refresh(
+            get_engine(DATABASE_URL))
+    except Exception as e:
+        logging.error(f'Recent weather store is not refreshed: {e}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Refresh the recent weather store from the database.')
+    parser.add_argument('directory', nargs='?', default=RECENT_STORE_DIR)
+    args = parser.parse_args()
+    logging.basicConfig(format=LOGGING_FORMAT, level=LOGGING_LEVEL)
+    if not args.directory:
+        parser.error('directory is required when RECENT_STORE_DIR is unset')
+    store = RecentWeatherStore.open_or_create(args.directory)
+    store.refresh(get_engine(DATABASE_URL))
+    print(f'{len(store.city_ids)} cities, {store.hours} hours, '
+          f'up to {store.watermark}')
+
+
+if __name__ == '__main__':
+    main()
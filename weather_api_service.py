@@ -1,9 +1,28 @@
 from abc import ABC, abstractmethod
+import asyncio
 import json
 import logging
-from requests import Session
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterable, Sequence
 
-from errors import ClientError, ServerError
+import aiohttp
+from requests import RequestException, Session
+
+from config import (
+    API_BACKOFF_FACTOR, API_CONCURRENCY, API_RETRIES, API_THROTTLE_DELAY,
+    API_TIMEOUT, GROUP_SIZE, HTTP_KEEPALIVE_IDLE, OPENWEATHER_API_URL)
+from errors import ClientError, ServerError, ThrottledError
+from http_session import get_session, parse_retry_after, trace_connections
+from metrics import API_LATENCY, API_RESPONSES, RETRIES, status_class
+from models import CityRecord
+from rate_limiter import RateLimiter, get_openweather_limiter
+from schemas import loads
+
+RETRYABLE_ERRORS = (
+    ServerError, ThrottledError, aiohttp.ClientError, asyncio.TimeoutError,
+    RequestException,
+)
 
 
 class BaseWeatherParser(ABC):
@@ -45,13 +64,37 @@ class OpenWeatherParser(BaseWeatherParser):
 
     Attributes:
         WEATHER_API_URL (str): The base URL for the OpenWeatherMap API.
+        GROUP_API_URL (str): The URL of the several-cities endpoint, which
+            returns weather for up to GROUP_SIZE city IDs in one call.
 
     """
 
     WEATHER_API_URL = (
-        'https://api.openweathermap.org/data/2.5/weather?'
+        f'{OPENWEATHER_API_URL}/data/2.5/weather?'
         'lat={lat}&lon={lon}&appid={api_key}'
     )
+    GROUP_API_URL = (
+        f'{OPENWEATHER_API_URL}/data/2.5/group?'
+        'id={ids}&appid={api_key}'
+    )
+
+    def __init__(
+            self,
+            session: Session | None = None,
+            limiter: RateLimiter | None = None,
+    ):
+        """
+        Initialize an OpenWeatherParser.
+
+        Args:
+            session (Session | None): The HTTP session used for making API
+                requests, the pooled session of the current thread
+                by default.
+            limiter (RateLimiter | None): The limiter every request has to
+                pass, no limit by default.
+        """
+        super().__init__(session or get_session())
+        self.limiter = limiter
 
     def parse_api(self, api_key: str, lat: float, lon: float):
         """
@@ -64,14 +107,425 @@ class OpenWeatherParser(BaseWeatherParser):
         """
 
         url = self.WEATHER_API_URL.format(lat=lat, lon=lon, api_key=api_key)
+        return self._get(url, endpoint='weather')
+
+    def parse_group(self, api_key: str, ids: Sequence[int]) -> list[dict]:
+        """
+        Parse weather data for several cities with one API call.
+
+        Args:
+            api_key (str): The API key for accessing the OpenWeatherMap API.
+            ids (Sequence[int]): OpenWeatherMap city IDs, at most GROUP_SIZE.
+
+        Returns:
+            list[dict]: Weather data of every city found by the API.
+        """
+        url = self.GROUP_API_URL.format(
+            ids=','.join(map(str, ids)), api_key=api_key)
+        return self._get(url, endpoint='group')['list']
+
+    def _get(self, url: str, endpoint: str) -> dict:
+        """
+        Get JSON from the API.
+
+        Server errors are retried by the session. Throttled calls wait for
+        as long as the API asks in Retry-After and are retried.
+        """
         logging.debug(url)
-        try:
-            result = self.session.get(url)
-            if 400 <= result.status_code < 500:
-                raise ClientError(result)
-            if 500 <= result.status_code < 600:
-                raise ServerError(result)
-            return result.json()
-        except json.JSONDecodeError as e:
-            logging.error('Server response invalid')
-            raise e
+        for attempt in range(API_RETRIES + 1):
+            if self.limiter:
+                self.limiter.acquire_sync()
+            try:
+                started = time.perf_counter()
+                result = self.session.get(url, timeout=API_TIMEOUT)
+                API_LATENCY.labels(endpoint).observe(
+                    time.perf_counter() - started)
+                API_RESPONSES.labels(
+                    endpoint, status_class(result.status_code)).inc()
+                if result.status_code == 429:
+                    raise ThrottledError(result, retry_after=parse_retry_after(
+                        result.headers.get('Retry-After')))
+                if 400 <= result.status_code < 500:
+                    raise ClientError(result)
+                if 500 <= result.status_code < 600:
+                    raise ServerError(result)
+                data = loads(result.content)
+            except json.JSONDecodeError as e:
+                logging.error('Server response invalid')
+                raise e
+            except ThrottledError as e:
+                if attempt == API_RETRIES:
+                    raise
+                RETRIES.labels('throttled').inc()
+                delay = throttle_delay(e, attempt)
+                if self.limiter:
+                    self.limiter.throttle(delay)
+                else:
+                    time.sleep(delay)
+                continue
+            if self.limiter:
+                self.limiter.succeed()
+            return data
+
+
+class OpenWeatherForecastParser(OpenWeatherParser):
+    """
+    Forecast data parser for the OpenWeatherMap API.
+
+    Fetches the 5-day forecast with a step of 3 hours instead of the
+    current weather.
+
+    Attributes:
+        FORECAST_API_URL (str): The URL of the forecast endpoint.
+    """
+
+    FORECAST_API_URL = (
+        f'{OPENWEATHER_API_URL}/data/2.5/forecast?'
+        'lat={lat}&lon={lon}&appid={api_key}'
+    )
+
+    def parse_api(self, api_key: str, lat: float, lon: float) -> dict:
+        """
+        Parse forecast data from the OpenWeatherMap API.
+
+        Args:
+            api_key (str): The API key for accessing the OpenWeatherMap API.
+            lat (float): The latitude of the location.
+            lon (float): The longitude of the location.
+
+        Returns:
+            dict: The forecast, with steps in ``list``.
+        """
+        url = self.FORECAST_API_URL.format(lat=lat, lon=lon, api_key=api_key)
+        return self._get(url, endpoint='forecast')
+
+
+class AsyncOpenWeatherParser(BaseWeatherParser):
+    """
+    Asynchronous weather data parser for the OpenWeatherMap API.
+
+    Fetches many cities at once over a single pooled aiohttp session. Every
+    request goes through the shared rate limiter, so concurrency never
+    pushes the collector over the API quota.
+
+    Attributes:
+        session (aiohttp.ClientSession): The HTTP session used for making
+            API requests.
+        limiter (RateLimiter): The limiter every request has to pass.
+    """
+
+    WEATHER_API_URL = OpenWeatherParser.WEATHER_API_URL
+    GROUP_API_URL = OpenWeatherParser.GROUP_API_URL
+
+    def __init__(
+            self,
+            session: aiohttp.ClientSession,
+            limiter: RateLimiter,
+    ) -> None:
+        """
+        Initialize an AsyncOpenWeatherParser.
+
+        Args:
+            session (aiohttp.ClientSession): The HTTP session used for making
+                API requests.
+            limiter (RateLimiter): The limiter every request has to pass.
+        """
+        super().__init__(session)
+        self.limiter = limiter
+
+    async def parse_api(self, api_key: str, lat: float, lon: float) -> dict:
+        """
+        Parse weather data from the OpenWeatherMap API.
+
+        Args:
+            api_key (str): The API key for accessing the OpenWeatherMap API.
+            lat (float): The latitude of the location.
+            lon (float): The longitude of the location.
+
+        Raises:
+            ClientError: If the API answered with a 4xx status.
+            ServerError: If the API kept answering with a 5xx status.
+        """
+        url = self.WEATHER_API_URL.format(lat=lat, lon=lon, api_key=api_key)
+        return await self._get(url, endpoint='weather')
+
+    async def parse_group(
+            self, api_key: str, ids: Sequence[int]) -> list[dict]:
+        """
+        Parse weather data for several cities with one API call.
+
+        Args:
+            api_key (str): The API key for accessing the OpenWeatherMap API.
+            ids (Sequence[int]): OpenWeatherMap city IDs, at most GROUP_SIZE.
+
+        Returns:
+            list[dict]: Weather data of every city found by the API.
+        """
+        url = self.GROUP_API_URL.format(
+            ids=','.join(map(str, ids)), api_key=api_key)
+        return (await self._get(url, endpoint='group'))['list']
+
+    async def parse_many(
+            self,
+            api_key: str,
+            cities: Sequence[CityRecord],
+            group: bool = False,
+    ) -> list[dict | Exception]:
+        """
+        Parse weather data for many cities concurrently.
+
+        Args:
+            api_key (str): The API key for accessing the OpenWeatherMap API.
+            cities (Sequence[CityRecord]): Cities to fetch weather for.
+            group (bool): Fetch cities with a known OpenWeatherMap ID
+                through the several-cities endpoint.
+
+        Returns:
+            list[dict | Exception]: Weather data or the raised exception for
+            every city, in the order of ``cities``.
+        """
+        semaphore = asyncio.Semaphore(API_CONCURRENCY)
+        groups = make_groups(cities) if group else []
+        singles = [
+            city for city in cities if not (group and city.owm_id)]
+
+        async def fetch_group(ids: list[int]) -> list[dict]:
+            async with semaphore:
+                return await self.parse_group(api_key=api_key, ids=ids)
+
+        async def fetch(city: CityRecord) -> dict:
+            async with semaphore:
+                return await self.parse_api(
+                    api_key=api_key, lat=city.lat, lon=city.lon)
+
+        results = await asyncio.gather(
+            *(fetch_group(ids) for ids in groups),
+            *(fetch(city) for city in singles),
+            return_exceptions=True,
+        )
+        return match_results(
+            cities, groups, results[:len(groups)], results[len(groups):],
+            group=group,
+        )
+
+    async def _get(self, url: str, endpoint: str) -> dict:
+        """
+        Get JSON from the API.
+
+        Server errors and connection problems are retried with exponential
+        backoff, the same way the synchronous parser retries 5xx responses.
+        Throttled calls hold back the limiter for as long as the API asks
+        in Retry-After and are retried.
+        """
+        logging.debug(url)
+        for attempt in range(API_RETRIES + 1):
+            await self.limiter.acquire()
+            try:
+                started = time.perf_counter()
+                async with self.session.get(url) as result:
+                    API_LATENCY.labels(endpoint).observe(
+                        time.perf_counter() - started)
+                    API_RESPONSES.labels(
+                        endpoint, status_class(result.status)).inc()
+                    if result.status == 429:
+                        raise ThrottledError(
+                            result, retry_after=parse_retry_after(
+                                result.headers.get('Retry-After')))
+                    if 400 <= result.status < 500:
+                        raise ClientError(result)
+                    if 500 <= result.status < 600:
+                        raise ServerError(result)
+                    data = loads(await result.read())
+            except json.JSONDecodeError as e:
+                logging.error('Server response invalid')
+                raise e
+            except ThrottledError as e:
+                if attempt == API_RETRIES:
+                    raise
+                RETRIES.labels('throttled').inc()
+                self.limiter.throttle(throttle_delay(e, attempt))
+                continue
+            except (ServerError, aiohttp.ClientConnectionError,
+                    asyncio.TimeoutError) as e:
+                if attempt == API_RETRIES:
+                    raise
+                RETRIES.labels(
+                    'server' if isinstance(e, ServerError) else 'connection'
+                ).inc()
+                await asyncio.sleep(API_BACKOFF_FACTOR * 2 ** attempt)
+                continue
+            self.limiter.succeed()
+            return data
+
+
+class AsyncOpenWeatherForecastParser(AsyncOpenWeatherParser):
+    """Asynchronous forecast data parser for the OpenWeatherMap API."""
+
+    FORECAST_API_URL = OpenWeatherForecastParser.FORECAST_API_URL
+
+    async def parse_api(self, api_key: str, lat: float, lon: float) -> dict:
+        """
+        Parse forecast data from the OpenWeatherMap API.
+
+        Args:
+            api_key (str): The API key for accessing the OpenWeatherMap API.
+            lat (float): The latitude of the location.
+            lon (float): The longitude of the location.
+
+        Returns:
+            dict: The forecast, with steps in ``list``.
+        """
+        url = self.FORECAST_API_URL.format(lat=lat, lon=lon, api_key=api_key)
+        return await self._get(url, endpoint='forecast')
+
+
+def throttle_delay(error: ThrottledError, attempt: int) -> float:
+    """
+    Get the delay before retrying a throttled call.
+
+    Args:
+        error (ThrottledError): The throttling error.
+        attempt (int): Number of the failed attempt, from 0.
+
+    Returns:
+        float: Retry-After of the response, or an exponential backoff
+        starting from API_THROTTLE_DELAY if the API did not send it.
+    """
+    if error.retry_after is not None:
+        return error.retry_after
+    return API_THROTTLE_DELAY * 2 ** attempt
+
+
+def make_groups(
+        cities: Iterable[CityRecord], group_size: int = GROUP_SIZE,
+) -> list[list[int]]:
+    """
+    Split OpenWeatherMap IDs of cities into groups for one API call each.
+
+    Args:
+        cities (Iterable[CityRecord]): Cities to fetch weather for. Cities
+            without a known OpenWeatherMap ID are skipped.
+        group_size (int): Maximum number of IDs in one group.
+
+    Returns:
+        list[list[int]]: Groups of unique OpenWeatherMap IDs.
+    """
+    ids = sorted({city.owm_id for city in cities if city.owm_id})
+    return [ids[i:i + group_size] for i in range(0, len(ids), group_size)]
+
+
+def match_results(
+        cities: Sequence[CityRecord],
+        groups: list[list[int]],
+        group_results: list[list[dict] | Exception],
+        single_results: list[dict | Exception],
+        group: bool,
+) -> list[dict | Exception]:
+    """
+    Map group and single-city responses back to the cities.
+
+    Args:
+        cities (Sequence[CityRecord]): Cities weather was fetched for.
+        groups (list[list[int]]): OpenWeatherMap IDs of every group call.
+        group_results (list[list[dict] | Exception]): Results of the group
+            calls, in the order of ``groups``.
+        single_results (list[dict | Exception]): Results of single-city
+            calls, in the order of cities fetched one by one.
+        group (bool): Whether cities with a known ID were fetched in groups.
+
+    Returns:
+        list[dict | Exception]: Weather data or the exception for every
+        city, in the order of ``cities``.
+    """
+    by_id = {}
+    for ids, result in zip(groups, group_results):
+        if isinstance(result, Exception):
+            by_id.update(dict.fromkeys(ids, result))
+        else:
+            by_id.update((item['id'], item) for item in result)
+    singles = iter(single_results)
+    results = []
+    for city in cities:
+        if group and city.owm_id:
+            results.append(by_id.get(city.owm_id) or ClientError(
+                f'City {city.name} ({city.owm_id}) not found in group'))
+        else:
+            results.append(next(singles))
+    return results
+
+
+@asynccontextmanager
+async def open_parser(
+        limiter: RateLimiter | None = None,
+        parser_class: type[AsyncOpenWeatherParser] = AsyncOpenWeatherParser,
+) -> AsyncIterator[AsyncOpenWeatherParser]:
+    """
+    Open an asynchronous parser over a new pooled HTTP client.
+
+    Args:
+        limiter (RateLimiter | None): Limiter to use, the process-wide
+            OpenWeatherMap limiter by default.
+        parser_class (type[AsyncOpenWeatherParser]): Class of the parser,
+            AsyncOpenWeatherForecastParser fetches forecasts.
+
+    Yields:
+        AsyncOpenWeatherParser: The parser, usable until the block ends.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=API_CONCURRENCY, keepalive_timeout=HTTP_KEEPALIVE_IDLE)
+    timeout = aiohttp.ClientTimeout(total=API_TIMEOUT)
+    async with aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            trace_configs=[trace_connections()],
+    ) as session:
+        yield parser_class(
+            session=session, limiter=limiter or get_openweather_limiter())
+
+
+async def fetch_weather(
+        api_key: str,
+        cities: Sequence[CityRecord],
+        limiter: RateLimiter | None = None,
+        group: bool = False,
+) -> list[dict | Exception]:
+    """
+    Fetch weather for all cities over one pooled HTTP client.
+
+    Args:
+        api_key (str): The API key for accessing the OpenWeatherMap API.
+        cities (Sequence[CityRecord]): Cities to fetch weather for.
+        limiter (RateLimiter | None): Limiter to use, the process-wide
+            OpenWeatherMap limiter by default.
+        group (bool): Fetch cities with a known OpenWeatherMap ID
+            through the several-cities endpoint.
+
+    Returns:
+        list[dict | Exception]: Weather data or the raised exception for
+        every city, in the order of ``cities``.
+    """
+    async with open_parser(limiter) as parser:
+        return await parser.parse_many(
+            api_key=api_key, cities=cities, group=group)
+
+
+async def fetch_forecasts(
+        api_key: str,
+        cities: Sequence[CityRecord],
+        limiter: RateLimiter | None = None,
+) -> list[dict | Exception]:
+    """
+    Fetch 5-day forecasts for all cities over one pooled HTTP client.
+
+    Args:
+        api_key (str): The API key for accessing the OpenWeatherMap API.
+        cities (Sequence[CityRecord]): Cities to fetch forecasts for.
+        limiter (RateLimiter | None): Limiter to use, the process-wide
+            OpenWeatherMap limiter by default.
+
+    Returns:
+        list[dict | Exception]: Forecast data or the raised exception for
+        every city, in the order of ``cities``.
+    """
+    async with open_parser(limiter, AsyncOpenWeatherForecastParser) as parser:
+        return await parser.parse_many(api_key=api_key, cities=cities)
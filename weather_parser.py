@@ -1,14 +1,524 @@
+import asyncio
 import logging
+import time
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
+
+from celery import chord
+from celery.signals import worker_init, worker_process_init
 
 from celery_config import app
-from config import DATABASE_URL, LOGGING_FORMAT, API_KEY, LOGGING_LEVEL
-from database import CityRepository, TableMaker, WeatherRepository
+from config import (
+    DATABASE_URL, DB_MODE, DECODE_MODE, FETCH_MODE, GROUP_FETCH,
+    LOGGING_FORMAT, API_KEY, LOGGING_LEVEL, RECENT_STORE_DIR, ROUND_INTERVAL,
+    ROUND_RETRIES, ROUND_RETRY_DELAY, SHARD_SIZE, WORK_RETENTION_DAYS,
+    WRITE_BATCH_SIZE)
+from database import (
+    CityRepository, PollStateRepository, RollupRepository, TableMaker,
+    WeatherRepository, dispose_async_engines, dispose_engines, get_engine,
+    get_latest_cache)
+from database.partitions import ensure_partitions
+from database.work_queue import WorkQueueRepository
 from errors import APIKeyNotFoundError
-from requests import Session
-from requests.adapters import HTTPAdapter, Retry
-from models import Base
-from schemas import WeatherOpenWeatherResponse
-from weather_api_service import OpenWeatherParser
+from http_session import connection_stats, get_session
+from metrics import (
+    DB_WRITE_SECONDS, RETRIES, ROUND_COMPLETENESS, ROUND_LATENESS,
+    ROUNDS_SKIPPED, STAGE_SECONDS, VALIDATION_SECONDS, count_cities,
+    observe_round, start_metrics_server, timed)
+from models import Base, CityPollState, CityRecord
+from polling import is_due, is_unchanged, next_state
+from rate_limiter import get_openweather_limiter
+from schemas import WeatherOpenWeatherResponse, WeatherRecord
+from scheduling import (
+    acquire_round_lock, release_round_lock, shard_countdowns, slot_start)
+from tiling import Tiling
+from weather_api_service import (
+    RETRYABLE_ERRORS, OpenWeatherParser, fetch_weather, make_groups,
+    match_results, open_parser)
+
+if TYPE_CHECKING:
+    from database import AsyncWeatherRepository
+
+
+@worker_init.connect
+def create_tables(**kwargs) -> None:
+    """Create database tables once, when the worker starts."""
+    TableMaker(DATABASE_URL, Base).create_tables()
+
+
+@worker_init.connect
+def serve_metrics(**kwargs) -> None:
+    """Expose metrics of the worker over HTTP."""
+    start_metrics_server()
+
+
+@worker_process_init.connect
+def reset_engines(**kwargs) -> None:
+    """Drop database engines inherited from the parent worker process."""
+    dispose_engines(close=False)
+
+
+def fetch_weather_sync(
+        cities: list[CityRecord],
+        group: bool = False,
+        parser_class: type[OpenWeatherParser] = OpenWeatherParser,
+) -> list[dict | Exception]:
+    """
+    Fetch weather for cities one by one with the synchronous parser.
+
+    Args:
+        cities (list[CityRecord]): Cities to fetch weather for.
+        group (bool): Fetch cities with a known OpenWeatherMap ID
+            through the several-cities endpoint.
+        parser_class (type[OpenWeatherParser]): Class of the parser,
+            OpenWeatherForecastParser fetches forecasts.
+
+    Returns:
+        list[dict | Exception]: Weather data or the raised exception for
+        every city, in the order of ``cities``.
+    """
+    parser = parser_class(
+        session=get_session(), limiter=get_openweather_limiter())
+    groups = make_groups(cities) if group else []
+    group_results = []
+    for ids in groups:
+        try:
+            group_results.append(parser.parse_group(api_key=API_KEY, ids=ids))
+        except Exception as e:
+            group_results.append(e)
+    single_results = []
+    for city in cities:
+        if group and city.owm_id:
+            continue
+        try:
+            single_results.append(
+                parser.parse_api(api_key=API_KEY, lat=city.lat, lon=city.lon))
+        except Exception as e:
+            single_results.append(e)
+    return match_results(
+        cities, groups, group_results, single_results, group=group)
+
+
+def requeue(count: int) -> int:
+    """
+    Report cities re-queued within a round.
+
+    Args:
+        count (int): Number of re-queued cities.
+
+    Returns:
+        int: The same number, to add to the round statistics.
+    """
+    logging.warning(
+        f'{count} cities failed, retrying in {ROUND_RETRY_DELAY}s')
+    RETRIES.labels('requeued').inc(count)
+    return count
+
+
+def fetch_round(
+        cities: list[CityRecord],
+) -> tuple[list[dict | Exception], int]:
+    """
+    Fetch weather for cities, re-queueing failed ones within the round.
+
+    Cities lost to throttling, server or connection errors are fetched
+    again after ROUND_RETRY_DELAY seconds, up to ROUND_RETRIES times, so
+    a throttled burst slows the round down instead of dropping cities.
+
+    Args:
+        cities (list[CityRecord]): Cities to fetch weather for.
+
+    Returns:
+        tuple[list[dict | Exception], int]: Weather data or the exception
+        for every city, in the order of ``cities``, and the number of
+        re-queued fetches.
+    """
+    def fetch(cities: list[CityRecord]) -> list[dict | Exception]:
+        if FETCH_MODE == 'async':
+            return asyncio.run(fetch_weather(
+                api_key=API_KEY, cities=cities, group=GROUP_FETCH))
+        return fetch_weather_sync(cities, group=GROUP_FETCH)
+
+    results = fetch(cities)
+    requeued = 0
+    for _ in range(ROUND_RETRIES):
+        failed = [
+            i for i, result in enumerate(results)
+            if isinstance(result, RETRYABLE_ERRORS)
+        ]
+        if not failed:
+            break
+        requeued += requeue(len(failed))
+        time.sleep(ROUND_RETRY_DELAY)
+        for i, result in zip(failed, fetch([cities[i] for i in failed])):
+            results[i] = result
+    return results, requeued
+
+
+def flush_weather(
+        weather_repo: WeatherRepository,
+        buffer: list[tuple[WeatherRecord, CityRecord]],
+        created_at: datetime,
+        errors: dict[str, str] | None = None,
+) -> int:
+    """
+    Write buffered weather to the database and clear the buffer.
+
+    If the bulk write fails, records are written one by one, so one bad
+    record does not cost the whole batch.
+
+    Args:
+        weather_repo (WeatherRepository): Repository to write weather with.
+        buffer (list[tuple[WeatherRecord, CityRecord]]): Validated weather
+            and the cities it belongs to.
+        created_at (datetime): Timestamp of the collection round.
+        errors (dict[str, str] | None): Errors of records that could not
+            be written are added here by city ID.
+
+    Returns:
+        int: Number of saved records.
+    """
+    try:
+        with timed(DB_WRITE_SECONDS.labels('bulk')):
+            saved = weather_repo.write_many(buffer, created_at=created_at)
+    except Exception as e:
+        logging.error(f'Bulk write failed, writing one by one: {e}')
+        saved = 0
+        for weather, city in buffer:
+            try:
+                with timed(DB_WRITE_SECONDS.labels('one')):
+                    weather_repo.write_one(
+                        weather=weather, city=city, created_at=created_at)
+                saved += 1
+            except Exception as e:
+                logging.error(e)
+                if errors is not None:
+                    errors[city.id] = str(e)
+    buffer.clear()
+    return saved
+
+
+async def flush_weather_async(
+        weather_repo: 'AsyncWeatherRepository',
+        records: list[tuple[WeatherRecord, CityRecord]],
+        created_at: datetime,
+        errors: dict[str, str] | None = None,
+) -> int:
+    """
+    Write weather with the asyncio repository, like flush_weather().
+
+    Args:
+        weather_repo (AsyncWeatherRepository): Repository to write weather
+            with.
+        records (list[tuple[WeatherRecord, CityRecord]]): Validated weather
+            and the cities it belongs to.
+        created_at (datetime): Timestamp of the collection round.
+        errors (dict[str, str] | None): Errors of records that could not
+            be written are added here by city ID.
+
+    Returns:
+        int: Number of saved records.
+    """
+    try:
+        with timed(DB_WRITE_SECONDS.labels('bulk')):
+            return await weather_repo.write_many(
+                records, created_at=created_at)
+    except Exception as e:
+        logging.error(f'Bulk write failed, writing one by one: {e}')
+    saved = 0
+    for weather, city in records:
+        try:
+            with timed(DB_WRITE_SECONDS.labels('one')):
+                await weather_repo.write_one(
+                    weather=weather, city=city, created_at=created_at)
+            saved += 1
+        except Exception as e:
+            logging.error(e)
+            if errors is not None:
+                errors[city.id] = str(e)
+    return saved
+
+
+def decode_weather(data: dict) -> WeatherRecord:
+    """
+    Validate weather data of a city with the configured decoder.
+
+    With DECODE_MODE ``fast`` only the stored fields are validated into
+    a flat record; ``pydantic`` builds the full response model first.
+
+    Args:
+        data (dict): Decoded JSON of one city.
+
+    Returns:
+        WeatherRecord: The stored fields of the weather.
+    """
+    with timed(VALIDATION_SECONDS):
+        if DECODE_MODE == 'fast':
+            return WeatherRecord.from_dict(data)
+        return WeatherRecord.from_response(
+            WeatherOpenWeatherResponse(**data))
+
+
+def setup_logging() -> None:
+    """Configure logging of the collector."""
+    logging.basicConfig(format=LOGGING_FORMAT)
+    logger = logging.getLogger()
+    logger.setLevel(LOGGING_LEVEL)
+
+
+def get_cities(city_repo: CityRepository) -> list[CityRecord]:
+    """
+    Get cities to collect weather for, filling the database on first run.
+
+    Args:
+        city_repo (CityRepository): Repository to read cities with.
+
+    Returns:
+        list[CityRecord]: The most populated cities.
+    """
+    cities = city_repo.get_all()
+    if not cities:
+        city_repo.fill_database()
+        cities = city_repo.get_all()
+    return cities
+
+
+def update_rollups(city_ids: list[str], round_at: datetime) -> None:
+    """
+    Recompute hourly and daily rollups of cities after a round.
+
+    Rollups are derived data, so a failure is logged and does not fail the
+    round; RollupRepository.rebuild() can recompute them later.
+
+    Args:
+        city_ids (list[str]): IDs of the collected cities.
+        round_at (datetime): Timestamp of the collection round.
+    """
+    try:
+        with timed(STAGE_SECONDS.labels('rollup')):
+            RollupRepository(DATABASE_URL).update(city_ids, round_at)
+    except Exception as e:
+        logging.error(f'Rollups of round {round_at} are not updated: {e}')
+
+
+class RoundOutcome:
+    """
+    Outcome of the fetched weather of a round, accounted city by city.
+
+    Attributes:
+        states (dict[str, CityPollState]): Polling states before the round.
+        round_at (datetime): Timestamp of the collection round.
+        owm_ids (dict[str, int]): OpenWeatherMap IDs learned in the round.
+        new_states (list[dict]): Polling states after the round.
+        failed (int): Number of cities without valid weather, not
+            counting those whose weather could not be written.
+        unchanged (int): Number of cities whose weather the provider has
+            not recalculated.
+        errors (dict[str, str]): Errors of the failed cities and of the
+            cities whose weather could not be written, by city ID.
+    """
+    def __init__(
+            self, states: dict[str, CityPollState], round_at: datetime,
+    ) -> None:
+        self.states = states
+        self.round_at = round_at
+        self.owm_ids = {}
+        self.new_states = []
+        self.failed = 0
+        self.unchanged = 0
+        self.errors = {}
+
+    def add(
+            self,
+            city: CityRecord,
+            result: dict | Exception,
+            shared: bool = False,
+    ) -> WeatherRecord | None:
+        """
+        Account the fetched weather of a city.
+
+        Args:
+            city (CityRecord): The city.
+            result (dict | Exception): Weather data or the fetch error.
+            shared (bool): The weather was fetched for a nearby city, so
+                its OpenWeatherMap ID is not the city's one.
+
+        Returns:
+            WeatherRecord | None: Weather to store, None if the fetch failed
+            or the weather is unchanged.
+        """
+        if isinstance(result, Exception):
+            logging.error(result)
+            self.failed += 1
+            self.errors[city.id] = repr(result)
+            return None
+        try:
+            weather = decode_weather(result)
+        except Exception as e:
+            logging.error(e)
+            self.failed += 1
+            self.errors[city.id] = repr(e)
+            return None
+        if city.owm_id is None and not shared:
+            self.owm_ids[city.id] = weather.id
+        state = self.states.get(city.id)
+        observed_at = datetime.utcfromtimestamp(weather.dt)
+        self.new_states.append(
+            next_state(city.id, state, observed_at, self.round_at))
+        if is_unchanged(state, observed_at):
+            self.unchanged += 1
+            return None
+        return weather
+
+
+async def fetch_and_store(
+        tiling: Tiling, outcome: RoundOutcome) -> tuple[int, int]:
+    """
+    Fetch weather and store it with the asyncio database layer.
+
+    Cities are fetched in batches of WRITE_BATCH_SIZE, and every batch is
+    written in the background while the next one is fetched, so commits
+    overlap with requests in flight. Cities lost to throttling, server or
+    connection errors are fetched again after all batches, as in
+    fetch_round().
+
+    Args:
+        tiling (Tiling): Cities to fetch weather for, grouped with the
+            nearby cities that share their weather.
+        outcome (RoundOutcome): Outcome of the round to account cities in.
+
+    Returns:
+        tuple[int, int]: Numbers of saved records and of re-queued
+        fetches.
+    """
+    # Imported here, so workers with DB_MODE sync skip SQLAlchemy asyncio.
+    from database import AsyncWeatherRepository
+    weather_repo = AsyncWeatherRepository(
+        DATABASE_URL, cache=get_latest_cache())
+    writes = []
+    requeued = 0
+    try:
+        async with open_parser() as parser:
+            pending = tiling.leaders
+            for attempt in range(ROUND_RETRIES + 1):
+                retry = []
+                for start in range(0, len(pending), WRITE_BATCH_SIZE):
+                    batch = pending[start:start + WRITE_BATCH_SIZE]
+                    results = await parser.parse_many(
+                        api_key=API_KEY, cities=batch, group=GROUP_FETCH)
+                    records = []
+                    for leader, result in zip(batch, results):
+                        if (attempt < ROUND_RETRIES
+                                and isinstance(result, RETRYABLE_ERRORS)):
+                            retry.append(leader)
+                            continue
+                        for city in tiling.share(leader):
+                            weather = outcome.add(
+                                city, result, shared=city is not leader)
+                            if weather is not None:
+                                records.append((weather, city))
+                    if records:
+                        writes.append(asyncio.create_task(flush_weather_async(
+                            weather_repo, records, outcome.round_at,
+                            errors=outcome.errors)))
+                if not retry:
+                    break
+                requeued += requeue(len(retry))
+                await asyncio.sleep(ROUND_RETRY_DELAY)
+                pending = retry
+            saved = sum(await asyncio.gather(*writes))
+    finally:
+        await dispose_async_engines()
+    return saved, requeued
+
+
+def collect_weather(
+        cities: list[CityRecord],
+        round_at: datetime,
+        errors: dict[str, str] | None = None,
+        retry: bool = False,
+) -> dict[str, int]:
+    """
+    Fetch weather for cities and store it in the database.
+
+    Cities whose weather rarely changes are polled less often (see
+    polling), and weather the provider has not recalculated since the last
+    fetch is not stored again. Cities within SHARE_RADIUS_KM of a more
+    populated city of the shard get its weather instead of their own fetch
+    (see tiling). With DB_MODE ``async`` and the async fetch mode, writes
+    overlap with fetching (see fetch_and_store).
+
+    Args:
+        cities (list[CityRecord]): Cities to collect weather for.
+        round_at (datetime): Timestamp of the collection round, used as
+            the timestamp of every stored record.
+        errors (dict[str, str] | None): Errors of cities left without
+            weather are added here by city ID. Their polling states are not
+            saved, so a retry does not take them for polled.
+        retry (bool): The cities are retried within their round, so they
+            are fetched whether they are due or not.
+
+    Returns:
+        dict[str, int]: Numbers of ``cities``, ``saved``, ``failed``,
+        ``unchanged``, ``not_due`` and ``shared`` cities, and of
+        ``requeued`` fetches. ``failed`` counts both fetch and write
+        failures, ``write_failed`` only the cities whose weather could not
+        be written.
+    """
+    city_repo = CityRepository(DATABASE_URL)
+    weather_repo = WeatherRepository(DATABASE_URL, cache=get_latest_cache())
+    poll_repo = PollStateRepository(DATABASE_URL)
+    stage = STAGE_SECONDS.labels
+    with timed(stage('plan')):
+        states = poll_repo.get_all(city.id for city in cities)
+        due = cities if retry else [
+            city for city in cities if is_due(states.get(city.id), round_at)]
+        tiling = Tiling(due)
+    outcome = RoundOutcome(states, round_at)
+    if FETCH_MODE == 'async' and DB_MODE == 'async':
+        with timed(stage('fetch_store')):
+            saved, requeued = asyncio.run(fetch_and_store(tiling, outcome))
+    else:
+        with timed(stage('fetch')):
+            results, requeued = fetch_round(tiling.leaders)
+        buffer = []
+        saved = 0
+        with timed(stage('store')):
+            for leader, result in zip(tiling.leaders, results):
+                for city in tiling.share(leader):
+                    weather = outcome.add(
+                        city, result, shared=city is not leader)
+                    if weather is not None:
+                        buffer.append((weather, city))
+                if len(buffer) >= WRITE_BATCH_SIZE:
+                    saved += flush_weather(
+                        weather_repo, buffer, round_at, outcome.errors)
+            saved += flush_weather(
+                weather_repo, buffer, round_at, outcome.errors)
+    with timed(stage('finish')):
+        city_repo.set_owm_ids(outcome.owm_ids)
+        poll_repo.write_many([
+            state for state in outcome.new_states
+            if state['city_id'] not in outcome.errors
+        ])
+    if errors is not None:
+        errors.update(outcome.errors)
+    write_failed = len(outcome.errors) - outcome.failed
+    stats = connection_stats()
+    logging.info(
+        f'HTTP connections: {stats["new"]} new, {stats["reused"]} reused')
+    result = {
+        'cities': len(cities),
+        'saved': saved,
+        'failed': outcome.failed + write_failed,
+        'write_failed': write_failed,
+        'unchanged': outcome.unchanged,
+        'not_due': len(cities) - len(due),
+        'shared': tiling.shared,
+        'requeued': requeued,
+    }
+    count_cities(result)
+    return result
 
 
 @app.task(name='weather_parser.parse_weather')
@@ -17,9 +527,17 @@ def parse_weather():
     Celery task for parsing weather data from the OpenWeatherMap API and
     storing it in the database.
 
-    This task retrieves a list of cities from the database, fetches weather
-    data for each city from the OpenWeatherMap API, and stores the data in
-    the database using the appropriate repositories.
+    This task retrieves a list of cities from the database, splits them into
+    shards of SHARD_SIZE cities and runs a collect_shard task for every
+    shard, so the round is spread over all workers. Shard starts are spread
+    over ROUND_SPREAD_SHARE of the round interval. When all shards are
+    done, finish_round reports the round statistics, or fail_round
+    releases the round if a shard failed.
+
+    A round is not started while the previous one still holds the round
+    lock, so rounds longer than the interval do not pile up. The lock is
+    taken right before the shards are dispatched and released again if
+    dispatching fails.
 
     Raises:
         APIKeyNotFoundError: If the API_KEY is not set in the environment
@@ -29,39 +547,273 @@ def parse_weather():
     if API_KEY is None:
         logging.error('API KEY is not set in .env file')
         raise APIKeyNotFoundError
-    logging.basicConfig(format=LOGGING_FORMAT)
-    logger = logging.getLogger()
-    logger.setLevel(LOGGING_LEVEL)
+    setup_logging()
 
-    table_maker = TableMaker(DATABASE_URL, Base)
-    table_maker.create_tables()
+    ensure_partitions(get_engine(DATABASE_URL))
+    city_ids = [city.id for city in get_cities(CityRepository(DATABASE_URL))]
+    if not city_ids:
+        logging.error('No cities to collect weather for')
+        return
+    started_at = datetime.utcnow()
+    round_at = started_at.isoformat()
+    lateness = (started_at - slot_start(started_at)).total_seconds()
+    ROUND_LATENESS.set(lateness)
+    shards = [
+        city_ids[i:i + SHARD_SIZE]
+        for i in range(0, len(city_ids), SHARD_SIZE)
+    ]
+    if not acquire_round_lock(round_at):
+        ROUNDS_SKIPPED.inc()
+        return
+    try:
+        chord(
+            collect_shard.s(shard, round_at).set(countdown=countdown)
+            for shard, countdown in zip(shards, shard_countdowns(len(shards)))
+        )(finish_round.s(round_at).on_error(fail_round.s(round_at)))
+    except Exception:
+        release_round_lock(round_at)
+        raise
+    logging.info(
+        f'Round {round_at}: {len(shards)} shards dispatched, '
+        f'{lateness:.0f}s after the scheduled start'
+    )
 
-    city_repo = CityRepository(DATABASE_URL)
-    weather_repo = WeatherRepository(DATABASE_URL)
-    cities = city_repo.get_all()
-    if not cities:
-        city_repo.fill_database()
-        cities = city_repo.get_all()
-    for city in cities:
-        session = Session()
-        retries = Retry(
-            total=5,
-            backoff_factor=0.1,
-            status_forcelist=[500, 502, 503, 504]
+
+@app.task(
+    name='weather_parser.collect_shard',
+    acks_late=True,
+    reject_on_worker_lost=True,
+)
+def collect_shard(city_ids: list[str], round_at: str) -> dict[str, int]:
+    """
+    Celery task collecting weather for one shard of cities.
+
+    The task is acknowledged only after it is done, so a shard of a worker
+    that died mid-round is redelivered. Cities already stored for the round
+    are skipped, and writes ignore records of the round that already exist.
+    Every city gets a work item of the round, so cities that failed are
+    retried later by drain_round.
+
+    Args:
+        city_ids (list[str]): IDs of the cities of the shard.
+        round_at (str): ISO timestamp of the collection round.
+
+    Returns:
+        dict[str, int]: Numbers of ``cities``, ``saved``, ``failed`` and
+        ``skipped`` cities.
+    """
+    setup_logging()
+    created_at = datetime.fromisoformat(round_at)
+    WorkQueueRepository(DATABASE_URL).enqueue(created_at, city_ids)
+    return run_shard(city_ids, created_at)
+
+
+def run_shard(
+        city_ids: list[str],
+        created_at: datetime,
+        retry: bool = False,
+) -> dict[str, int]:
+    """
+    Collect weather for cities of a round and settle their work items.
+
+    Hourly and daily rollups of the cities are recomputed afterwards.
+
+    Args:
+        city_ids (list[str]): IDs of the cities.
+        created_at (datetime): Timestamp of the collection round.
+        retry (bool): The cities failed earlier in the round, see
+            collect_weather().
+
+    Returns:
+        dict[str, int]: Statistics of collect_weather() and the number of
+        ``skipped`` cities.
+    """
+    collected = WeatherRepository(DATABASE_URL).get_collected(
+        city_ids, created_at)
+    cities = [
+        city for city in CityRepository(DATABASE_URL).get_by_ids(city_ids)
+        if city.id not in collected
+    ]
+    errors = {}
+    stats = collect_weather(cities, created_at, errors=errors, retry=retry)
+    WorkQueueRepository(DATABASE_URL).settle(created_at, city_ids, errors)
+    update_rollups(city_ids, created_at)
+    stats['skipped'] = len(collected)
+    count_cities({'skipped': len(collected)})
+    return stats
+
+
+@app.task(name='weather_parser.drain_round')
+def drain_round(round_at: str) -> dict | None:
+    """
+    Celery task retrying the failed cities of a round.
+
+    Only cities whose retry time has come are collected again, whether
+    they are due for polling or not. The task
+    schedules itself for the next retry time as long as it falls within
+    the round interval; then the cities still failing are given up and
+    the completeness report of the round is logged.
+
+    Args:
+        round_at (str): ISO timestamp of the collection round.
+
+    Returns:
+        dict | None: The completeness report, None if the round is still
+        being drained.
+    """
+    setup_logging()
+    created_at = datetime.fromisoformat(round_at)
+    queue = WorkQueueRepository(DATABASE_URL)
+    city_ids = queue.due(created_at, datetime.utcnow())
+    if city_ids:
+        stats = run_shard(city_ids, created_at, retry=True)
+        logging.info(
+            f'Round {round_at}: {len(city_ids)} cities retried, '
+            f'{stats["saved"]} saved, {stats["failed"]} failed'
         )
-        session.mount('https://', HTTPAdapter(max_retries=retries))
-        parser = OpenWeatherParser(session=session)
-        try:
-            weather = WeatherOpenWeatherResponse(
-                **parser.parse_api(
-                    api_key=API_KEY, lat=city.lat, lon=city.lon))
-            weather_repo.write_one(weather=weather, city=city)
-        except Exception as e:
-            logging.error(e)
+    if schedule_drain(round_at):
+        return None
+    queue.give_up(created_at)
+    queue.purge(created_at - timedelta(days=WORK_RETENTION_DAYS))
+    return report_completeness(round_at)
+
+
+def schedule_drain(round_at: str) -> bool:
+    """
+    Schedule drain_round for the next retry time of a round.
+
+    Args:
+        round_at (str): ISO timestamp of the collection round.
+
+    Returns:
+        bool: True if a retry is scheduled, False if nothing is to be
+        retried within the round interval.
+    """
+    created_at = datetime.fromisoformat(round_at)
+    next_retry_at = WorkQueueRepository(DATABASE_URL).next_retry_at(
+        created_at)
+    deadline = created_at + timedelta(seconds=ROUND_INTERVAL)
+    if next_retry_at is None or next_retry_at >= deadline:
+        return False
+    delay = max((next_retry_at - datetime.utcnow()).total_seconds(), 0)
+    drain_round.apply_async((round_at,), countdown=delay)
+    return True
+
+
+def report_completeness(round_at: str) -> dict:
+    """
+    Log the completeness report of a round.
+
+    Args:
+        round_at (str): ISO timestamp of the collection round.
+
+    Returns:
+        dict: The report of WorkQueueRepository.report().
+    """
+    report = WorkQueueRepository(DATABASE_URL).report(
+        datetime.fromisoformat(round_at))
+    ROUND_COMPLETENESS.set(report['completeness'])
+    logging.info(
+        f'Round {round_at} is {report["completeness"]:.1%} complete: '
+        f'{report["done"]} of {report["total"]} cities done, '
+        f'{report["failed"]} to retry, {report["dead"]} given up, '
+        f'{report["pending"]} pending'
+    )
+    return report
+
+
+@app.task(name='weather_parser.finish_round')
+def finish_round(results: list[dict[str, int]], round_at: str) -> dict:
+    """
+    Celery task aggregating statistics of all shards of a round and
+    releasing the round lock. Failed cities are left to drain_round.
+    The recent weather store is refreshed here, by a single writer.
+
+    Args:
+        results (list[dict[str, int]]): Statistics of every shard.
+        round_at (str): ISO timestamp of the collection round.
+
+    Returns:
+        dict: Summed statistics and the round duration in seconds.
+    """
+    setup_logging()
+    release_round_lock(round_at)
+    total = report_round(results, round_at)
+    if RECENT_STORE_DIR:
+        # Imported here, so workers without the store do not load NumPy.
+        from timeseries import refresh_recent_store
+        with timed(STAGE_SECONDS.labels('recent_store')):
+            refresh_recent_store()
+    if not schedule_drain(round_at):
+        report_completeness(round_at)
+    return total
+
+
+@app.task(name='weather_parser.fail_round')
+def fail_round(request, exc, traceback, round_at: str) -> None:
+    """
+    Celery task run instead of finish_round when a shard of a round failed.
+
+    The round lock is released, so the next round is not skipped, and
+    cities the failed shards left pending are handed to drain_round.
+
+    Args:
+        request: Request of the failed task.
+        exc (Exception): The error.
+        traceback: Traceback of the error, if known.
+        round_at (str): ISO timestamp of the collection round.
+    """
+    setup_logging()
+    logging.error(f'Round {round_at} failed: {exc!r}')
+    release_round_lock(round_at)
+    WorkQueueRepository(DATABASE_URL).fail_pending(
+        datetime.fromisoformat(round_at), repr(exc))
+    if not schedule_drain(round_at):
+        report_completeness(round_at)
+
+
+def report_round(results: list[dict[str, int]], round_at: str) -> dict:
+    """
+    Aggregate and log statistics of all shards of a round.
+
+    Args:
+        results (list[dict[str, int]]): Statistics of every shard.
+        round_at (str): ISO timestamp of the collection round.
+
+    Returns:
+        dict: Summed statistics and the round duration in seconds.
+    """
+    total = {
+        'cities': 0, 'saved': 0, 'failed': 0, 'unchanged': 0, 'not_due': 0,
+        'skipped': 0, 'shared': 0, 'requeued': 0, 'write_failed': 0,
+    }
+    for result in results:
+        for key in total:
+            total[key] += result.get(key, 0)
+    total['shards'] = len(results)
+    total['duration'] = (
+        datetime.utcnow() - datetime.fromisoformat(round_at)).total_seconds()
+    observe_round(total['duration'])
+    logging.info(
+        f'Round {round_at} finished in {total["duration"]:.1f}s: '
+        f'{total["saved"]} saved, {total["failed"]} failed '
+        f'({total["write_failed"]} on write), '
+        f'{total["unchanged"]} unchanged, {total["not_due"]} not due, '
+        f'{total["skipped"]} skipped of {total["cities"]} cities, '
+        f'{total["shared"]} served by a shared fetch, '
+        f'{total["requeued"]} fetches re-queued'
+    )
     logging.info(
-        'Information gathered. Pause on: 1 hour'
+        f'Information gathered. Next round in {ROUND_INTERVAL}s at most'
     )
+    return total
 
 
 if __name__ == '__main__':
-    parse_weather()
+    setup_logging()
+    create_tables()
+    round_at = datetime.utcnow()
+    city_ids = [city.id for city in get_cities(CityRepository(DATABASE_URL))]
+    WorkQueueRepository(DATABASE_URL).enqueue(round_at, city_ids)
+    stats = run_shard(city_ids, round_at)
+    report_round([stats], round_at.isoformat())